@@ -0,0 +1,296 @@
+"""
+Пакетный анализ большого количества позиций или партий на нескольких ядрах.
+
+Движок написан на чистом Python, поэтому из-за GIL потоки не ускоряют вычисления. Вместо потоков работа
+распределяется по процессам (ProcessPoolExecutor). Задачи отправляются в процессы пачками (chunk), чтобы накладные
+расходы на передачу данных между процессами были малы по сравнению с самой работой. Каждый процесс создаёт GameState
+и Searcher один раз и использует их для всех своих задач.
+
+Задача - это позиция из файла FEN (одна позиция на строку) или партия из файла PGN. Для партии работа выполняется
+в каждой позиции после каждого хода. Виды работы:
+    evaluate - статическая оценка позиции
+    perft    - количество позиций на глубине --depth
+    search   - поиск лучшего хода с ограничениями --depth, --time, --nodes
+
+Результаты записываются в формате JSON lines (один объект JSON на строку) по мере готовности, поэтому порядок строк
+может не совпадать с порядком задач; номер задачи хранится в поле 'index'. Файл результатов служит и контрольной
+точкой: с флагом --resume уже посчитанные задачи пропускаются, а новые результаты дописываются в конец файла.
+
+Запуск из папки, в которой лежит пакет Chess:
+    python -m Chess.ChessBatch positions.fen --job search --depth 4 --output results.jsonl
+    python -m Chess.ChessBatch games.pgn --pgn --job evaluate --workers 8 --output results.jsonl --resume
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from Chess import ChessEngine, ChessEvaluation, ChessPGN, ChessPerft, ChessSearch, ChessTablebase
+from Chess.ChessTransposition import TranspositionTable
+
+JOBS = ("evaluate", "perft", "search")
+DEFAULT_CHUNK_SIZE = 16  # Количество задач в одной пачке
+PENDING_CHUNKS_PER_WORKER = 2  # Сколько пачек на процесс держать в очереди, чтобы процессы не простаивали
+
+# Состояние процесса-исполнителя: создаётся один раз в init_worker и используется всеми задачами процесса
+WORKER_STATE = {}
+
+"""
+Прочитать задачи из файла FEN. Пустые строки и строки, начинающиеся с '#', пропускаются. Всё, что стоит после ';'
+(например, результаты perft в файлах EPD), отбрасывается. Задачи отдаются по одной, файл не читается целиком.
+"""
+
+
+def read_fen_tasks(path):
+    index = 0
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            fen = line.split(";")[0].strip()
+            if not fen or fen.startswith("#"):
+                continue
+            yield {"index": index, "fen": fen}
+            index += 1
+
+
+"""
+Прочитать задачи из файла PGN: одна партия - одна задача. Партия передаётся в процесс в виде начальной позиции и
+списка ходов, а переигрывается уже в процессе-исполнителе.
+"""
+
+
+def read_pgn_tasks(path):
+    for index, game in enumerate(ChessPGN.read_games_from_path(path)):
+        yield {"index": index, "fen": game.get_start_fen(), "moves": game.moves,
+               "white": game.headers.get("White", "?"), "black": game.headers.get("Black", "?"),
+               "result": game.headers.get("Result", game.result)}
+
+
+"""
+Номера задач, результаты которых уже записаны в файл path. Последняя строка могла быть записана не до конца, если
+прошлый запуск был прерван, - такие строки пропускаются, и задача будет посчитана заново.
+"""
+
+
+def load_checkpoint(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                done.add(json.loads(line)["index"])
+            except (ValueError, KeyError, TypeError):
+                continue
+    return done
+
+
+"""
+Отрезать от файла результатов недописанную последнюю строку (если прошлый запуск был прерван посреди записи), чтобы
+новые результаты при дописывании не склеились с ней
+"""
+
+
+def truncate_partial_line(path):
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as file:
+        end = file.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        file.seek(end - 1)
+        if file.read(1) == b"\n":
+            return
+        # Ищем последний перевод строки, читая файл с конца блоками, чтобы не загружать весь файл в память
+        position = end
+        while position > 0:
+            block_start = max(0, position - 65536)
+            file.seek(block_start)
+            newline = file.read(position - block_start).rfind(b"\n")
+            if newline >= 0:
+                file.truncate(block_start + newline + 1)
+                return
+            position = block_start
+        file.truncate(0)
+
+
+"""
+Инициализация процесса-исполнителя. Вызывается один раз при запуске процесса. Файлы эндшпильных таблиц каждый процесс
+отображает в память сам, а страницы файлов в кеше операционной системы общие для всех процессов.
+"""
+
+
+def init_worker(tt_size_mb, tablebase_dir=None):
+    WORKER_STATE["gs"] = ChessEngine.GameState()
+    tablebase = ChessTablebase.Tablebase(tablebase_dir) if tablebase_dir is not None else None
+    WORKER_STATE["searcher"] = ChessSearch.Searcher(TranspositionTable(tt_size_mb), tablebase)
+
+
+"""
+Выполнить работу job в текущей позиции gs. Возвращает словарь с результатами.
+"""
+
+
+def analyse_position(gs, job, params):
+    if job == "evaluate":
+        return {"score": ChessEvaluation.evaluate(gs)}
+    if job == "perft":
+        start_time = time.perf_counter()
+        nodes = ChessPerft.perft(gs, params["depth"])
+        return {"nodes": nodes, "time": round(time.perf_counter() - start_time, 4)}
+    result = WORKER_STATE["searcher"].search(gs, depth=params.get("depth"), time_limit=params.get("time_limit"),
+                                             node_limit=params.get("node_limit"))
+    return {"best_move": result.best_move.get_chess_notation() if result.best_move is not None else None,
+            "score": result.score, "depth": result.depth, "nodes": result.nodes,
+            "pv": [move.get_chess_notation() for move in result.pv], "time": round(result.elapsed, 4)}
+
+
+"""
+Выполнить одну задачу. Ошибка в задаче (например, некорректный FEN или невозможный ход в партии) не прерывает
+работу: вместо результата возвращается сообщение об ошибке.
+"""
+
+
+def run_task(task, job, params):
+    gs = WORKER_STATE["gs"]
+    output = {"index": task["index"], "fen": task["fen"]}
+    try:
+        gs.load_fen(task["fen"])
+        if "moves" not in task:
+            output.update(analyse_position(gs, job, params))
+            return output
+
+        output.update(white=task["white"], black=task["black"], result=task["result"])
+        positions = []
+        for san in task["moves"]:
+            move = ChessPGN.parse_san(gs, san)
+            gs.make_move(move)
+            position = {"ply": len(gs.move_log), "san": san}
+            position.update(analyse_position(gs, job, params))
+            positions.append(position)
+        output["positions"] = positions
+    except ValueError as error:
+        # Некорректный FEN или невозможный ход в партии - ожидаемая ошибка входных данных
+        output["error"] = str(error)
+    except Exception as error:
+        # Ошибка в самом анализе - это ошибка программы. Она записывается в строку результатов, чтобы не потерять
+        # остальные задачи пачки, а трассировка выводится в stderr, чтобы ошибку можно было найти
+        print("task %d failed:\n%s" % (task["index"], traceback.format_exc()), file=sys.stderr)
+        output["error"] = "%s: %s" % (type(error).__name__, error)
+    return output
+
+
+"""
+Выполнить пачку задач в процессе-исполнителе
+"""
+
+
+def run_chunk(tasks, job, params):
+    return [run_task(task, job, params) for task in tasks]
+
+
+"""
+Разбить поток задач на пачки по chunk_size задач, пропуская задачи из done
+"""
+
+
+def make_chunks(tasks, chunk_size, done):
+    chunk = []
+    for task in tasks:
+        if task["index"] in done:
+            continue
+        chunk.append(task)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+"""
+Выполнить задачи tasks (итерируемый объект, может быть генератором) на workers процессах и записывать результаты
+в открытый текстовый файл output по мере готовности. В очереди одновременно находится ограниченное количество пачек,
+поэтому задачи читаются из файла постепенно и память не растёт с размером входного файла. Задачи из done
+пропускаются. Возвращает количество выполненных задач.
+"""
+
+
+def run_batch(tasks, job, params, output, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, done=frozenset(),
+              tt_size_mb=ChessSearch.DEFAULT_TT_SIZE_MB, tablebase_dir=None):
+    workers = workers or os.cpu_count() or 1
+    chunks = make_chunks(tasks, chunk_size, done)
+    completed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(tt_size_mb, tablebase_dir)) as executor:
+        pending = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < workers * PENDING_CHUNKS_PER_WORKER:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pending.add(executor.submit(run_chunk, chunk, job, params))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                for result in future.result():
+                    output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    completed += 1
+            # Сбрасываем результаты на диск после каждой пачки, чтобы контрольная точка не отставала
+            output.flush()
+    return completed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный анализ позиций и партий на нескольких процессах")
+    parser.add_argument("path", help="файл с позициями FEN (по одной на строку) или партиями PGN")
+    parser.add_argument("--pgn", action="store_true", help="входной файл в формате PGN")
+    parser.add_argument("--job", choices=JOBS, default="evaluate", help="что считать для каждой позиции")
+    parser.add_argument("--depth", type=int, default=None, help="глубина perft или поиска")
+    parser.add_argument("--time", type=float, default=None, help="время поиска на позицию в секундах")
+    parser.add_argument("--nodes", type=int, default=None, help="лимит узлов поиска на позицию")
+    parser.add_argument("--workers", type=int, default=None, help="количество процессов (по умолчанию - по ядрам)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="задач в одной пачке")
+    parser.add_argument("--hash", type=int, default=ChessSearch.DEFAULT_TT_SIZE_MB,
+                        help="размер таблицы транспозиций каждого процесса в МБ")
+    parser.add_argument("--syzygy", default=None, help="папка с эндшпильными таблицами Syzygy для поиска")
+    parser.add_argument("--output", default=None, help="файл результатов JSON lines (по умолчанию - stdout)")
+    parser.add_argument("--resume", action="store_true", help="пропустить задачи, уже записанные в --output")
+    args = parser.parse_args(argv)
+
+    if args.job == "perft" and args.depth is None:
+        parser.error("для perft нужна --depth")
+    if args.resume and args.output is None:
+        parser.error("для --resume нужен --output")
+    params = {"depth": args.depth, "time_limit": args.time, "node_limit": args.nodes}
+
+    if args.resume:
+        truncate_partial_line(args.output)
+        done = load_checkpoint(args.output)
+    else:
+        done = frozenset()
+    tasks = read_pgn_tasks(args.path) if args.pgn else read_fen_tasks(args.path)
+    if args.output is None:
+        output = sys.stdout
+    else:
+        output = open(args.output, "a" if args.resume else "w", encoding="utf-8")
+
+    start_time = time.perf_counter()
+    try:
+        completed = run_batch(tasks, args.job, params, output, args.workers, args.chunk_size, done, args.hash,
+                              args.syzygy)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start_time
+    print("tasks: %d (skipped %d), time: %.3f s" % (completed, len(done), elapsed), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+В этом файле хранятся заранее посчитанные таблицы для битбордов (битовых досок). Битборд - это 64-битное целое число,
+каждый бит которого соответствует одному квадрату доски. Номер квадрата считается так же, как и в GameState.board:
+square = row * 8 + column, т.е. квадрат a8 имеет номер 0, h8 - 7, a1 - 56, h1 - 63.
+
+Таблицы считаются один раз при импорте модуля, после чего получить, например, все атакованные конём квадраты можно
+одним обращением к списку, без перебора клеток и проверок выхода за границы доски.
+"""
+
+DIMENSION = 8
+FULL_BOARD = (1 << 64) - 1  # Битборд, в котором заняты все квадраты
+
+# SQUARE_BB[square] - битборд, в котором установлен только бит квадрата square
+SQUARE_BB = [1 << square for square in range(64)]
+
+# FILE_BB[column] и ROW_BB[row] - битборды всех квадратов столбца и строки доски
+FILE_BB = [sum(1 << (row * 8 + column) for row in range(8)) for column in range(8)]
+ROW_BB = [0xFF << (row * 8) for row in range(8)]
+
+PIECE_TYPES = ("P", "N", "B", "R", "Q", "K")
+PIECES = tuple(color + piece_type for color in ("w", "b") for piece_type in PIECE_TYPES)
+
+"""
+Получить номер квадрата по строке и столбцу доски и наоборот
+"""
+
+
+def square_index(row, column):
+    return row * DIMENSION + column
+
+
+def square_to_row_column(square):
+    return square >> 3, square & 7
+
+
+"""
+Количество установленных битов (фигур) в битборде. В Python 3.10+ это встроенный int.bit_count, в более старых
+версиях - подсчёт единиц в двоичной записи.
+"""
+
+if hasattr(int, "bit_count"):
+    pop_count = int.bit_count
+else:
+    def pop_count(bitboard):
+        return bin(bitboard).count("1")
+
+
+"""
+Таблица атак для фигур, которые ходят 'скачками' на фиксированные смещения (конь, король). Для каждого квадрата
+собирается битборд квадратов, куда фигура может попасть, не выходя за пределы доски.
+"""
+
+
+def build_leaper_attacks(offsets):
+    table = []
+    for square in range(64):
+        row, column = square_to_row_column(square)
+        attacks = 0
+        for d_row, d_column in offsets:
+            end_row = row + d_row
+            end_column = column + d_column
+            if 0 <= end_row <= 7 and 0 <= end_column <= 7:
+                attacks |= SQUARE_BB[square_index(end_row, end_column)]
+        table.append(attacks)
+    return table
+
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+KNIGHT_ATTACKS = build_leaper_attacks(KNIGHT_OFFSETS)
+KING_ATTACKS = build_leaper_attacks(KING_OFFSETS)
+# Белые пешки бьют 'вверх' по доске (к строке 0), чёрные - 'вниз' (к строке 7)
+PAWN_ATTACKS = {"w": build_leaper_attacks(((-1, -1), (-1, 1))),
+                "b": build_leaper_attacks(((1, -1), (1, 1)))}
+
+"""
+Все квадраты, которые бьют пешки цвета color из битборда pawns. Считается сдвигом всего битборда сразу, без перебора
+пешек по одной.
+"""
+
+
+def pawn_attacks_bulk(color, pawns):
+    if color == "w":
+        return ((pawns & ~FILE_BB[0]) >> 9) | ((pawns & ~FILE_BB[7]) >> 7)
+    return (((pawns & ~FILE_BB[0]) << 7) | ((pawns & ~FILE_BB[7]) << 9)) & FULL_BOARD
+
+
+"""
+Таблицы атак дальнобойных фигур (ладья, слон, ферзь).
+
+Атака такой фигуры по одной линии (горизонталь, вертикаль или одна из диагоналей) зависит только от того, какие
+квадраты этой линии заняты. Поэтому для каждого квадрата и каждой линии заранее перебираются все варианты занятости
+'значимых' квадратов линии (крайние квадраты не влияют на атаку, т.к. за ними уже нет клеток) и запоминается
+получившийся битборд атаки. Таблица - словарь, ключом которого служит сама маскированная занятость:
+LINE_ATTACKS[square][occupancy & LINE_MASKS[square]]. Словарь здесь выполняет роль 'магического' хеширования, которое
+в C делают умножением на подобранную константу.
+"""
+
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (1, 1), (-1, 1), (1, -1))
+# Линия задаётся парой противоположных направлений
+LINE_DIRECTIONS = {"rank": ((0, -1), (0, 1)), "file": ((-1, 0), (1, 0)),
+                   "diagonal": ((-1, -1), (1, 1)), "anti_diagonal": ((-1, 1), (1, -1))}
+
+"""
+Битборд квадратов, которые бьёт фигура с квадрата square по заданным направлениям при занятости доски occupancy.
+Луч продолжается до первой стоящей на нём фигуры включительно.
+"""
+
+
+def slow_sliding_attacks(square, occupancy, directions):
+    row, column = square_to_row_column(square)
+    attacks = 0
+    for d_row, d_column in directions:
+        end_row = row + d_row
+        end_column = column + d_column
+        while 0 <= end_row <= 7 and 0 <= end_column <= 7:
+            bit = SQUARE_BB[square_index(end_row, end_column)]
+            attacks |= bit
+            if occupancy & bit:
+                break
+            end_row += d_row
+            end_column += d_column
+    return attacks
+
+
+"""
+Маска 'значимых' квадратов линии: все квадраты по направлениям, кроме самого квадрата и последнего квадрата каждого
+луча
+"""
+
+
+def relevant_mask(square, directions):
+    row, column = square_to_row_column(square)
+    mask = 0
+    for d_row, d_column in directions:
+        end_row = row + d_row
+        end_column = column + d_column
+        while 0 <= end_row + d_row <= 7 and 0 <= end_column + d_column <= 7:
+            mask |= SQUARE_BB[square_index(end_row, end_column)]
+            end_row += d_row
+            end_column += d_column
+    return mask
+
+
+def build_line_tables(directions):
+    masks = []
+    tables = []
+    for square in range(64):
+        mask = relevant_mask(square, directions)
+        table = {}
+        # Перебор всех подмножеств маски (так называемый 'carry-rippler')
+        subset = 0
+        while True:
+            table[subset] = slow_sliding_attacks(square, subset, directions)
+            subset = (subset - mask) & mask
+            if subset == 0:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+RANK_MASKS, RANK_ATTACKS = build_line_tables(LINE_DIRECTIONS["rank"])
+FILE_MASKS, FILE_ATTACKS = build_line_tables(LINE_DIRECTIONS["file"])
+DIAGONAL_MASKS, DIAGONAL_ATTACKS = build_line_tables(LINE_DIRECTIONS["diagonal"])
+ANTI_DIAGONAL_MASKS, ANTI_DIAGONAL_ATTACKS = build_line_tables(LINE_DIRECTIONS["anti_diagonal"])
+
+"""
+Атаки ладьи, слона и ферзя с квадрата square при занятости доски occupancy - два или четыре обращения к таблицам
+"""
+
+
+def rook_attacks(square, occupancy):
+    return (RANK_ATTACKS[square][occupancy & RANK_MASKS[square]] |
+            FILE_ATTACKS[square][occupancy & FILE_MASKS[square]])
+
+
+def bishop_attacks(square, occupancy):
+    return (DIAGONAL_ATTACKS[square][occupancy & DIAGONAL_MASKS[square]] |
+            ANTI_DIAGONAL_ATTACKS[square][occupancy & ANTI_DIAGONAL_MASKS[square]])
+
+
+def queen_attacks(square, occupancy):
+    return rook_attacks(square, occupancy) | bishop_attacks(square, occupancy)
+
+
+"""
+BETWEEN[a][b] - квадраты строго между a и b, если они лежат на одной горизонтали, вертикали или диагонали, иначе 0.
+Используется для масок 'закреплений' и для квадратов, которыми можно закрыться от шаха.
+"""
+
+
+def build_between_table():
+    table = [[0] * 64 for _ in range(64)]
+    for square in range(64):
+        row, column = square_to_row_column(square)
+        for d_row, d_column in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            between = 0
+            end_row = row + d_row
+            end_column = column + d_column
+            while 0 <= end_row <= 7 and 0 <= end_column <= 7:
+                end_square = square_index(end_row, end_column)
+                table[square][end_square] = between
+                between |= SQUARE_BB[end_square]
+                end_row += d_row
+                end_column += d_column
+    return table
+
+
+BETWEEN = build_between_table()
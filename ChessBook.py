@@ -0,0 +1,182 @@
+"""
+Дебютная книга в формате Polyglot (.bin). Файл книги - отсортированный по хешу позиции массив записей по 16 байт
+(все числа big-endian):
+    key    - 8 байт, хеш позиции (совпадает с GameState.zobrist_key, см. ChessZobrist)
+    move   - 2 байта, ход
+    weight - 2 байта, вес хода: чем больше, тем чаще ход выбирается
+    learn  - 4 байта, не используется
+Описание формата: http://hgm.nubati.net/book_format.html
+
+Книга не читается в память и не разбирается при открытии. Файл отображается в память через mmap, а записи позиции
+находятся двоичным поиском по хешу, поэтому поиск хода занимает микросекунды даже для книг в сотни мегабайт. Страницы
+файла, отображённого в память, хранятся в кеше операционной системы, поэтому все процессы, открывшие одну книгу,
+используют одну и ту же копию данных.
+
+Запуск из папки, в которой лежит пакет Chess:
+    python -m Chess.ChessBook book.bin                    - ходы из книги для начальной позиции
+    python -m Chess.ChessBook book.bin --fen "<FEN>"      - ходы из книги для позиции FEN
+"""
+
+import argparse
+import mmap
+import random
+import struct
+import sys
+
+from Chess import ChessEngine
+
+ENTRY_SIZE = 16
+ENTRY_FORMAT = struct.Struct(">QHHI")
+KEY_FORMAT = struct.Struct(">Q")
+
+# Фигуры превращения пешки в порядке их кодов в ходе Polyglot (0 - не превращение)
+POLYGLOT_PROMOTION_PIECES = (None, "N", "B", "R", "Q")
+
+"""
+Разобрать ход Polyglot на начальный и конечный квадраты (row, col) и фигуру превращения. Горизонтали в Polyglot
+нумеруются снизу (0 - первая горизонталь), а строки доски GameState - сверху, поэтому номер строки отражается.
+"""
+
+
+def decode_polyglot_move(raw_move):
+    end_square = (7 - ((raw_move >> 3) & 7), raw_move & 7)
+    start_square = (7 - ((raw_move >> 9) & 7), (raw_move >> 6) & 7)
+    return start_square, end_square, POLYGLOT_PROMOTION_PIECES[(raw_move >> 12) & 7]
+
+
+class OpeningBook:
+    """
+    path - путь к файлу книги .bin. Книгу удобно использовать как контекстный менеджер
+    (with OpeningBook("book.bin") as book: ...), чтобы файл закрывался автоматически.
+    self.size - количество записей в книге.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.size = 0
+        self.data = None
+        file_size = self.file.seek(0, 2)
+        if file_size % ENTRY_SIZE:
+            self.file.close()
+            raise ValueError("Размер файла книги не кратен %d байтам: %s" % (ENTRY_SIZE, path))
+        # Пустой файл нельзя отобразить в память, такая книга просто не содержит ходов
+        if file_size:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = file_size // ENTRY_SIZE
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    """
+    Номер первой записи с хешем не меньше key (двоичный поиск по отсортированному файлу)
+    """
+
+    def find_first(self, key):
+        low = 0
+        high = self.size
+        while low < high:
+            middle = (low + high) >> 1
+            if KEY_FORMAT.unpack_from(self.data, middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    """
+    Все записи книги для позиции с хешем key: список (ход Polyglot, вес)
+    """
+
+    def get_entries(self, key):
+        entries = []
+        index = self.find_first(key)
+        while index < self.size:
+            entry_key, raw_move, weight, _ = ENTRY_FORMAT.unpack_from(self.data, index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            entries.append((raw_move, weight))
+            index += 1
+        return entries
+
+    """
+    Найти ход Polyglot среди возможных ходов позиции. Рокировка в Polyglot записывается как ход короля на квадрат своей
+    ладьи (e1h1, e1a1, e8h8, e8a8), а в GameState - как ход короля на две клетки. Возвращает ход или None, если такого
+    хода в позиции нет (например, из-за совпадения хешей).
+    """
+
+    def get_move(self, gs, raw_move, valid_moves):
+        start_square, end_square, promotion_piece = decode_polyglot_move(raw_move)
+        if gs.board[start_square[0]][start_square[1]][1] == "K" and start_square[1] == 4 and \
+                start_square[0] == end_square[0] and end_square[1] in (0, 7):
+            end_square = (end_square[0], 6 if end_square[1] == 7 else 2)
+        move = valid_moves.find(start_square, end_square, promotion_piece or "Q")
+        if move is not None and move.pawn_promotion != (promotion_piece is not None):
+            return None
+        return move
+
+    """
+    Ходы из книги для позиции gs: список (ход, вес) в порядке записей книги. Ходы с нулевым весом пропускаются, как это
+    принято в Polyglot.
+    """
+
+    def get_moves(self, gs):
+        if not self.size:
+            return []
+        entries = self.get_entries(gs.zobrist_key)
+        if not entries:
+            return []
+        valid_moves = gs.get_valid_moves(indexed=True)
+        moves = []
+        for raw_move, weight in entries:
+            if weight == 0:
+                continue
+            move = self.get_move(gs, raw_move, valid_moves)
+            if move is not None:
+                moves.append((move, weight))
+        return moves
+
+    """
+    Выбрать ход из книги для позиции gs случайно, с вероятностью, пропорциональной весу хода. При best=True выбирается
+    ход с наибольшим весом. Возвращает None, если позиции нет в книге.
+    """
+
+    def choose_move(self, gs, best=False, random_generator=random):
+        moves = self.get_moves(gs)
+        if not moves:
+            return None
+        if best:
+            return max(moves, key=lambda move_weight: move_weight[1])[0]
+        point = random_generator.randrange(sum(weight for _, weight in moves))
+        for move, weight in moves:
+            if point < weight:
+                return move
+            point -= weight
+        return moves[-1][0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ходы из дебютной книги Polyglot для позиции")
+    parser.add_argument("path", help="файл книги .bin")
+    parser.add_argument("--fen", default=ChessEngine.START_FEN, help="позиция в записи FEN")
+    args = parser.parse_args(argv)
+
+    gs = ChessEngine.GameState(args.fen)
+    with OpeningBook(args.path) as book:
+        moves = book.get_moves(gs)
+        total = sum(weight for _, weight in moves)
+        for move, weight in sorted(moves, key=lambda move_weight: -move_weight[1]):
+            print("%-6s %6d %6.1f%%" % (move.get_chess_notation(), weight, 100.0 * weight / total))
+        print("entries: %d, moves: %d" % (book.size, len(moves)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
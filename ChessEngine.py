@@ -3,9 +3,26 @@
 будет хранить информация о ходах.
 """
 
+from array import array
+
+from Chess.ChessBitboards import SQUARE_BB, FULL_BOARD, ROW_BB, PIECES, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, \
+    BETWEEN, rook_attacks, bishop_attacks, queen_attacks, pawn_attacks_bulk, pop_count
+from Chess.ChessZobrist import PIECE_KEYS, EN_PASSANT_KEYS, WHITE_TURN_KEY, castle_rights_key
+from Chess.ChessEvaluation import MG_TABLES, EG_TABLES, PIECE_PHASES, compute_scores
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"  # Начальная позиция в записи FEN
+# Обозначения фигур в записи FEN: заглавные буквы - белые фигуры, строчные - чёрные
+FEN_PIECES = {symbol: "w" + symbol for symbol in "PNBRQK"}
+FEN_PIECES.update({symbol.lower(): "b" + symbol for symbol in "PNBRQK"})
+PIECES_TO_FEN = {piece: symbol for symbol, piece in FEN_PIECES.items()}
+FEN_EMPTY_SQUARES = {str(count): ["--"] * count for count in range(1, 9)}
+# Битборды светлых и тёмных полей (a8, квадрат 0, - светлое поле)
+LIGHT_SQUARES = sum(SQUARE_BB[square] for square in range(64) if ((square >> 3) + (square & 7)) % 2 == 0)
+DARK_SQUARES = FULL_BOARD ^ LIGHT_SQUARES
+
 
 class GameState:
-    def __init__(self):
+    def __init__(self, fen=START_FEN):
         """
         Доска представляет собой двумерный список, размером 8х8, каждый элемент которой имеет два параметра:
         первый - цвет: 'b' - чёрный, 'w' - белый
@@ -23,14 +40,18 @@ class GameState:
         self.white_king_location, self.black_king_location - позиция белого и чёрного королей в начале игры. Нужно для
         того, чтобы следить, не попадает ли король под шахи, если попытаться совершить тот или иной ход.
         self.in_check - булевая переменная, указывающая на то, объявлен ли шах.
-        self.pins - список 'закреплений' фигур (например, если какая-либо фигура стоит перед королём, защищая его от
-        шаха, то она является 'закреплённой', так как она не может совершить ход.)
+        self.pins - словарь 'закреплений' фигур (например, если какая-либо фигура стоит перед королём, защищая его от
+        шаха, то она является 'закреплённой', так как она не может уйти с линии атаки). Ключ - номер квадрата фигуры,
+        значение - битборд квадратов, на которые 'закреплённая' фигура может сходить.
         self.checks - список с объявленными шахами. Нужен для того чтобы различать шахи одной фигурой или двумя
         self.checkmate - указывает на то, стоит ли мат
         self.stalemate - указывает на то, стоит ли пат
+        self.draw - указывает на то, закончилась ли партия ничьей по правилам (см. get_draw_reason)
 
         self.en_passant_square - кортеж, который будет хранить координаты квадрата, где возможно съедение пешки
         'на проходе'
+        self.en_passant_log - лог значений self.en_passant_square после каждого хода, чтобы при отмене хода вернуть
+        возможность съедения 'на проходе' такой, какой она была
 
         self.current_castle_rights - хранит информацию о возможных рокировках обоих игроков. По умолчанию рокировка
         возможна, так как не было совершено ни ходов королём, ни ладьёй, т.е. возможность рокироватсья есть, если
@@ -38,43 +59,304 @@ class GameState:
         не будет возможна.
         self.castle_rights_log - лог с изменениями возможностей на рокировку. Нужен для того чтобы корректо отменить
         ход, если потребуется. По умолчанию заполняется копией объекта self.current_castle_rights
-        """
-        self.board = [
-            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
-            ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
-            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
-        self.white_turn = True
-        self.move_log = []
 
+        self.bitboards - словарь битбордов (64-битных чисел) для каждой фигуры каждого цвета, ключи совпадают с
+        обозначениями фигур на доске ('wP', 'bK' и т.д.). Бит с номером row * 8 + col установлен, если фигура стоит
+        на квадрате (row, col).
+        self.occupancy - битборды всех белых ('w') и всех чёрных ('b') фигур, self.all_occupancy - всех фигур на доске.
+        Битборды обновляются вместе с self.board в методах put_piece и remove_piece, а self.board остаётся
+        'представлением' позиции для отрисовки.
+
+        self.attack_maps - закэшированные карты атак белых и чёрных фигур (см. get_attack_map). None означает, что
+        карта для текущей позиции ещё не посчитана. Кэш сбрасывается при каждом make_move и undo_move.
+
+        self.zobrist_key - 64-битный хеш Zobrist текущей позиции (фигуры, очередь хода, возможные рокировки и
+        вертикаль взятия 'на проходе'). Обновляется по ходу игры, а не пересчитывается заново.
+        self.zobrist_log - хеши всех позиций партии, включая текущую (последний элемент). Ведётся вместе с
+        self.move_log, отмена хода просто возвращает предыдущее значение.
+        self.repetition_counts - сколько раз каждая позиция (хеш Zobrist) встречалась в партии. Обновляется в make_move
+        и undo_move, поэтому проверка повторения позиции - один поиск в словаре, без просмотра истории ходов.
+
+        self.halfmove_clock - количество полуходов с последнего хода пешкой или взятия (для записи FEN и правила
+        50 ходов), self.halfmove_clock_log - его значения после каждого хода.
+        self.fullmove_number - номер хода в записи FEN, увеличивается после каждого хода чёрных.
+
+        self.mg_score, self.eg_score - суммы стоимости фигур и значений таблиц 'фигура-квадрат' для миттельшпиля и
+        эндшпиля с точки зрения белых, self.phase - фаза игры (см. ChessEvaluation). Обновляются в put_piece и
+        remove_piece, поэтому оценка позиции не требует перебора доски.
+
+        Позиция задаётся записью FEN (по умолчанию - начальная позиция), все атрибуты выше заполняются в load_fen.
+        """
         self.move_functions = {"P": self.get_pawn_moves, "R": self.get_rook_moves, "N": self.get_knight_moves,
                                "B": self.get_bishop_moves, "Q": self.get_queen_moves, "K": self.get_king_moves}
+        self.load_fen(fen)
+
+    """
+    Полностью пересчитывает хеш Zobrist текущей позиции. Во время игры хеш обновляется в make_move и undo_move, этот
+    метод нужен для начальной позиции и для проверки.
+    """
+
+    def compute_zobrist_key(self):
+        key = 0
+        for piece, bitboard in self.bitboards.items():
+            piece_keys = PIECE_KEYS[piece]
+            while bitboard:
+                lowest_bit = bitboard & -bitboard
+                key ^= piece_keys[lowest_bit.bit_length() - 1]
+                bitboard ^= lowest_bit
+        if self.white_turn:
+            key ^= WHITE_TURN_KEY
+        return key ^ castle_rights_key(self.current_castle_rights) ^ self.get_en_passant_key()
+
+    """
+    Ключ вертикали взятия 'на проходе'. Как и в Polyglot, он учитывается только тогда, когда у стороны, чья очередь
+    ходить, есть пешка, которая может это взятие сделать. Иначе позиции, которые по сути одинаковы, получали бы
+    разные хеши.
+    """
+
+    def get_en_passant_key(self):
+        if self.en_passant_square == ():
+            return 0
+        row, col = self.en_passant_square
+        if self.white_turn:
+            pawns = self.bitboards['wP']
+            enemy_color = 'b'
+        else:
+            pawns = self.bitboards['bP']
+            enemy_color = 'w'
+        # Пешки, которые бьют квадрат, стоят там, откуда их 'била' бы пешка противника, стоящая на этом квадрате
+        if PAWN_ATTACKS[enemy_color][row * 8 + col] & pawns:
+            return EN_PASSANT_KEYS[col]
+        return 0
+
+    """
+    Установить позицию из записи FEN (Forsyth-Edwards Notation), например, начальная позиция:
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+    Поля: расстановка фигур (по строкам сверху вниз, цифра - количество пустых квадратов), очередь хода, возможные
+    рокировки, квадрат взятия 'на проходе', счётчик полуходов и номер хода. Счётчики в конце записи необязательны.
+    История ходов очищается.
+
+    Метод рассчитан на загрузку большого количества позиций в один и тот же объект: доска и битборды заполняются
+    за один проход по записи, без повторного перебора всех квадратов.
+    """
+
+    def load_fen(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("Некорректная запись FEN: " + fen)
+        placement, turn, castling, en_passant = fields[:4]
+
+        rows = placement.split("/")
+        if len(rows) != 8:
+            raise ValueError("Некорректная расстановка фигур в FEN: " + placement)
+        board = []
+        bitboards = {piece: 0 for piece in PIECES}
+        square = 0
+        for fen_row in rows:
+            board_row = []
+            for symbol in fen_row:
+                if symbol in FEN_EMPTY_SQUARES:
+                    board_row.extend(FEN_EMPTY_SQUARES[symbol])
+                    square += len(FEN_EMPTY_SQUARES[symbol])
+                elif symbol in FEN_PIECES:
+                    piece = FEN_PIECES[symbol]
+                    board_row.append(piece)
+                    bitboards[piece] |= SQUARE_BB[square]
+                    square += 1
+                else:
+                    raise ValueError("Неизвестная фигура в FEN: " + symbol)
+            if len(board_row) != 8:
+                raise ValueError("Некорректная строка доски в FEN: " + fen_row)
+            board.append(board_row)
+        if pop_count(bitboards["wK"]) != 1 or pop_count(bitboards["bK"]) != 1:
+            raise ValueError("В позиции должно быть по одному королю каждого цвета: " + placement)
+        if turn not in ("w", "b") or not (castling == "-" or set(castling) <= set("KQkq")):
+            raise ValueError("Некорректная запись FEN: " + fen)
+
+        self.board = board
+        self.bitboards = bitboards
+        self.occupancy = {"w": 0, "b": 0}
+        for piece, bitboard in bitboards.items():
+            self.occupancy[piece[0]] |= bitboard
+        self.all_occupancy = self.occupancy["w"] | self.occupancy["b"]
+
+        self.white_turn = turn == "w"
+        white_king_square = bitboards["wK"].bit_length() - 1
+        black_king_square = bitboards["bK"].bit_length() - 1
+        self.white_king_location = (white_king_square >> 3, white_king_square & 7)
+        self.black_king_location = (black_king_square >> 3, black_king_square & 7)
+
+        self.current_castle_rights = CastleRights("K" in castling, "k" in castling, "Q" in castling, "q" in castling)
+        self.castle_rights_log = [CastleRights(self.current_castle_rights.wks, self.current_castle_rights.bks,
+                                               self.current_castle_rights.wqs, self.current_castle_rights.bqs)]
+        if en_passant == "-":
+            self.en_passant_square = ()
+        elif len(en_passant) == 2 and en_passant[0] in Move.files_to_columns and en_passant[1] in "36":
+            self.en_passant_square = (Move.ranks_to_rows[en_passant[1]], Move.files_to_columns[en_passant[0]])
+        else:
+            raise ValueError("Некорректный квадрат взятия 'на проходе' в FEN: " + en_passant)
+        self.en_passant_log = [self.en_passant_square]
+
+        try:
+            self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("Некорректные счётчики ходов в FEN: " + fen)
+        self.halfmove_clock_log = [self.halfmove_clock]
 
-        self.white_king_location = (7, 4)
-        self.black_king_location = (0, 4)
+        self.move_log = []
         self.in_check = False
-        self.pins = []
+        self.pins = {}
         self.checks = []
         self.checkmate = False
         self.stalemate = False
+        self.draw = False
+        self.attack_maps = {"w": None, "b": None}
+        self.zobrist_key = self.compute_zobrist_key()
+        self.zobrist_log = [self.zobrist_key]
+        self.repetition_counts = {self.zobrist_key: 1}
+        self.mg_score, self.eg_score, self.phase = compute_scores(bitboards)
 
-        self.en_passant_square = ()
+    """
+    Запись FEN текущей позиции. Квадрат взятия 'на проходе' записывается после любого хода пешкой на два квадрата,
+    как того требует стандарт FEN.
+    """
 
-        self.current_castle_rights = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(self.current_castle_rights.wks, self.current_castle_rights.bks,
-                                               self.current_castle_rights.wqs, self.current_castle_rights.bqs)]
+    def get_fen(self):
+        fen_rows = []
+        for board_row in self.board:
+            fen_row = ""
+            empty_squares = 0
+            for piece in board_row:
+                if piece == "--":
+                    empty_squares += 1
+                else:
+                    if empty_squares:
+                        fen_row += str(empty_squares)
+                        empty_squares = 0
+                    fen_row += PIECES_TO_FEN[piece]
+            if empty_squares:
+                fen_row += str(empty_squares)
+            fen_rows.append(fen_row)
+
+        rights = self.current_castle_rights
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + ("k" if rights.bks else "") + \
+                   ("q" if rights.bqs else "")
+        if self.en_passant_square == ():
+            en_passant = "-"
+        else:
+            en_passant_row, en_passant_col = self.en_passant_square
+            en_passant = Move.columns_to_files[en_passant_col] + Move.rows_to_ranks[en_passant_row]
+        return " ".join(("/".join(fen_rows), "w" if self.white_turn else "b", castling or "-", en_passant,
+                         str(self.halfmove_clock), str(self.fullmove_number)))
+
+    """
+    Копия позиции вместе с историей ходов. Копируются только изменяемые списки и словари (строки доски, логи,
+    битборды); объекты Move и записи логов не меняются после создания, поэтому общие для обеих копий. Это намного
+    быстрее copy.deepcopy, который обходит каждый элемент рекурсивно.
+    """
+
+    def copy(self):
+        clone = GameState.__new__(GameState)
+        clone.move_functions = {"P": clone.get_pawn_moves, "R": clone.get_rook_moves, "N": clone.get_knight_moves,
+                                "B": clone.get_bishop_moves, "Q": clone.get_queen_moves, "K": clone.get_king_moves}
+        clone.board = [board_row[:] for board_row in self.board]
+        clone.white_turn = self.white_turn
+        clone.move_log = self.move_log[:]
+        clone.white_king_location = self.white_king_location
+        clone.black_king_location = self.black_king_location
+        clone.in_check = self.in_check
+        clone.pins = dict(self.pins)
+        clone.checks = self.checks[:]
+        clone.checkmate = self.checkmate
+        clone.stalemate = self.stalemate
+        clone.draw = self.draw
+        clone.en_passant_square = self.en_passant_square
+        clone.en_passant_log = self.en_passant_log[:]
+        rights = self.current_castle_rights
+        clone.current_castle_rights = CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs)
+        clone.castle_rights_log = self.castle_rights_log[:]
+        clone.halfmove_clock = self.halfmove_clock
+        clone.halfmove_clock_log = self.halfmove_clock_log[:]
+        clone.fullmove_number = self.fullmove_number
+        clone.bitboards = dict(self.bitboards)
+        clone.occupancy = dict(self.occupancy)
+        clone.all_occupancy = self.all_occupancy
+        clone.attack_maps = dict(self.attack_maps)
+        clone.zobrist_key = self.zobrist_key
+        clone.zobrist_log = self.zobrist_log[:]
+        clone.repetition_counts = dict(self.repetition_counts)
+        clone.mg_score = self.mg_score
+        clone.eg_score = self.eg_score
+        clone.phase = self.phase
+        return clone
+
+    """
+    Компактный снимок партии (GameSnapshot): начальная позиция партии и упакованные ходы. Для тысяч партий, в которых
+    давно не ходили, выгоднее хранить снимки, а GameState восстанавливать из них, когда партия снова понадобится.
+    Начальная позиция находится отменой всех ходов на копии, поэтому сама позиция не меняется.
+    """
+
+    def get_snapshot(self):
+        start = self.copy()
+        while start.move_log:
+            start.undo_move()
+        return GameSnapshot(start, array("H", [move.encoded for move in self.move_log]))
+
+    """
+    Поставить фигуру на пустой квадрат (row, col). Все изменения доски проходят через этот метод и remove_piece,
+    чтобы self.board и битборды всегда описывали одну и ту же позицию.
+    """
+
+    def put_piece(self, piece, row, col):
+        square = row * 8 + col
+        bit = SQUARE_BB[square]
+        self.board[row][col] = piece
+        self.bitboards[piece] |= bit
+        self.occupancy[piece[0]] |= bit
+        self.all_occupancy |= bit
+        self.zobrist_key ^= PIECE_KEYS[piece][square]
+        self.mg_score += MG_TABLES[piece][square]
+        self.eg_score += EG_TABLES[piece][square]
+        self.phase += PIECE_PHASES[piece]
+
+    """
+    Убрать фигуру с квадрата (row, col). Возвращает убранную фигуру.
+    """
+
+    def remove_piece(self, row, col):
+        piece = self.board[row][col]
+        square = row * 8 + col
+        bit = SQUARE_BB[square]
+        self.board[row][col] = "--"
+        self.bitboards[piece] ^= bit
+        self.occupancy[piece[0]] ^= bit
+        self.all_occupancy ^= bit
+        self.zobrist_key ^= PIECE_KEYS[piece][square]
+        self.mg_score -= MG_TABLES[piece][square]
+        self.eg_score -= EG_TABLES[piece][square]
+        self.phase -= PIECE_PHASES[piece]
+        return piece
 
     """
     Метод 'совершает ход'.
     """
 
     def make_move(self, move):
-        self.board[move.end_row][move.end_column] = move.piece_moved
-        self.board[move.start_row][move.start_column] = "--"
+        self.attack_maps["w"] = self.attack_maps["b"] = None  # Позиция меняется, карты атак больше не актуальны
+        # Убираем из хеша старые рокировки и взятие 'на проходе', новые добавим в конце хода
+        self.zobrist_key ^= castle_rights_key(self.current_castle_rights) ^ self.get_en_passant_key()
+        # Если ход - съедение 'на проходе', то съеденная пешка стоит не на конечном квадрате, а рядом с ним
+        if move.is_en_passant_move:
+            self.remove_piece(move.start_row, move.end_column)
+        elif move.piece_captured != "--":
+            self.remove_piece(move.end_row, move.end_column)
+        self.remove_piece(move.start_row, move.start_column)
+        # Проведение пешки до последнего ряда. Ставим вместо пешки выбранную фигуру (по умолчанию ферзя)
+        if move.pawn_promotion:
+            self.put_piece(move.piece_moved[0] + move.promotion_piece, move.end_row, move.end_column)
+        else:
+            self.put_piece(move.piece_moved, move.end_row, move.end_column)
         self.move_log.append(move)  # добавляем в лог сделанный ход
         self.white_turn = not self.white_turn  # меняем очередь хода
 
@@ -84,35 +366,40 @@ class GameState:
         elif move.piece_moved == 'bK':
             self.black_king_location = (move.end_row, move.end_column)
 
-        # Проведение пешки до последнего ряда
-        if move.pawn_promotion:
-            # По умолчанию ставим ферзя вместо пешки
-            self.board[move.end_row][move.end_column] = move.piece_moved[0] + 'Q'
-
         # Если текущий ход - ход пешкой на два квадрата вперёд, то следующим ходом возможно съедение пешки 'на проходе'
         if move.piece_moved[1] == 'P' and abs(move.start_row - move.end_row) == 2:
             self.en_passant_square = ((move.end_row + move.start_row) // 2, move.end_column)
         else:
             self.en_passant_square = ()
-        # Если ход - съедение 'на проходе', то надо обновить состояние доски, чтобы съесть пешку
-        if move.is_en_passant_move:
-            self.board[move.start_row][move.end_column] = "--"
 
         # Рокировка
         if move.is_castling_move:
             if move.end_column - move.start_column == 2:    # Означает, что была сделана короткая рокировка
                 # Перемещаем ладью на новое место
-                self.board[move.end_row][move.end_column - 1] = self.board[move.end_row][move.end_column + 1]
-                self.board[move.end_row][move.end_column + 1] = "--"    # Убираем ладью из старого квадрата
+                rook = self.remove_piece(move.end_row, move.end_column + 1)
+                self.put_piece(rook, move.end_row, move.end_column - 1)
             else:   # Длинная рокировка
-                # Перемещаем ладью на новое место
-                self.board[move.end_row][move.end_column + 1] = self.board[move.end_row][move.end_column - 2]
-                self.board[move.end_row][move.end_column - 2] = "--"    # Убираем ладью из старого квадрата
+                rook = self.remove_piece(move.end_row, move.end_column - 2)
+                self.put_piece(rook, move.end_row, move.end_column + 1)
 
         # Если возможность рокировка была нарушена, то обновим значения соответствующих переменных
         self.update_castle_rights(move)
         self.castle_rights_log.append(CastleRights(self.current_castle_rights.wks, self.current_castle_rights.bks,
                                                    self.current_castle_rights.wqs, self.current_castle_rights.bqs))
+        self.en_passant_log.append(self.en_passant_square)
+
+        # Счётчик полуходов обнуляется ходом пешки или взятием, номер хода растёт после хода чёрных
+        if move.piece_moved[1] == 'P' or move.piece_captured != "--":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        self.halfmove_clock_log.append(self.halfmove_clock)
+        if self.white_turn:
+            self.fullmove_number += 1
+
+        self.zobrist_key ^= WHITE_TURN_KEY ^ castle_rights_key(self.current_castle_rights) ^ self.get_en_passant_key()
+        self.zobrist_log.append(self.zobrist_key)
+        self.repetition_counts[self.zobrist_key] = self.repetition_counts.get(self.zobrist_key, 0) + 1
 
     """
     Отменяет последний совершённый ход
@@ -121,8 +408,14 @@ class GameState:
     def undo_move(self):
         if len(self.move_log) != 0:  # Проверка на то, совершались ли ходы
             last_move = self.move_log.pop()
-            self.board[last_move.start_row][last_move.start_column] = last_move.piece_moved
-            self.board[last_move.end_row][last_move.end_column] = last_move.piece_captured
+            self.attack_maps["w"] = self.attack_maps["b"] = None
+            self.remove_piece(last_move.end_row, last_move.end_column)
+            self.put_piece(last_move.piece_moved, last_move.start_row, last_move.start_column)
+            if last_move.is_en_passant_move:
+                # Ставим пешку обратно в тот квадрат, откуда её съели
+                self.put_piece(last_move.piece_captured, last_move.start_row, last_move.end_column)
+            elif last_move.piece_captured != "--":
+                self.put_piece(last_move.piece_captured, last_move.end_row, last_move.end_column)
             self.white_turn = not self.white_turn
 
             # Обновляем позицию короля
@@ -131,18 +424,14 @@ class GameState:
             elif last_move.piece_moved == 'bK':
                 self.black_king_location = (last_move.start_row, last_move.start_column)
 
-            # Отмена съедения 'на проходе'
-            if last_move.is_en_passant_move:
-                # Убираем пешку, которая была поставлена на 'неправильный' квадрат
-                self.board[last_move.end_row][last_move.end_column] = "--"
-                # Ставим пешку обратно в тот квадрат, откуда её съели
-                self.board[last_move.start_row][last_move.end_column] = last_move.piece_captured
-                # Делаем так, чтобы съедение на проходе после отмены хода снова было возможным
-                self.en_passant_square = (last_move.end_row, last_move.end_column)
+            # Возвращаем возможность съедения 'на проходе', которая была до отменённого хода
+            self.en_passant_log.pop()
+            self.en_passant_square = self.en_passant_log[-1]
 
-            # Отмена хода на два квадрата вперёд может вызвать баги, если не обнулить возможность съедения 'на проходе'
-            if last_move.piece_moved[1] == 'P' and abs(last_move.start_row - last_move.end_row) == 2:
-                self.en_passant_square = ()
+            self.halfmove_clock_log.pop()
+            self.halfmove_clock = self.halfmove_clock_log[-1]
+            if not self.white_turn:
+                self.fullmove_number -= 1
 
             # Обновить возможность рокировки при отмене хода
             # Избавляемся от тех возможных рокировках, которые могли быть на ходе, который мы отменили
@@ -155,14 +444,20 @@ class GameState:
             if last_move.is_castling_move:
                 if last_move.end_column - last_move.start_column == 2:  # Короткая рокировка
                     # Ставим ладью на предыдущую позицию
-                    self.board[last_move.end_row][last_move.end_column + 1] = \
-                        self.board[last_move.end_row][last_move.end_column - 1]
-                    self.board[last_move.end_row][last_move.end_column - 1] = "--"
+                    rook = self.remove_piece(last_move.end_row, last_move.end_column - 1)
+                    self.put_piece(rook, last_move.end_row, last_move.end_column + 1)
                 else:   # Длинная рокировка
-                    # Ставим ладью на предыдущую позицию
-                    self.board[last_move.end_row][last_move.end_column - 2] = \
-                        self.board[last_move.end_row][last_move.end_column + 1]
-                    self.board[last_move.end_row][last_move.end_column + 1] = "--"
+                    rook = self.remove_piece(last_move.end_row, last_move.end_column + 1)
+                    self.put_piece(rook, last_move.end_row, last_move.end_column - 2)
+
+            # Хеш предыдущей позиции уже лежит в логе, пересчитывать его не нужно
+            undone_key = self.zobrist_log.pop()
+            count = self.repetition_counts[undone_key] - 1
+            if count:
+                self.repetition_counts[undone_key] = count
+            else:
+                del self.repetition_counts[undone_key]
+            self.zobrist_key = self.zobrist_log[-1]
 
     """
     Метод для обновления значений, отвечающих за возможность рокировки
@@ -195,11 +490,24 @@ class GameState:
                     elif move.start_column == 7:
                         self.current_castle_rights.bks = False
 
+        # Если ладья была съедена на своём начальном квадрате, то рокировка с ней тоже больше невозможна
+        if move.piece_captured == 'wR' and move.end_row == 7:
+            if move.end_column == 0:
+                self.current_castle_rights.wqs = False
+            elif move.end_column == 7:
+                self.current_castle_rights.wks = False
+        elif move.piece_captured == 'bR' and move.end_row == 0:
+            if move.end_column == 0:
+                self.current_castle_rights.bqs = False
+            elif move.end_column == 7:
+                self.current_castle_rights.bks = False
+
     """
-    Возможные ходы с учётом шахов
+    Возможные ходы с учётом шахов. Если indexed=True, то возвращается MoveSet - тот же список ходов, но с индексами
+    для быстрого поиска хода по квадратам (нужно интерфейсу, который проверяет ходы игрока).
     """
 
-    def get_valid_moves(self):
+    def get_valid_moves(self, indexed=False):
         moves = []
         self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
         temp_castle_rights = CastleRights(self.current_castle_rights.wks, self.current_castle_rights.bks,
@@ -218,39 +526,24 @@ class GameState:
         if self.in_check:
             if len(self.checks) == 1:  # объявлен шах одной фигурой => можно заблокироваться другой фигурой (если шах
                 # ставит не конь) или отойти
-                moves = self.get_all_possible_moves()
-
                 # Блокировка от шаха. Чтобы заблокироваться достаточно поставить какую-либо из фигур между королём
-                # и фигурой, объявляющей шах
-                check = self.checks[0]
-                check_row = check[0]
-                check_col = check[1]
-                checking_piece = self.board[check_row][check_col]  # Узнаём, какая фигура поставила шах
-                valid_squares = []  # Сюда будут записываться квадраты, на которые можно встать, чтобы заблокироваться
-
-                # Если шах поставил конь, то, чтобы избавиться от шаха можно только забрав коня или отойдя королём
-                if checking_piece[1] == 'N':
-                    valid_squares = [(check_row, check_col)]
-                # В остальных случаях можно заблокироваться
-                else:
-                    for i in range(1, 8):
-                        # check[2] и check[3] показывают направление, откуда объявлен шах
-                        valid_square = (king_row + check[2] * i, king_col + check[3] * i)
-                        valid_squares.append(valid_square)
-                        # В случае, если для того чтобы избавиться от шаха, можно ТОЛЬКО съесть фигуру, то это
-                        # единственный возможный ход и нет необходимости рассматривать другие. Прерываем цикл
-                        if valid_square[0] == check_row and valid_square[1] == check_col:
-                            break
-
-                # Теперь нужно удалить все остальные, недоступные при шахе ходы
-                # Чтобы корректно удалить ходы, их нужно удалять в обратном порядке, для этого будем итерироваться
-                # с конца
-                for i in range(len(moves) - 1, -1, -1):
-                    if moves[i].piece_moved[1] != 'K':
-                        # Если ход не блокирует шах или не 'съедает' фигуру, которая ставит шах, то убираем ход
-                        # из списка возможных
-                        if (moves[i].end_row, moves[i].end_column) not in valid_squares:
-                            moves.remove(moves[i])
+                # и фигурой, объявляющей шах, или съесть её. Все такие квадраты собираем в одну маску: квадраты
+                # между королём и фигурой берём из таблицы BETWEEN (для коня она пустая, т.к. от него не закрыться)
+                check_row, check_col = self.checks[0][0], self.checks[0][1]
+                check_square = check_row * 8 + check_col
+                check_mask = BETWEEN[king_row * 8 + king_col][check_square] | SQUARE_BB[check_square]
+
+                # Ходы фигур, кроме короля, сразу генерируются только на квадраты маски. Съедение 'на проходе'
+                # забирает пешку не на конечном квадрате хода, поэтому для пешек его квадрат добавляем отдельно, если
+                # съедаемая пешка и есть фигура, объявившая шах
+                pawn_mask = check_mask
+                if self.en_passant_square != ():
+                    en_passant_row, en_passant_col = self.en_passant_square
+                    captured_row = en_passant_row + 1 if self.white_turn else en_passant_row - 1
+                    if (captured_row, en_passant_col) == (check_row, check_col):
+                        pawn_mask |= SQUARE_BB[en_passant_row * 8 + en_passant_col]
+                self.generate_piece_moves(moves, 'w' if self.white_turn else 'b', pawn_mask, check_mask)
+                self.get_king_moves(king_row, king_col, moves)
             else:  # Объявлен двойной шах. В этом случае избавитсья от шаха можно только сходив королём
                 self.get_king_moves(king_row, king_col, moves)
         else:  # Шахи не объявлены, значит все ходы возможны
@@ -263,243 +556,452 @@ class GameState:
 
         self.current_castle_rights = temp_castle_rights
 
-        # Проверка, не стоит ли мат или пат
-        if len(moves) == 0:
-            if self.in_check:
-                self.checkmate = True
-            else:
-                self.stalemate = True
+        # Проверка, не стоит ли мат или пат. Флаги пересчитываются при каждом вызове, так как после отмены хода (в том
+        # числе во время поиска хода компьютером) мата или пата может уже не быть
+        self.checkmate = len(moves) == 0 and self.in_check
+        self.stalemate = len(moves) == 0 and not self.in_check
+        # Мат или пат важнее ничьей по правилам: например, мат последним ходом перед правилом 50 ходов
+        self.draw = len(moves) != 0 and self.get_draw_reason() is not None
 
+        if indexed:
+            return MoveSet(moves)
         return moves
 
+    """
+    Причина ничьей по правилам в текущей позиции или None:
+    'repetition' - позиция повторилась repetitions раз (по правилам - троекратное повторение),
+    'fifty_moves' - 50 ходов (100 полуходов) без хода пешкой и взятия,
+    'insufficient_material' - ни одна из сторон не может поставить мат.
+    Поиск вызывает метод с repetitions=2 в каждом узле: повторение позиции внутри варианта считается ничьей, иначе
+    поиск ходил бы по кругу. Мат и пат здесь не проверяются, их находит get_valid_moves.
+    """
+
+    def get_draw_reason(self, repetitions=3):
+        if self.halfmove_clock >= 100:
+            return "fifty_moves"
+        if self.repetition_counts[self.zobrist_key] >= repetitions:
+            return "repetition"
+        if self.is_insufficient_material():
+            return "insufficient_material"
+        return None
+
+    """
+    Недостаточно материала для мата: на доске только короли и не больше одной лёгкой фигуры, либо только слоны, все
+    на полях одного цвета. Количество и расположение фигур берутся из битбордов, доска не перебирается.
+    """
+
+    def is_insufficient_material(self):
+        bitboards = self.bitboards
+        if bitboards["wP"] | bitboards["bP"] | bitboards["wR"] | bitboards["bR"] | bitboards["wQ"] | bitboards["bQ"]:
+            return False
+        knights = bitboards["wN"] | bitboards["bN"]
+        bishops = bitboards["wB"] | bitboards["bB"]
+        if pop_count(knights | bishops) <= 1:
+            return True
+        return not knights and (not bishops & LIGHT_SQUARES or not bishops & DARK_SQUARES)
+
     """
     Возможные ходы без учёта шахов
     """
 
     def get_all_possible_moves(self):
         moves = []
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                # Переменной turn присваивается значение первого символа ячейки, таким образом можно узнать, есть ли
-                # в текущей ячейке фигура и, если она там есть, то мы будем знать, какого она цвета.
-                turn = self.board[row][col][0]
-                if (turn == 'w' and self.white_turn) or (turn == "b" and not self.white_turn):
-                    piece = self.board[row][col][1]
-                    self.move_functions[piece](row, col, moves)  # Вызывает метод для конкретных фигур из словаря
+        ally_color = 'w' if self.white_turn else 'b'
+        # Вместо перебора всех 64 квадратов доски перебираем только установленные биты в битбордах фигур текущего цвета
+        for piece_type, move_function in self.move_functions.items():
+            bitboard = self.bitboards[ally_color + piece_type]
+            while bitboard:
+                lowest_bit = bitboard & -bitboard
+                square = lowest_bit.bit_length() - 1
+                move_function(square >> 3, square & 7, moves)  # Вызывает метод для конкретных фигур из словаря
+                bitboard ^= lowest_bit
         return moves
 
     """
-    Получить все возможные ходы для пешки, расположенной в конкретной ячейке (row, col) и добавить эти ходы в список
+    Поэтапная генерация ходов для поиска. Ходы выдаются по одному в три этапа:
+    1) ход из таблицы транспозиций hash_move_id (moveID), если он возможен в этой позиции;
+    2) взятия и превращения, от самой ценной съедаемой фигуры к менее ценной;
+    3) тихие ходы и рокировки, отсортированные по убыванию quiet_order_key(move), если он передан.
+    Каждый этап генерируется, только когда до него дошла очередь, поэтому после отсечения на ходе из таблицы или на
+    взятии тихие ходы не генерируются вовсе. При captures_only=True третьего этапа нет (для форсированного поиска).
+
+    Ходы генерируются 'псевдолегально': маски 'закреплений' и шаха накладываются сразу (это одна операция AND), а
+    безопасность квадрата для хода короля, самая дорогая проверка, выполняется лениво - только когда до хода дошла
+    очередь. Между выдачей ходов поиск делает и отменяет ходы в дочерних позициях, поэтому всё, что относится к
+    текущей позиции (маски, 'закрепления'), хранится в локальных переменных генератора.
     """
 
-    def get_pawn_moves(self, row, col, moves):
-        piece_pinned = False
-        pin_direction = ()
+    def generate_moves_staged(self, hash_move_id=0, quiet_order_key=None, captures_only=False):
+        in_check, pins, checks = self.check_for_pins_and_checks()
+        if self.white_turn:
+            ally_color = 'w'
+            enemy_color = 'b'
+            promotion_row = ROW_BB[0]
+            king_row, king_col = self.white_king_location
+        else:
+            ally_color = 'b'
+            enemy_color = 'w'
+            promotion_row = ROW_BB[7]
+            king_row, king_col = self.black_king_location
+        king_square = king_row * 8 + king_col
+        double_check = len(checks) > 1
+
+        # Квадраты, на которые могут ходить фигуры, кроме короля: при шахе - квадраты между королём и фигурой,
+        # объявившей шах, и квадрат самой фигуры
+        check_mask = FULL_BOARD
+        en_passant_bit = 0
+        if self.en_passant_square != ():
+            en_passant_row, en_passant_col = self.en_passant_square
+            en_passant_bit = SQUARE_BB[en_passant_row * 8 + en_passant_col]
+        en_passant_target = en_passant_bit
+        if in_check and not double_check:
+            check_row, check_col = checks[0][0], checks[0][1]
+            check_square = check_row * 8 + check_col
+            check_mask = BETWEEN[king_square][check_square] | SQUARE_BB[check_square]
+            if en_passant_bit:
+                # Съедение 'на проходе' спасает от шаха, если съедаемая пешка и объявила шах
+                captured_row = en_passant_row + 1 if self.white_turn else en_passant_row - 1
+                if (captured_row, en_passant_col) != (check_row, check_col) and not en_passant_bit & check_mask:
+                    en_passant_target = 0
+
+        # Этап 1: ход из таблицы транспозиций. Ход мог попасть в таблицу из другой позиции с тем же индексом, поэтому
+        # проверяем его, генерируя ходы только той фигуры, которая стоит на его начальном квадрате
+        hash_move = None
+        if hash_move_id:
+            start_square = hash_move_id & 63
+            start_row, start_col = start_square >> 3, start_square & 7
+            piece = self.board[start_row][start_col]
+            if piece[0] == ally_color:
+                self.pins = pins
+                candidates = []
+                if piece[1] == 'K':
+                    self.add_moves(start_row, start_col, KING_ATTACKS[start_square] & ~self.occupancy[ally_color],
+                                   candidates)
+                    if not in_check:
+                        self.get_castle_moves(start_row, start_col, candidates)
+                elif not double_check:
+                    pawn_mask = check_mask | en_passant_target if piece[1] == 'P' else check_mask
+                    self.move_functions[piece[1]](start_row, start_col, candidates, pawn_mask)
+                for move in candidates:
+                    if move.moveID == hash_move_id:
+                        hash_move = move
+                        break
+            if hash_move is not None and self.is_king_move_safe(hash_move, enemy_color):
+                yield hash_move
+
+        # Этап 2: взятия и превращения пешек (в том числе без взятия)
+        enemy_occupancy = self.occupancy[enemy_color]
+        moves = []
+        self.pins = pins
+        if not double_check:
+            self.generate_piece_moves(moves, ally_color, ((enemy_occupancy | promotion_row) & check_mask) |
+                                      en_passant_target, enemy_occupancy & check_mask)
+        self.add_moves(king_row, king_col, KING_ATTACKS[king_square] & enemy_occupancy, moves)
+        moves.sort(key=capture_order_key, reverse=True)
+        for move in moves:
+            if move.moveID != hash_move_id and self.is_king_move_safe(move, enemy_color):
+                yield move
+
+        if captures_only:
+            return
 
-        for i in range(len(self.pins) - 1, -1, -1):  # Проверяем, 'закреплена' ли текущая пешка
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                # Устанавливаем направление, откуда идёт 'закрепление' пешки
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        # Этап 3: тихие ходы
+        empty_squares = ~self.all_occupancy & FULL_BOARD
+        moves = []
+        self.pins = pins
+        if not double_check:
+            self.generate_piece_moves(moves, ally_color, empty_squares & ~promotion_row & ~en_passant_bit & check_mask,
+                                      empty_squares & check_mask)
+        self.add_moves(king_row, king_col, KING_ATTACKS[king_square] & empty_squares, moves)
+        if not in_check:
+            self.get_castle_moves(king_row, king_col, moves)
+        if quiet_order_key is not None:
+            moves.sort(key=quiet_order_key, reverse=True)
+        for move in moves:
+            if move.moveID != hash_move_id and self.is_king_move_safe(move, enemy_color):
+                yield move
+
+    """
+    Сгенерировать ходы всех фигур текущего цвета, кроме короля: пешки ходят на квадраты pawn_targets, остальные
+    фигуры - на piece_targets
+    """
+
+    def generate_piece_moves(self, moves, ally_color, pawn_targets, piece_targets):
+        for piece_type, move_function in self.move_functions.items():
+            if piece_type == 'K':
+                continue
+            targets = pawn_targets if piece_type == 'P' else piece_targets
+            if not targets:
+                continue
+            bitboard = self.bitboards[ally_color + piece_type]
+            while bitboard:
+                lowest_bit = bitboard & -bitboard
+                square = lowest_bit.bit_length() - 1
+                move_function(square >> 3, square & 7, moves, targets)
+                bitboard ^= lowest_bit
+
+    """
+    Ленивая проверка легальности хода из generate_moves_staged. Для всех ходов, кроме хода короля, легальность уже
+    обеспечена масками при генерации. Король не должен встать на атакованный квадрат; атака проверяется при занятости
+    доски без короля, чтобы отход вдоль линии шаха тоже был отброшен. Рокировки проверяются при генерации.
+    """
+
+    def is_king_move_safe(self, move, enemy_color):
+        if move.piece_moved[1] != 'K' or move.is_castling_move:
+            return True
+        occupancy = self.all_occupancy & ~SQUARE_BB[move.start_row * 8 + move.start_column]
+        return not self.is_square_attacked(move.end_row, move.end_column, enemy_color, occupancy)
+
+    """
+    Находится ли король текущего цвета под шахом. Дешевле check_for_pins_and_checks, т.к. 'закрепления' не ищутся.
+    """
+
+    def is_in_check(self):
+        if self.white_turn:
+            king_row, king_col = self.white_king_location
+            return self.is_square_attacked(king_row, king_col, 'b')
+        king_row, king_col = self.black_king_location
+        return self.is_square_attacked(king_row, king_col, 'w')
+
+    """
+    Добавить в список ходы фигуры с квадрата (row, col) на все квадраты из битборда targets
+    """
+
+    def add_moves(self, row, col, targets, moves):
+        while targets:
+            lowest_bit = targets & -targets
+            end_square = lowest_bit.bit_length() - 1
+            moves.append(Move((row, col), (end_square >> 3, end_square & 7), self.board))
+            targets ^= lowest_bit
+
+    """
+    Восстановить объект Move из упакованного 16-битного хода для текущей позиции
+    """
+
+    def move_from_encoded(self, encoded):
+        start_square, end_square, flag, promotion_code = decode_move(encoded)
+        return Move((start_square >> 3, start_square & 7), (end_square >> 3, end_square & 7), self.board,
+                    is_en_passant_move=flag == MOVE_FLAG_EN_PASSANT, is_castling_move=flag == MOVE_FLAG_CASTLING,
+                    promotion_piece=Move.promotion_pieces[promotion_code])
+
+    """
+    Получить все возможные ходы для пешки, расположенной в конкретной ячейке (row, col) и добавить эти ходы в список
+    """
+
+    def get_pawn_moves(self, row, col, moves, targets=FULL_BOARD):
+        square = row * 8 + col
+        # Если пешка 'закреплена', то она может ходить только вдоль луча между королём и 'закрепляющей' фигурой
+        pin_mask = self.pins.get(square, FULL_BOARD) & targets
 
         # Устанавливаем характеристики ходов для текущего цвета фигуры
         if self.white_turn:
             squares_amount = -1
             start_row = 6
+            ally_color = 'w'
             enemy_color = 'b'
         else:
             squares_amount = 1
             start_row = 1
+            ally_color = 'b'
             enemy_color = 'w'
 
         if self.board[row + squares_amount][col] == "--":  # Движение на 1 клетку вперёд
-            if not piece_pinned or pin_direction == (squares_amount, 0):
-                moves.append(Move((row, col), (row + squares_amount, col), self.board))
-                if row == start_row and self.board[row + 2 * squares_amount][col] == "--":  # Продвижение на 2 клетки
-                    moves.append(Move((row, col), (row + 2 * squares_amount, col), self.board))
-
-        if col - 1 >= 0:  # Съедение пешки слева
-            if not piece_pinned or pin_direction == (squares_amount, -1):
-                if self.board[row + squares_amount][col - 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + squares_amount, col - 1), self.board))
-                if (row + squares_amount, col - 1) == self.en_passant_square:  # Съедение 'на проходе'
-                    moves.append(Move((row, col), (row + squares_amount, col - 1), self.board, is_en_passant_move=True))
-
-        if col + 1 <= 7:  # Съедение пешки справа
-            if not piece_pinned or pin_direction == (squares_amount, 1):
-                if self.board[row + squares_amount][col + 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + squares_amount, col + 1), self.board))
-                if (row + squares_amount, col + 1) == self.en_passant_square:  # Съедение 'на проходе'
-                    moves.append(Move((row, col), (row + squares_amount, col + 1), self.board, is_en_passant_move=True))
+            if pin_mask & SQUARE_BB[square + 8 * squares_amount]:
+                self.add_pawn_move(row, col, row + squares_amount, col, moves)
+            # Продвижение на 2 клетки проверяется отдельно: при шахе закрыться может только оно
+            if row == start_row and self.board[row + 2 * squares_amount][col] == "--" and \
+                    pin_mask & SQUARE_BB[square + 16 * squares_amount]:
+                moves.append(Move((row, col), (row + 2 * squares_amount, col), self.board))
+
+        # Квадраты, которые бьёт пешка, берём из заранее посчитанной таблицы
+        attacks = PAWN_ATTACKS[ally_color][square] & pin_mask
+        captures = attacks & self.occupancy[enemy_color]
+        while captures:
+            lowest_bit = captures & -captures
+            end_square = lowest_bit.bit_length() - 1
+            self.add_pawn_move(row, col, end_square >> 3, end_square & 7, moves)
+            captures ^= lowest_bit
+
+        if self.en_passant_square != ():  # Съедение 'на проходе'
+            end_row, end_col = self.en_passant_square
+            end_bit = SQUARE_BB[end_row * 8 + end_col]
+            if attacks & end_bit and not self.en_passant_exposes_king(square, end_bit, row * 8 + end_col):
+                moves.append(Move((row, col), (end_row, end_col), self.board, is_en_passant_move=True))
 
     """
-    Получить все возможные ходы для ладьи, расположенной в конкретной ячейке (row, col) и добавить эти ходы в список
+    Добавить ход пешки. Если пешка доходит до последнего ряда, то добавляются четыре хода - превращение в ферзя,
+    ладью, слона и коня.
     """
 
-    def get_rook_moves(self, row, col, moves):
-        piece_pinned = False
-        pin_direction = ()
-
-        for i in range(len(self.pins) - 1, -1, -1):  # Проверяем, 'закреплена' ли ладья
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                if self.board[row][col][1] != 'Q':  # Так как ферзь заимствует возможные ходы ладьи, то нужна проверка
-                    self.pins.remove(self.pins[i])
-                break
-
-        directions = ((-1, 0), (0, 1), (1, 0), (0, -1))  # Четыре всевозможных направления для ходов ладьи
-        enemy_color = 'b' if self.white_turn else 'w'  # Помечаем цвет фигуры противника
-
-        for direction in directions:  # Проверяем каждое из направлений
-            for i in range(1, 8):
-                # В начале каждого цикла проверяем следующую по направлению клетку.
-                end_row = row + direction[0] * i
-                end_col = col + direction[1] * i
+    def add_pawn_move(self, row, col, end_row, end_col, moves):
+        if end_row == 0 or end_row == 7:
+            for promotion_piece in Move.promotion_pieces:
+                moves.append(Move((row, col), (end_row, end_col), self.board, promotion_piece=promotion_piece))
+        else:
+            moves.append(Move((row, col), (end_row, end_col), self.board))
 
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                    # Проверка на то, 'закреплена' ли фигура, если да, то её ходы ограничены.
-                    if not piece_pinned or pin_direction == direction or pin_direction == (-direction[0],
-                                                                                           -direction[1]):
-                        next_square = self.board[end_row][end_col]
+    """
+    Съедение 'на проходе' убирает с доски сразу две пешки, и обычная проверка 'закреплений' этого не учитывает. Например,
+    если король и ладья противника стоят на одной горизонтали с обеими пешками, то после взятия король окажется под
+    шахом. Проверяем лучи от короля при занятости доски после взятия.
+    """
 
-                        if next_square == "--":  # Проверка на то, пустая ли следующая клетка
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
+    def en_passant_exposes_king(self, from_square, end_bit, captured_square):
+        if self.white_turn:
+            ally_color = 'w'
+            enemy_color = 'b'
+        else:
+            ally_color = 'b'
+            enemy_color = 'w'
+        king = self.bitboards[ally_color + 'K']
+        if not king:
+            return False
+        king_square = king.bit_length() - 1
+        bitboards = self.bitboards
+        occupancy = (self.all_occupancy & ~SQUARE_BB[from_square] & ~SQUARE_BB[captured_square]) | end_bit
+        if rook_attacks(king_square, occupancy) & (bitboards[enemy_color + 'R'] | bitboards[enemy_color + 'Q']):
+            return True
+        return bool(bishop_attacks(king_square, occupancy) & (bitboards[enemy_color + 'B'] |
+                                                              bitboards[enemy_color + 'Q']))
 
-                        elif next_square[0] == enemy_color:  # Стоит ли на следующей клетке вражеска фигура
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                            break
+    """
+    Получить все возможные ходы для ладьи, расположенной в конкретной ячейке (row, col) и добавить эти ходы в список
+    """
 
-                        else:  # Иначе упираемся в союзную фигуру, ходы невозможны
-                            break
-                else:  # Выход за доску
-                    break
+    def get_rook_moves(self, row, col, moves, targets=FULL_BOARD):
+        square = row * 8 + col
+        ally_color = 'w' if self.white_turn else 'b'  # Помечаем цвет союзной фигуры
+        # Атаку ладьи по горизонтали и вертикали берём из таблиц по занятости доски, убирая квадраты с союзными фигурами
+        targets &= rook_attacks(square, self.all_occupancy) & ~self.occupancy[ally_color]
+        if square in self.pins:  # 'Закреплённая' ладья может двигаться только по лучу 'закрепления'
+            targets &= self.pins[square]
+        self.add_moves(row, col, targets, moves)
 
     """
     Получить все возможные ходы для коня, расположенного в конкретной ячейке (row, col) и добавить эти ходы в список
     """
 
-    def get_knight_moves(self, row, col, moves):
-        piece_pinned = False
-        for i in range(len(self.pins) - 1, -1, -1):  # Проверка 'закрепления' фигуры
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                self.pins.remove(self.pins[i])
-                break
+    def get_knight_moves(self, row, col, moves, targets=FULL_BOARD):
+        square = row * 8 + col
+        if square in self.pins:  # 'Закреплённый' конь не может сделать ни одного хода
+            return
 
-        # Всевозможные ходы конём от текущего положения фигуры.
-        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
         ally_color = 'w' if self.white_turn else 'b'  # Получаем цвет союзной фигуры
-
-        for move in knight_moves:
-            end_row = row + move[0]
-            end_col = col + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:  # Проверка на то, чтобы не выйти за границы доски
-                if not piece_pinned:  # Проверяем, не 'закреплена' ли фигура
-                    end_piece = self.board[end_row][end_col]
-                    # Если на конечной клетке фигурыы нет союзной фигуры, то мы можем поместить туда коня.
-                    if end_piece[0] != ally_color:
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
+        # Все квадраты, которые бьёт конь, кроме квадратов с союзными фигурами
+        self.add_moves(row, col, KNIGHT_ATTACKS[square] & ~self.occupancy[ally_color] & targets, moves)
 
     """
     Получить все возможные ходы для слона, расположенного в конкретной ячейке (row, col) и добавить эти ходы в список
     """
 
-    def get_bishop_moves(self, row, col, moves):
-        piece_pinned = False
-        pin_direction = ()
-
-        for i in range(len(self.pins) - 1, -1, -1):  # Проверка, 'закрепления' фигуры
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+    def get_bishop_moves(self, row, col, moves, targets=FULL_BOARD):
+        square = row * 8 + col
+        ally_color = 'w' if self.white_turn else 'b'
+        targets &= bishop_attacks(square, self.all_occupancy) & ~self.occupancy[ally_color]
+        if square in self.pins:  # Проверка на то, не 'закреплён' ли слон
+            targets &= self.pins[square]
+        self.add_moves(row, col, targets, moves)
 
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemy_color = 'b' if self.white_turn else 'w'  # Помечаем цвет фигуры противника
-
-        for direction in directions:  # Проверяем каждое из направлений
-            for i in range(1, 8):
-                # В начале каждого цикла проверяем следующую по направлению клетку.
-                end_row = row + direction[0] * i
-                end_col = col + direction[1] * i
-
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                    # Проверка на то, не 'закреплена' ли фигура
-                    if not piece_pinned or pin_direction == direction or pin_direction == (-direction[0],
-                                                                                           -direction[1]):
-                        next_square = self.board[end_row][end_col]
+    """
+    Получить все возможные ходы для ферзя, расположенного в конкретной ячейке (row, col) и добавить эти ходы в список
+    """
 
-                        if next_square == "--":  # Проверка на то, пустая ли следующая клетка
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
+    def get_queen_moves(self, row, col, moves, targets=FULL_BOARD):
+        square = row * 8 + col
+        ally_color = 'w' if self.white_turn else 'b'
+        # Ферзь ходит как ладья и слон одновременно
+        targets &= queen_attacks(square, self.all_occupancy) & ~self.occupancy[ally_color]
+        if square in self.pins:
+            targets &= self.pins[square]
+        self.add_moves(row, col, targets, moves)
 
-                        elif next_square[0] == enemy_color:  # Стоит ли на следующей клетке вражеска фигура
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                            break
+    """
+    Получить все возможные ходы для короля, расположенного в конкретной ячейке (row, col) и добавить эти ходы в список
+    """
 
-                        else:  # Иначе упираемся в союзную фигуры, ходы невозможны
-                            break
-                else:  # Выход за доску
-                    break
+    def get_king_moves(self, row, col, moves, targets=FULL_BOARD):
+        if self.white_turn:  # Помечаем цвет союзной фигуры и фигуры противника
+            ally_color = 'w'
+            enemy_color = 'b'
+        else:
+            ally_color = 'b'
+            enemy_color = 'w'
+        # Всевозможные ходы короля, кроме квадратов с союзными фигурами и квадратов, которые бьёт противник.
+        # Карта атак противника считается так, будто короля нет на доске, поэтому отход короля вдоль линии шаха
+        # тоже будет отброшен.
+        targets &= KING_ATTACKS[row * 8 + col] & ~self.occupancy[ally_color] & ~self.get_attack_map(enemy_color)
+        self.add_moves(row, col, targets, moves)
 
     """
-    Получить все возможные ходы для ферзя, расположенного в конкретной ячейке (row, col) и добавить эти ходы в список
+    Функция определяет, находится ли конкретный квадрат под атакой противника. Нужно для корректного проведения
+    рокировки.
     """
 
-    def get_queen_moves(self, row, col, moves):
-        self.get_rook_moves(row, col, moves)
-        self.get_bishop_moves(row, col, moves)
+    def square_under_attack(self, row, col):
+        return self.is_square_attacked(row, col, 'b' if self.white_turn else 'w')
 
     """
-    Получить все возможные ходы для короля, расположенного в конкретной ячейке (row, col) и добавить эти ходы в список
+    Бьёт ли хотя бы одна фигура цвета by_color квадрат (row, col). Вместо генерации всех ходов противника смотрим из
+    самого квадрата: фигура бьёт квадрат тогда и только тогда, когда такая же фигура, поставленная на этот квадрат,
+    'била' бы её. Параметр occupancy позволяет проверить квадрат при другой занятости доски.
     """
 
-    def get_king_moves(self, row, col, moves):
-        # Всевозможные ходы короля
-        possible_king_moves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
-        ally_color = 'w' if self.white_turn else 'b'  # Помечаем цвет союзной фигуры
-
-        for i in range(8):
-            end_row = row + possible_king_moves[i][0]
-            end_col = col + possible_king_moves[i][1]
-
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                next_square = self.board[end_row][end_col]
-
-                # Проверка на то, является ли следующий квадрат союзной фигурой.
-                if next_square[0] != ally_color:
-                    # Чтобы понять, возможен ли ход королём, надо проверить, вызывает ли этот ход шах.
-                    # Для этого временно установим новое положение короля (в зависимости от цвета)
-                    if ally_color == 'w':
-                        self.white_king_location = (end_row, end_col)
-                    else:
-                        self.black_king_location = (end_row, end_col)
-                    # И проверяем, попадает ли король под шахи
-                    in_check, pins, checks = self.check_for_pins_and_checks()
-                    # Если нет, то ход возможен
-                    if not in_check:
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                    # Иначе ход не будет добавлен в список возможных. В конце итерации делаем положение короля прежним.
-                    if ally_color == 'w':
-                        self.white_king_location = (row, col)
-                    else:
-                        self.black_king_location = (row, col)
+    def is_square_attacked(self, row, col, by_color, occupancy=None):
+        square = row * 8 + col
+        bitboards = self.bitboards
+        if occupancy is None:
+            occupancy = self.all_occupancy
+        defender_color = 'b' if by_color == 'w' else 'w'
+
+        if KNIGHT_ATTACKS[square] & bitboards[by_color + 'N']:
+            return True
+        if PAWN_ATTACKS[defender_color][square] & bitboards[by_color + 'P']:
+            return True
+        if KING_ATTACKS[square] & bitboards[by_color + 'K']:
+            return True
+        if bishop_attacks(square, occupancy) & (bitboards[by_color + 'B'] | bitboards[by_color + 'Q']):
+            return True
+        return bool(rook_attacks(square, occupancy) & (bitboards[by_color + 'R'] | bitboards[by_color + 'Q']))
 
     """
-    Функция определяет, находится ли конкретный квадрат под атакой. Нужно для корректного проведения рокировки.
+    Карта атак: битборд всех квадратов, которые бьют фигуры цвета color. Король другого цвета при этом не загораживает
+    лучи. Карта считается один раз на позицию и хранится в self.attack_maps до следующего make_move или undo_move.
     """
 
-    def square_under_attack(self, row, col):
-        self.white_turn = not self.white_turn  # Меняем очередь хода
-        enemy_moves = self.get_all_possible_moves()  # Получаем все ходы противника
-        self.white_turn = not self.white_turn  # Меняем очерёдность обратно
-        for move in enemy_moves:
-            if move.end_row == row and move.end_column == col:  # Если это условие выполняется - квадрат под атакой
-                return True
-        return False  # Если ни один из ходов противника не нападет на квадрат, возвращаем False
+    def get_attack_map(self, color):
+        attack_map = self.attack_maps[color]
+        if attack_map is None:
+            attack_map = self.compute_attack_map(color)
+            self.attack_maps[color] = attack_map
+        return attack_map
+
+    def compute_attack_map(self, color):
+        bitboards = self.bitboards
+        occupancy = self.all_occupancy & ~bitboards[('b' if color == 'w' else 'w') + 'K']
+        attack_map = pawn_attacks_bulk(color, bitboards[color + 'P'])
+
+        king = bitboards[color + 'K']
+        if king:
+            attack_map |= KING_ATTACKS[king.bit_length() - 1]
+
+        knights = bitboards[color + 'N']
+        while knights:
+            lowest_bit = knights & -knights
+            attack_map |= KNIGHT_ATTACKS[lowest_bit.bit_length() - 1]
+            knights ^= lowest_bit
+
+        diagonal_pieces = bitboards[color + 'B'] | bitboards[color + 'Q']  # Слоны и ферзи
+        while diagonal_pieces:
+            lowest_bit = diagonal_pieces & -diagonal_pieces
+            attack_map |= bishop_attacks(lowest_bit.bit_length() - 1, occupancy)
+            diagonal_pieces ^= lowest_bit
+
+        straight_pieces = bitboards[color + 'R'] | bitboards[color + 'Q']  # Ладьи и ферзи
+        while straight_pieces:
+            lowest_bit = straight_pieces & -straight_pieces
+            attack_map |= rook_attacks(lowest_bit.bit_length() - 1, occupancy)
+            straight_pieces ^= lowest_bit
+        return attack_map
 
     """
     Сгенерировать все возможные рокировки для короля на поле (row, col) и добавить их в список возможных ходов
@@ -535,8 +1037,10 @@ class GameState:
     """
 
     def check_for_pins_and_checks(self):
-        pins = []  # Список с квадратами, где 'закреплены' союзные фигуры и направление, откуда фигура 'закреплена'
-        checks = []  # Квадраты, из которых может быть поставлен шах
+        # Словарь 'закреплений': ключ - квадрат 'закреплённой' союзной фигуры, значение - битборд квадратов луча между
+        # королём и 'закрепляющей' фигурой (включая её саму), только по которым 'закреплённая' фигура может ходить
+        pins = {}
+        checks = []  # Квадраты, из которых поставлен шах, и направление от короля к фигуре, которая ставит шах
         in_check = False
 
         if self.white_turn:
@@ -550,64 +1054,50 @@ class GameState:
             start_row = self.black_king_location[0]
             start_col = self.black_king_location[1]
 
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            direction = directions[j]
-            possible_pin = ()  # Обновляем возможные 'закрепления'
-            for i in range(1, 8):
-                end_row = start_row + direction[0] * i
-                end_col = start_col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                    end_piece = self.board[end_row][end_col]  # Присваиваем значение конкретного квадрата на доске
-                    # Если этот квадрат оказался фигурой, то она потенциально может быть 'закреплена'
-                    if end_piece[0] == ally_color and end_piece[1] != 'K':
-                        # Проверка на то первая ли текущая фигура в заданном направление перед королём, и если да,
-                        # то эта фигура может быть 'закреплена'
-                        if possible_pin == ():
-                            possible_pin = (end_row, end_col, direction[0], direction[1])
-                        # В противном случае перед королём в заданном направлении две или более фигур, 'закрепления' нет
-                        else:
-                            break
-                    elif end_piece[0] == enemy_color:
-                        """
-                        В следующем условном блоке рассматривается 5 возможных ситуаций:    
-                        1) фигура расположена ортогонально от короля и является ладьёй
-                        2) фигура расположена диагонально от короля и является слоном
-                        3) фигура расположена диагонально в расстоянии 1 квадрата и является пешкой
-                        4) фигура расположена в любом из направлений и является ферзём
-                        5) фигура расположена в любом из направлений и является королём противника (этот блок необходим
-                        для того, чтобы не допустить возможности хода королём на квадрат, который контролируется другим
-                        королём)
-                        """
-                        piece_type = end_piece[1]
-
-                        if (0 <= j <= 3 and piece_type == 'R') or \
-                                (4 <= j <= 7 and piece_type == 'B') or \
-                                (i == 1 and piece_type == 'P' and ((enemy_color == 'w' and 6 <= j <= 7) or
-                                                                   (enemy_color == 'b' and 4 <= j <= 5))) or \
-                                (piece_type == 'Q') or (i == 1 and piece_type == 'K'):
-                            if possible_pin == ():  # Никакие фигуры не 'закреплены' => стоит шах
-                                in_check = True
-                                checks.append((end_row, end_col, direction[0], direction[1]))
-                                break
-                            else:  # Фигура стоит перед королём в заданном направлении => она 'закреплена'
-                                pins.append(possible_pin)
-                                break
-                        else:  # Если ни одно из условий не выполняется, то фигура противника не может поставить шах
-                            break
-                else:  # Если по заданному направлению нет фигур, то выходим из цикла
-                    break
-
-        # Отдельно стоит рассмотреть возможные шахи конём, так как логика в этом случае отличается
-        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for move in knight_moves:
-            end_row = start_row + move[0]
-            end_col = start_col + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] == enemy_color and end_piece[1] == 'N':  # Если конь ставит шах королю
-                    in_check = True
-                    checks.append((end_row, end_col, move[0], move[1]))
+        king_square = start_row * 8 + start_col
+        bitboards = self.bitboards
+        occupancy = self.all_occupancy
+        enemy_straight = bitboards[enemy_color + 'R'] | bitboards[enemy_color + 'Q']
+        enemy_diagonal = bitboards[enemy_color + 'B'] | bitboards[enemy_color + 'Q']
+
+        """
+        Фигура противника ставит шах, если фигура того же типа, стоящая на месте короля, 'била' бы её. Рассматриваются
+        все варианты:
+        1) ладья или ферзь по горизонтали или вертикали
+        2) слон или ферзь по диагонали
+        3) конь
+        4) пешка, стоящая по диагонали в расстоянии 1 квадрата
+        """
+        checkers = ((rook_attacks(king_square, occupancy) & enemy_straight) |
+                    (bishop_attacks(king_square, occupancy) & enemy_diagonal) |
+                    (KNIGHT_ATTACKS[king_square] & bitboards[enemy_color + 'N']) |
+                    (PAWN_ATTACKS[ally_color][king_square] & bitboards[enemy_color + 'P']))
+        while checkers:
+            lowest_bit = checkers & -checkers
+            end_square = lowest_bit.bit_length() - 1
+            end_row, end_col = end_square >> 3, end_square & 7
+            d_row = end_row - start_row
+            d_col = end_col - start_col
+            if self.board[end_row][end_col][1] != 'N':  # Для всех фигур, кроме коня, храним единичное направление
+                d_row = (d_row > 0) - (d_row < 0)
+                d_col = (d_col > 0) - (d_col < 0)
+            in_check = True
+            checks.append((end_row, end_col, d_row, d_col))
+            checkers ^= lowest_bit
+
+        # Возможные 'закрепляющие' фигуры - дальнобойные фигуры противника, которые 'били' бы короля, если бы на доске
+        # не было союзных фигур. Если между такой фигурой и королём ровно одна союзная фигура - она 'закреплена'
+        enemy_occupancy = self.occupancy[enemy_color]
+        snipers = ((rook_attacks(king_square, enemy_occupancy) & enemy_straight) |
+                   (bishop_attacks(king_square, enemy_occupancy) & enemy_diagonal))
+        while snipers:
+            lowest_bit = snipers & -snipers
+            sniper_square = lowest_bit.bit_length() - 1
+            ray = BETWEEN[king_square][sniper_square]
+            blockers = ray & occupancy
+            if blockers and blockers & (blockers - 1) == 0:  # Ровно одна фигура (союзная, т.к. луч до первой вражеской)
+                pins[blockers.bit_length() - 1] = ray | lowest_bit
+            snipers ^= lowest_bit
 
         return in_check, pins, checks
 
@@ -622,6 +1112,9 @@ class CastleRights:
     bqs - black queen side - аналогично с wqs, но за чёрных
     """
 
+    # Новый объект создаётся после каждого хода (см. castle_rights_log), поэтому атрибуты хранятся в слотах
+    __slots__ = ("wks", "bks", "wqs", "bqs")
+
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
         self.bks = bks
@@ -629,6 +1122,123 @@ class CastleRights:
         self.bqs = bqs
 
 
+"""
+Упаковка позиции для снимка партии. Каждый квадрат занимает 4 бита (код фигуры, 0 - пустой квадрат), два квадрата -
+один байт, вся доска - 32 байта. Очередь хода, рокировки, вертикаль взятия 'на проходе' и счётчики ходов хранятся в
+одном числе:
+бит 0      - очередь белых
+биты 1-4   - рокировки: белых в короткую и длинную сторону, чёрных в короткую и длинную
+биты 5-8   - вертикаль взятия 'на проходе' + 1 (0 - взятия нет). Горизонталь следует из очереди хода
+биты 9-24  - счётчик полуходов (halfmove_clock)
+биты 25-   - номер хода (fullmove_number)
+"""
+SNAPSHOT_PIECES = ("--", "wP", "wN", "wB", "wR", "wQ", "wK", "--", "--", "bP", "bN", "bB", "bR", "bQ", "bK")
+SNAPSHOT_PIECE_CODES = {piece: code for code, piece in enumerate(SNAPSHOT_PIECES) if piece != "--"}
+SNAPSHOT_PIECE_CODES["--"] = 0
+
+
+class GameSnapshot:
+    """
+    Снимок партии, который занимает в десятки раз меньше памяти, чем GameState (см. GameState.get_snapshot).
+    self.board - начальная позиция партии: 32 байта, по 4 бита на квадрат, квадраты в порядке row * 8 + col.
+    self.flags - очередь хода, рокировки, вертикаль взятия 'на проходе' и счётчики ходов начальной позиции в одном числе.
+    self.moves - ходы партии, упакованные в 16-битные числа (Move.encoded), в массиве array('H').
+    start - позиция (GameState), с которой партия началась.
+    """
+
+    __slots__ = ("board", "flags", "moves")
+
+    def __init__(self, start, moves):
+        packed = bytearray(32)
+        for row in range(8):
+            board_row = start.board[row]
+            for col in range(0, 8, 2):
+                packed[row * 4 + (col >> 1)] = SNAPSHOT_PIECE_CODES[board_row[col]] | \
+                                               (SNAPSHOT_PIECE_CODES[board_row[col + 1]] << 4)
+        self.board = bytes(packed)
+
+        rights = start.current_castle_rights
+        flags = start.white_turn | (rights.wks << 1) | (rights.wqs << 2) | (rights.bks << 3) | (rights.bqs << 4)
+        if start.en_passant_square != ():
+            flags |= (start.en_passant_square[1] + 1) << 5
+        self.flags = flags | (min(start.halfmove_clock, 0xFFFF) << 9) | (start.fullmove_number << 25)
+        self.moves = moves
+
+    # Запись FEN начальной позиции партии
+    def get_start_fen(self):
+        fen_rows = []
+        for row in range(8):
+            fen_row = ""
+            empty_squares = 0
+            for col in range(8):
+                piece = SNAPSHOT_PIECES[(self.board[row * 4 + (col >> 1)] >> ((col & 1) << 2)) & 15]
+                if piece == "--":
+                    empty_squares += 1
+                else:
+                    if empty_squares:
+                        fen_row += str(empty_squares)
+                        empty_squares = 0
+                    fen_row += PIECES_TO_FEN[piece]
+            if empty_squares:
+                fen_row += str(empty_squares)
+            fen_rows.append(fen_row)
+
+        flags = self.flags
+        white_turn = flags & 1
+        castling = "".join(symbol for bit, symbol in ((2, "K"), (4, "Q"), (8, "k"), (16, "q")) if flags & bit)
+        en_passant_col = ((flags >> 5) & 15) - 1
+        if en_passant_col < 0:
+            en_passant = "-"
+        else:
+            en_passant = Move.columns_to_files[en_passant_col] + ("6" if white_turn else "3")
+        return " ".join(("/".join(fen_rows), "w" if white_turn else "b", castling or "-", en_passant,
+                         str((flags >> 9) & 0xFFFF), str(flags >> 25)))
+
+    # Восстановить партию: новый GameState с начальной позицией снимка и всеми его ходами
+    def restore(self):
+        gs = GameState(self.get_start_fen())
+        for encoded in self.moves:
+            gs.make_move(gs.move_from_encoded(encoded))
+        return gs
+
+
+"""
+Упаковка хода в 16-битное число (так ходы занимают мало памяти и их удобно хранить в массивах и таблицах):
+биты 0-5   - номер начального квадрата (row * 8 + col)
+биты 6-11  - номер конечного квадрата
+биты 12-13 - фигура превращения пешки: 0 - ферзь, 1 - ладья, 2 - слон, 3 - конь
+биты 14-15 - тип хода: обычный, превращение пешки, взятие 'на проходе', рокировка
+"""
+MOVE_FLAG_NORMAL = 0
+MOVE_FLAG_PROMOTION = 1
+MOVE_FLAG_EN_PASSANT = 2
+MOVE_FLAG_CASTLING = 3
+PROMOTION_CODES = {"Q": 0, "R": 1, "B": 2, "N": 3}
+
+
+"""
+Порядок взятий в поэтапной генерации: сначала съедаются самые ценные фигуры, а среди взятий одной фигуры первыми
+идут взятия менее ценными фигурами. Превращение без взятия оценивается по ценности новой фигуры.
+"""
+CAPTURE_ORDER_VALUES = {"P": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 0, "-": 0}
+
+
+def capture_order_key(move):
+    victim = CAPTURE_ORDER_VALUES["P" if move.is_en_passant_move else move.piece_captured[1]]
+    if move.pawn_promotion:
+        victim += CAPTURE_ORDER_VALUES[move.promotion_piece]
+    return victim * 16 - CAPTURE_ORDER_VALUES[move.piece_moved[1]]
+
+
+def encode_move(start_square, end_square, flag=MOVE_FLAG_NORMAL, promotion_code=0):
+    return start_square | (end_square << 6) | (promotion_code << 12) | (flag << 14)
+
+
+# Возвращает кортеж (начальный квадрат, конечный квадрат, тип хода, код фигуры превращения)
+def decode_move(encoded):
+    return encoded & 63, (encoded >> 6) & 63, encoded >> 14, (encoded >> 12) & 3
+
+
 class Move:
     """
     Так как в классических шахматах доска в стобцах пронумерована от "a" до "h", а строки от 1 до 8,
@@ -640,45 +1250,128 @@ class Move:
     files_to_columns = {"a": 0, "b": 1, "c": 2, "d": 3,
                         "e": 4, "f": 5, "g": 6, "h": 7}
     columns_to_files = {value: key for key, value in files_to_columns.items()}
+    # Фигуры, в которые может превратиться пешка, в порядке их кодов в упакованном ходе
+    promotion_pieces = ("Q", "R", "B", "N")
+
+    # Ходов создаётся очень много, поэтому атрибуты хранятся в слотах, а не в словаре __dict__ каждого объекта.
+    # Генератор ходов и поиск по-прежнему работают с объектами Move: make_move и undo_move берут из хода фигуры
+    # piece_moved и piece_captured, а лог ходов нужен интерфейсу и PGN. Там, где ходы хранятся долго (таблица
+    # транспозиций, 'убийцы', история, общая память параллельного поиска), хранится только moveID или encoded.
+    __slots__ = ("start_row", "start_column", "end_row", "end_column", "piece_moved", "piece_captured",
+                 "pawn_promotion", "promotion_piece", "is_en_passant_move", "is_castling_move", "encoded", "moveID")
 
     """
     При инициализации объекта данного класса, мы запоминаем совершённые игроком действия: какой фигурой он сходил,
     куда сходил, какую фигуру съел(если клетка не пустая), а после этот ход добавляется в лог, 
     это понадобится для того чтобы у игроков была возможность вернуть ход.
+
+    self.encoded - ход, упакованный в 16-битное число (см. encode_move).
+    self.moveID - 'личность' хода для сравнения: упакованный ход без признаков взятия 'на проходе' и рокировки. Эти
+    признаки однозначно следуют из позиции, поэтому ход, собранный из кликов игрока, равен сгенерированному ходу.
     """
 
-    def __init__(self, start_square, end_square, board, is_en_passant_move=False, is_castling_move=False):
-        self.start_row = start_square[0]
-        self.start_column = start_square[1]
-        self.end_row = end_square[0]
-        self.end_column = end_square[1]
-        self.piece_moved = board[self.start_row][self.start_column]
-        self.piece_captured = board[self.end_row][self.end_column]
+    def __init__(self, start_square, end_square, board, is_en_passant_move=False, is_castling_move=False,
+                 promotion_piece="Q"):
+        self.start_row = start_row = start_square[0]
+        self.start_column = start_column = start_square[1]
+        self.end_row = end_row = end_square[0]
+        self.end_column = end_column = end_square[1]
+        self.piece_moved = piece_moved = board[start_row][start_column]
+        self.piece_captured = board[end_row][end_column]
 
         # Является ли ход проведением пешки в конечный ряд
-        self.pawn_promotion = ((self.piece_moved == 'wP' and self.end_row == 0) or
-                               (self.piece_moved == 'bP' and self.end_row == 7))
+        self.pawn_promotion = ((piece_moved == 'wP' and end_row == 0) or
+                               (piece_moved == 'bP' and end_row == 7))
+        self.promotion_piece = promotion_piece  # В какую фигуру превращается пешка
 
         # Является ли ход съедением пешки 'на проходе'
         self.is_en_passant_move = is_en_passant_move
         if is_en_passant_move:
-            self.piece_captured = 'bP' if self.piece_moved == 'wP' else 'wP'
+            self.piece_captured = 'bP' if piece_moved == 'wP' else 'wP'
 
         # Рокировка
         self.is_castling_move = is_castling_move
 
-        # Генерация уникального moveID
-        self.moveID = self.start_row * 1000 + self.start_column * 100 + self.end_row * 10 + self.end_column
+        # Упаковка хода и генерация уникального moveID
+        self.moveID = (start_row << 3) | start_column | (((end_row << 3) | end_column) << 6)
+        if self.pawn_promotion:  # Превращения в разные фигуры - разные ходы
+            self.moveID |= (PROMOTION_CODES[promotion_piece] << 12) | (MOVE_FLAG_PROMOTION << 14)
+            self.encoded = self.moveID
+        elif is_en_passant_move:
+            self.encoded = self.moveID | (MOVE_FLAG_EN_PASSANT << 14)
+        elif is_castling_move:
+            self.encoded = self.moveID | (MOVE_FLAG_CASTLING << 14)
+        else:
+            self.encoded = self.moveID
 
-    # Перегрузка метода equals
+    # Перегрузка метода equals. Ходы сравниваются только с ходами
     def __eq__(self, other):
-        if isinstance(other, Move):
-            return self.moveID == other.moveID
-        return False
+        return other.__class__ is Move and self.moveID == other.moveID
+
+    # Ходы можно хранить в множествах и словарях, а сортировка по moveID согласована со сравнением
+    def __hash__(self):
+        return self.moveID
+
+    def __lt__(self, other):
+        return self.moveID < other.moveID
+
+    def __repr__(self):
+        return "Move(" + self.get_chess_notation() + ")"
 
     # Получить классические шахматные координаты(например: e2)
     def get_chess_notation(self):
-        return self.get_rank_file(self.start_row, self.start_column) + self.get_rank_file(self.end_row, self.end_column)
+        notation = self.get_rank_file(self.start_row, self.start_column) + self.get_rank_file(self.end_row,
+                                                                                              self.end_column)
+        if self.pawn_promotion:  # Для превращения пешки добавляем фигуру, например: e7e8q
+            notation += self.promotion_piece.lower()
+        return notation
 
     def get_rank_file(self, row, column):
         return self.columns_to_files[column] + self.rows_to_ranks[row]
+
+
+class MoveSet(list):
+    """
+    Список возможных ходов с индексами, чтобы проверять и подсвечивать ходы игрока без перебора всего списка:
+    self.by_id - словарь moveID -> ход
+    self.by_origin - словарь номер начального квадрата -> список ходов с этого квадрата
+    Так как MoveSet - это список, его можно использовать везде, где раньше использовался список ходов.
+    """
+
+    __slots__ = ("by_id", "by_origin")
+
+    def __init__(self, moves=()):
+        super().__init__(moves)
+        self.by_id = {}
+        self.by_origin = {}
+        for move in self:
+            self.by_id[move.moveID] = move
+            origin = (move.start_row << 3) | move.start_column
+            if origin in self.by_origin:
+                self.by_origin[origin].append(move)
+            else:
+                self.by_origin[origin] = [move]
+
+    # Проверка 'move in move_set' по moveID, а не перебором списка
+    def __contains__(self, move):
+        return move.__class__ is Move and move.moveID in self.by_id
+
+    """
+    Все ходы фигуры, стоящей на квадрате (row, col)
+    """
+
+    def get_moves_from(self, row, col):
+        return self.by_origin.get((row << 3) | col, [])
+
+    """
+    Найти ход по начальному и конечному квадратам (кортежи (row, col)) и фигуре превращения пешки. Возвращает ход или
+    None, если такого хода нет.
+    """
+
+    def find(self, start_square, end_square, promotion_piece="Q"):
+        move_id = (start_square[0] << 3) | start_square[1] | (((end_square[0] << 3) | end_square[1]) << 6)
+        move = self.by_id.get(move_id)
+        if move is None:  # Возможно, это превращение пешки
+            move = self.by_id.get(move_id | (PROMOTION_CODES.get(promotion_piece, 0) << 12) |
+                                  (MOVE_FLAG_PROMOTION << 14))
+        return move
@@ -3,26 +3,85 @@
 с помощью объекта класса GameState.
 """
 
+import os
+
 import pygame as pg
-from Chess import ChessEngine
+from Chess import ChessEngine, ChessSearch, ChessPGN, ChessBook, ChessTablebase
 
 WIDTH = HEIGHT = 512  # Разрешение экрана (нужно подбирать по разрешению фигурок так, чтобы они выглядели хорошо)
 DIMENSION = 8  # Принятая размерность шахматной доски (8х8). (должно нацело делиться на разрешение)
 SQ_SIZE = WIDTH // DIMENSION  # Размер квадратов
-MAX_FPS = 15  # Для анимации, которая будет позже
-IMAGES = {}
+MAX_FPS = 15  # Частота кадров, когда на доске ничего не движется
+ANIMATION_FPS = 60  # Частота кадров во время анимации хода
+ANIMATION_DURATION = 250  # Длительность анимации хода в миллисекундах (не зависит от длины хода)
+IMAGES_DIR = "Chess/images/"  # Папка с изображениями фигур
+PIECE_NAMES = ("wP", "bP", "wR", "bR", "wN", "bN", "wB", "bB", "wQ", "bQ", "wK", "bK")
+# Кто играет за белых и за чёрных: True - человек, False - компьютер
+WHITE_IS_HUMAN = True
+BLACK_IS_HUMAN = True
+AI_TIME_LIMIT = 1.0  # Сколько секунд компьютер может думать над ходом
+PGN_FILE = "games.pgn"  # Файл, в конец которого сохраняются партии (клавиша 'S')
+BOOK_FILE = "book.bin"  # Дебютная книга Polyglot. Если файла нет, компьютер всегда ищет ход сам
+TABLEBASE_DIR = "syzygy"  # Папка с эндшпильными таблицами Syzygy. Если её нет, эндшпиль тоже ищется
+BOARD_COLORS = (pg.Color("white"), pg.Color("gray"))  # Цвета светлых и тёмных квадратов
+# Подсветка квадратов: цвет и прозрачность (0 - прозрачный, 255 - непрозрачный)
+HIGHLIGHTS = {"selected": ("burlywood", 150), "move": ("cadetblue", 100)}
+# Текст о ничьей по правилам для каждой причины из GameState.get_draw_reason
+DRAW_TEXTS = {"repetition": "Ничья: троекратное повторение.", "fifty_moves": "Ничья по правилу 50 ходов.",
+              "insufficient_material": "Ничья: недостаточно фигур для мата."}
+FONT_NAME = "Helvitca"
+FONT_SIZE = 34  # Размер шрифта при размере квадрата SQ_SIZE (при другом размере шрифт масштабируется)
+TEXT_COLORS = ("gray20", "darkseagreen4")  # Цвет текста и цвет его обводки
+
+
+class Resources:
+    """
+    Кеш всего, что рисуется на доске, чтобы в кадрах (и в анимации хода) не создавались новые поверхности.
+    self.atlas - атлас спрайтов: все фигуры на одной поверхности, преобразованной в формат экрана (convert_alpha).
+    self.sprites[piece] - часть атласа с фигурой piece (subsurface ссылается на пиксели атласа, без копирования).
+    self.highlights[(цвет, прозрачность)] - готовые полупрозрачные квадраты подсветки.
+    self.texts[(текст, цвет)] - уже отрисованные надписи.
+    Изображения фигур читаются с диска один раз, а всё остальное зависит от размера квадрата и пересоздаётся в
+    set_square_size, если размер изменился (например, после изменения размера окна).
+    Поверхности, преобразованные в формат экрана, можно создавать только после pg.display.set_mode.
+    """
 
-"""
-Создадим функцию, которая инициализирует изображения фигур. Это будет происходит только один раз и данные будут
-храниться в глобальном словаре IMAGES
-"""
+    def __init__(self, square_size):
+        self.images = {piece: pg.image.load(IMAGES_DIR + piece + ".png") for piece in PIECE_NAMES}
+        self.square_size = None
+        self.set_square_size(square_size)
+
+    def set_square_size(self, square_size):
+        if square_size == self.square_size:
+            return
+        self.square_size = square_size
+        atlas = pg.Surface((square_size * len(PIECE_NAMES), square_size), pg.SRCALPHA)
+        for index, piece in enumerate(PIECE_NAMES):
+            atlas.blit(pg.transform.scale(self.images[piece], (square_size, square_size)), (index * square_size, 0))
+        self.atlas = atlas.convert_alpha()
+        self.sprites = {piece: self.atlas.subsurface(pg.Rect(index * square_size, 0, square_size, square_size))
+                        for index, piece in enumerate(PIECE_NAMES)}
+
+        self.highlights = {}
+        for color, alpha in HIGHLIGHTS.values():
+            surface = pg.Surface((square_size, square_size)).convert()
+            surface.set_alpha(alpha)  # Прозрачность. 0 - прозрачный, 255 - непрозрачный
+            surface.fill(pg.Color(color))
+            self.highlights[(color, alpha)] = surface
+
+        self.font = pg.font.SysFont(FONT_NAME, max(1, FONT_SIZE * square_size // SQ_SIZE), False, False)
+        self.texts = {}
 
+    """
+    Надпись text цветом color. Отрисовывается шрифтом один раз, дальше берётся из кеша
+    """
 
-def load_images():
-    pieces = ["wP", "bP", "wR", "bR", "wN", "bN", "wB", "bB", "wQ", "bQ", "wK", "bK"]
-    for piece in pieces:
-        IMAGES[piece] = pg.transform.scale(pg.image.load("Chess/images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
-    # Теперь, чтобы вызвать какую-либо фигуру из словаря, достаточно написать, например, 'IMAGES["wP"]'
+    def get_text(self, text, color):
+        surface = self.texts.get((text, color))
+        if surface is None:
+            surface = self.font.render(text, False, pg.Color(color))
+            self.texts[(text, color)] = surface
+        return surface
 
 
 """
@@ -32,11 +91,11 @@ def load_images():
 
 def main():
     pg.init()
-    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    screen = pg.display.set_mode((WIDTH, HEIGHT), pg.RESIZABLE)
     clock = pg.time.Clock()
     screen.fill(pg.Color("white"))
     gs = ChessEngine.GameState()  # Инициализируем основной класс. Ответсвеннен за все игровые аспекты
-    valid_moves = gs.get_valid_moves()  # Получаем возможные ходы
+    valid_moves = gs.get_valid_moves(indexed=True)  # Получаем возможные ходы (с индексом для поиска по квадратам)
     """
     Флаг, который меняет значение, когда будет совершён ход(это нужно для того чтобы не затрачивать много 
     ресурсов и не производить вычисления(например, узнавать, возможен ли ход) через каждый кадр. 
@@ -45,8 +104,13 @@ def main():
     is_move_made = False
 
     animate = False  # Флаг, который указывает, нужно ли анимировать ход. Например, отмена хода не анимируется
+    animation = None  # Анимация хода, которая сейчас идёт (MoveAnimation), или None
 
-    load_images()  # Подгружаем изображения фигур
+    renderer = BoardRenderer(screen)
+    book = ChessBook.OpeningBook(BOOK_FILE) if os.path.exists(BOOK_FILE) else None
+    tablebase = ChessTablebase.Tablebase(TABLEBASE_DIR) if os.path.isdir(TABLEBASE_DIR) else None
+    # Один объект поиска на партию: таблица транспозиций сохраняется между ходами компьютера
+    searcher = ChessSearch.Searcher(tablebase=tablebase)
     is_running = True
     # Кортеж, в котором будут храниться координаты по строкам и столбцам, по которым кликнул пользователь: (row, column)
     selected_square = ()
@@ -56,17 +120,28 @@ def main():
     is_game_over = False  # Флаг, чтобы, если игра завершилась, не обрабатывать запросы мыши игрока
 
     while is_running:
+        # Чей сейчас ход: человека или компьютера
+        is_human_turn = (gs.white_turn and WHITE_IS_HUMAN) or (not gs.white_turn and BLACK_IS_HUMAN)
         for ev in pg.event.get():
+            # Ввод или изменение окна не ждут конца анимации: фигура сразу встаёт на конечный квадрат
+            if animation is not None and ev.type in (pg.MOUSEBUTTONDOWN, pg.KEYDOWN, pg.VIDEOEXPOSE, pg.VIDEORESIZE):
+                animation.finish()
+                animation = None
             if ev.type == pg.QUIT:
                 is_running = False
+            elif ev.type == pg.VIDEOEXPOSE:  # Окно было перекрыто - его содержимое нужно нарисовать заново
+                renderer.invalidate()
+            elif ev.type == pg.VIDEORESIZE:  # Размер доски и все картинки пересчитаются в следующем кадре
+                renderer.screen = pg.display.get_surface()
 
             # Обработка запросов с мыши
             elif ev.type == pg.MOUSEBUTTONDOWN:
-                if not is_game_over:
-                    mouse_location = pg.mouse.get_pos()  # Положение курсора по координатам (x,y)
-                    # Положение курсора по квадратам шахматной доски:
-                    column = mouse_location[0] // SQ_SIZE
-                    row = mouse_location[1] // SQ_SIZE
+                mouse_location = pg.mouse.get_pos()  # Положение курсора по координатам (x,y)
+                # Положение курсора по квадратам шахматной доски:
+                column = mouse_location[0] // renderer.square_size
+                row = mouse_location[1] // renderer.square_size
+                # Клики за пределами доски (если окно растянуто не квадратом) не обрабатываются
+                if not is_game_over and is_human_turn and row < DIMENSION and column < DIMENSION:
                     # Если пользователь кликнул по квадрату дважды, фактически, передумав ходить этой фигурой, то мы
                     # обнуляем кортеж с выбранными координатами и историю кликов игрока.
                     if selected_square == (row, column):
@@ -77,16 +152,16 @@ def main():
                         selected_square = (row, column)
                         player_clicks.append(selected_square)
                     if len(player_clicks) == 2:  # Обработка второго клика пользователем
-                        move = ChessEngine.Move(player_clicks[0], player_clicks[1], gs.board)
-                        print(move.get_chess_notation())
-                        for i in range(len(valid_moves)):
-                            if move == valid_moves[i]:
-                                gs.make_move(valid_moves[i])
-                                # Добавить проведение пешки здесь (запрос ответа от пользователя, какую фигуру создать)
-                                is_move_made = True
-                                animate = True  # Ход возможен, его можно анимировать
-                                selected_square = ()
-                                player_clicks.clear()
+                        # Ищем ход по квадратам в индексе возможных ходов, без перебора всего списка
+                        move = valid_moves.find(player_clicks[0], player_clicks[1])
+                        if move is not None:
+                            print(ChessPGN.get_san(gs, move, valid_moves))
+                            gs.make_move(move)
+                            # Добавить проведение пешки здесь (запрос ответа от пользователя, какую фигуру создать)
+                            is_move_made = True
+                            animate = True  # Ход возможен, его можно анимировать
+                            selected_square = ()
+                            player_clicks.clear()
                         if not is_move_made:
                             player_clicks = [selected_square]
             # Обработка запросов с клавиатуры
@@ -98,146 +173,286 @@ def main():
 
                 if ev.key == pg.K_r:  # Начать новую игру, если была нажата клавиша 'R'
                     gs = ChessEngine.GameState()  # Создаём новую доску
+                    searcher.tt.clear()  # Оценки прошлой партии новой партии не нужны
                     # Обновляем значение некоторых переменных
-                    valid_moves = gs.get_valid_moves()
+                    valid_moves = gs.get_valid_moves(indexed=True)
                     selected_square = ()
                     player_clicks = []
                     is_move_made = False
                     animate = False
 
+                if ev.key == pg.K_s:  # Сохранить партию в файл PGN, если нажата клавиша 'S'
+                    with open(PGN_FILE, "a", encoding="utf-8") as file:
+                        ChessPGN.write_game(file, gs)
+                    print("Партия сохранена в " + PGN_FILE)
+
+        # Ход компьютера (после того, как закончилась анимация предыдущего хода)
+        if not is_game_over and not is_human_turn and not is_move_made and animation is None:
+            # Пока позиция есть в дебютной книге, ход берётся из книги без поиска
+            ai_move = book.choose_move(gs) if book is not None else None
+            if ai_move is None:
+                ai_move = searcher.search(gs, time_limit=AI_TIME_LIMIT).best_move
+            if ai_move is not None:
+                print(ChessPGN.get_san(gs, ai_move, valid_moves))
+                gs.make_move(ai_move)
+                is_move_made = True
+                animate = True
+
         if is_move_made:
             if animate:
-                move_animation(gs.move_log[-1], screen, gs.board, clock)
-            valid_moves = gs.get_valid_moves()
+                animation = MoveAnimation(gs.move_log[-1], renderer, gs.board)
+            valid_moves = gs.get_valid_moves(indexed=True)
             is_move_made = False
             animate = False
 
-        draw_game_state(screen, gs, valid_moves, selected_square)
-
+        text = None
+        # Флаги позиции пересчитываются после каждого хода и его отмены, поэтому отмена хода продолжает партию
+        is_game_over = gs.checkmate or gs.stalemate or gs.draw
         if gs.checkmate:
-            is_game_over = True
             if gs.white_turn:
-                draw_text(screen, "Белым объявлен мат. Победа чёрных.")
+                text = "Белым объявлен мат. Победа чёрных."
             else:
-                draw_text(screen, "Чёрным объявлен мат. Победа белых.")
+                text = "Чёрным объявлен мат. Победа белых."
         elif gs.stalemate:
-            is_game_over = True
-            draw_text(screen, "Пат.")
+            text = "Пат."
+        elif gs.draw:
+            text = DRAW_TEXTS[gs.get_draw_reason()]
 
-        clock.tick(MAX_FPS)
-        pg.display.flip()
+        if animation is not None and not animation.update():
+            animation = None
+        # Перерисовываются только изменившиеся квадраты. Во время анимации на доске рисует только она
+        if animation is None:
+            renderer.render(gs, valid_moves, selected_square, text)
+        clock.tick(MAX_FPS if animation is None else ANIMATION_FPS)
 
+    if book is not None:
+        book.close()
+    if tablebase is not None:
+        tablebase.close()
 
-"""
-Отвественна за всю графику в течение игры
-"""
 
+class BoardRenderer:
+    """
+    Отрисовка доски без перерисовки всего окна в каждом кадре. Пустая доска рисуется один раз в self.background,
+    а для каждого квадрата запоминается, что на нём сейчас нарисовано (self.shown[row][column] - фигура и подсветка).
+    В каждом кадре перерисовываются только квадраты, которые изменились после хода, отмены хода, выбора фигуры или
+    смены подсветки, и на экран выводятся только их прямоугольники (pg.display.update(rects)). Если ничего не
+    изменилось, кадр ничего не рисует.
+    self.shown_text - текст, выведенный поверх доски (например, о мате), или None.
+    self.square_size - размер квадрата: доска занимает наибольший квадрат, помещающийся в окне.
+    self.resources - спрайты фигур, подсветка и надписи (Resources) для текущего размера квадрата.
+    """
 
-def draw_game_state(screen, gs, valid_moves, selected_square):
-    draw_board(screen)  # Рисует квадраты на доске
-    highlight_squares(screen, gs, valid_moves, selected_square)
-    draw_pieces(screen, gs.board)  # Рисует фигуры
+    def __init__(self, screen):
+        self.screen = screen
+        self.square_size = min(screen.get_size()) // DIMENSION
+        self.resources = Resources(self.square_size)
+        self.background = create_board_surface(self.square_size)
+        self.shown = [[None] * DIMENSION for _ in range(DIMENSION)]
+        self.shown_text = None
 
+    """
+    Пересчитать размер квадрата по размеру окна. Если он изменился, пересоздаются пустая доска и все картинки, а
+    следующий кадр рисует окно целиком.
+    """
 
-"""
-Рисует квадраты на доске. Верхний левый квадрат всегда белый, независимо от того, каким цветом Вы играете.
-"""
+    def update_size(self):
+        square_size = max(1, min(self.screen.get_size()) // DIMENSION)
+        if square_size == self.square_size:
+            return
+        self.square_size = square_size
+        self.resources.set_square_size(square_size)
+        self.background = create_board_surface(square_size)
+        self.screen.fill(pg.Color("white"))
+        self.invalidate()
+
+    """
+    Забыть, что нарисовано на экране: следующий кадр перерисует всю доску. Нужно, если окно было перекрыто или по
+    доске рисовали в обход BoardRenderer.
+    """
 
+    def invalidate(self):
+        self.shown = [[None] * DIMENSION for _ in range(DIMENSION)]
+        self.shown_text = None
 
-def draw_board(screen):
-    global colors
-    colors = [pg.Color("white"), pg.Color("gray")]
-    for row in range(DIMENSION):
-        for column in range(DIMENSION):
-            color = colors[(row + column) % 2]
-            pg.draw.rect(screen, color, pg.Rect(column * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    """
+    Нарисовать квадрат (row, column) с фигурой piece и подсветкой highlight (ключ HIGHLIGHTS или None). Возвращает
+    прямоугольник квадрата.
+    """
+
+    def draw_square(self, row, column, piece, highlight):
+        size = self.square_size
+        rect = pg.Rect(column * size, row * size, size, size)
+        self.screen.blit(self.background, rect, rect)
+        if highlight is not None:
+            self.screen.blit(self.resources.highlights[HIGHLIGHTS[highlight]], rect)
+        if piece != "--":
+            self.screen.blit(self.resources.sprites[piece], rect)
+        self.shown[row][column] = (piece, highlight)
+        return rect
+
+    """
+    Перерисовать изменившиеся квадраты доски board с подсветкой highlights (словарь (row, column) -> подсветка).
+    Возвращает список прямоугольников, которые нужно вывести на экран.
+    """
+
+    def draw_changed_squares(self, board, highlights):
+        rects = []
+        for row in range(DIMENSION):
+            shown_row = self.shown[row]
+            board_row = board[row]
+            for column in range(DIMENSION):
+                square = (board_row[column], highlights.get((row, column)))
+                if shown_row[column] != square:
+                    rects.append(self.draw_square(row, column, square[0], square[1]))
+        return rects
+
+    """
+    Кадр игры: доска, подсветка выбранной фигуры и её ходов, текст поверх доски (text). Возвращает список
+    обновлённых прямоугольников (пустой, если ничего не изменилось).
+    """
+
+    def render(self, gs, valid_moves, selected_square, text=None):
+        self.update_size()
+        if text != self.shown_text:
+            self.invalidate()  # Текст лежит поверх нескольких квадратов - проще перерисовать доску целиком
+        rects = self.draw_changed_squares(gs.board, get_highlights(gs, valid_moves, selected_square))
+        if text is not None and rects:
+            rects.append(self.draw_text(text))
+        self.shown_text = text
+        if rects:
+            pg.display.update(rects)
+        return rects
+
+    """
+    Вывести текст по центру доски. Возвращает прямоугольник, который занял текст.
+    """
+
+    def draw_text(self, text):
+        text_obj = self.resources.get_text(text, TEXT_COLORS[0])
+        board_size = self.square_size * DIMENSION
+        # Размещаем текст по центру
+        text_location = pg.Rect(0, 0, board_size, board_size).move(board_size / 2 - text_obj.get_width() / 2,
+                                                                    board_size / 2 - text_obj.get_height() / 2)
+
+        self.screen.blit(text_obj, text_location)
+        # Добавим поверх старого текста новый, чтобы получить обводку
+        text_obj = self.resources.get_text(text, TEXT_COLORS[1])
+        self.screen.blit(text_obj, text_location.move(2, 2))
+        return pg.Rect(text_location.topleft, (text_obj.get_width() + 2, text_obj.get_height() + 2))
 
 
 """
-Отрисовка фигур
+Пустая доска с квадратами размера square_size. Верхний левый квадрат всегда белый, независимо от того, каким цветом
+Вы играете.
 """
 
 
-def draw_pieces(screen, board):
+def create_board_surface(square_size=SQ_SIZE):
+    surface = pg.Surface((square_size * DIMENSION, square_size * DIMENSION)).convert()
     for row in range(DIMENSION):
         for column in range(DIMENSION):
-            piece = board[row][column]
-            if piece != '--':
-                screen.blit(IMAGES[piece], pg.Rect(column * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+            color = BOARD_COLORS[(row + column) % 2]
+            pg.draw.rect(surface, color, pg.Rect(column * square_size, row * square_size, square_size, square_size))
+    return surface
 
 
 """
-Подсветка квадрата с выбранной фигурой и подсветка возможных ходов для этой фигуры
+Подсветка квадрата с выбранной фигурой и квадратов, куда она может сходить: словарь (row, column) -> ключ HIGHLIGHTS
 """
 
 
-def highlight_squares(screen, gs, valid_moves, selected_square):
+def get_highlights(gs, valid_moves, selected_square):
+    highlights = {}
     if selected_square != ():  # Проверка на то, выбран ли квадрат(чтобы избежать случайных подсветок пустых квадратов)
         row, col = selected_square
         # Проверка на то, является ли выбранный квадрат фигурой, которой можно сходить
         if gs.board[row][col][0] == ('w' if gs.white_turn else 'b'):
-            # Подсветка выбранного квадрата
-            surface = pg.Surface((SQ_SIZE, SQ_SIZE))  # Поверхность, которую надо подсветить
-            surface.set_alpha(150)  # Прозрачность. 0 - прозрачный, 255 - непрозрачный
-            surface.fill(pg.Color('burlywood'))  # Цвет подсветки
-            screen.blit(surface, (col * SQ_SIZE, row * SQ_SIZE))  # Отвечает за подсветку
-
-            # Подсветка ходов выбранной фигуры
-            surface.set_alpha(100)  # Для подсветки ходов ставим другую прозрачность
-            surface.fill(pg.Color('cadetblue'))  # Цвет подсветки
-            for move in valid_moves:
-                if move.start_row == row and move.start_column == col:
-                    screen.blit(surface, (SQ_SIZE * move.end_column, SQ_SIZE * move.end_row))
+            highlights[(row, col)] = "selected"
+            for move in valid_moves.get_moves_from(row, col):
+                highlights[(move.end_row, move.end_column)] = "move"
+    return highlights
 
 
 """
-Анимация хода
+Плавность анимации: фигура разгоняется в начале хода и тормозит в конце. progress и результат - от 0 до 1.
 """
 
 
-def move_animation(move, screen, board, clock):
-    global colors
+def ease_in_out(progress):
+    return progress * progress * (3 - 2 * progress)
+
 
-    d_row = move.end_row - move.start_row  # Разница между конечной и начальной строкой шахматной доски
-    d_col = move.end_column - move.start_column  # Разница между конечным и начальным столбцом шахматной доски
-    frames_per_square = 10  # Сколько кадров будет затрачиваться на передвижение фигуры через один квадрат
-    frame_count = (abs(d_row) + abs(d_col)) * frames_per_square
+class MoveAnimation:
+    """
+    Анимация хода move, которую ведёт основной цикл игры, а не собственный цикл: каждый кадр вызывается update, и
+    фигура рисуется там, где она должна быть по прошедшему времени. Поэтому ход анимируется duration миллисекунд
+    независимо от его длины и частоты кадров, а ввод обрабатывается как обычно (finish сразу завершает анимацию).
+    Доска после хода (на конечном квадрате пока стоит съедаемая фигура) рисуется один раз и запоминается в
+    self.background. В кадре из неё восстанавливается только прямоугольник, где фигура была в прошлом кадре, и рисуется
+    спрайт фигуры на новом месте.
+    """
 
-    for frame in range(frame_count + 1):
-        # Получаем координаты каждого кадра по строкам и столбцам
-        row, col = (move.start_row + d_row * frame / frame_count, move.start_column + d_col * frame / frame_count)
-        draw_board(screen)
-        draw_pieces(screen, board)
+    def __init__(self, move, renderer, board, duration=ANIMATION_DURATION):
+        self.move = move
+        self.renderer = renderer
+        self.duration = duration
+        self.start_time = pg.time.get_ticks()
+        self.previous_rect = None
 
+        renderer.update_size()
+        self.sprite = renderer.resources.sprites[move.piece_moved]
+        rects = renderer.draw_changed_squares(board, {})
         # Нужно стереть фигуру из того места, куда она должна встать, чтобы отрисовать движение и чтобы только после
-        # этого она там оказалась.
-        color = colors[(move.end_row + move.end_column) % 2]
-        end_square = pg.Rect(move.end_column * SQ_SIZE, move.end_row * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-        pg.draw.rect(screen, color, end_square)
+        # этого она там оказалась. Если на конечном квадрате стоит фигура, то ставим туда фигуру, которая будет съедена,
+        # как только анимация завершится
+        rects.append(renderer.draw_square(move.end_row, move.end_column, move.piece_captured, None))
+        pg.display.update(rects)
+        self.background = renderer.screen.copy()
 
-        # Если на конечном квадрате стоит фигура, то ставим туда фигуру, которая будет съедена, как только анимация
-        # завершится
-        if move.piece_captured != "--":
-            screen.blit(IMAGES[move.piece_captured], end_square)
+    """
+    Нарисовать кадр на момент now (миллисекунды pg.time.get_ticks()). Возвращает False, когда фигура дошла до конечного
+    квадрата и анимация закончилась.
+    """
 
-        # Отрисовка движущейся фигуры
-        screen.blit(IMAGES[move.piece_moved], pg.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        pg.display.flip()
-        clock.tick(144)
+    def update(self, now=None):
+        if now is None:
+            now = pg.time.get_ticks()
+        progress = min(1.0, (now - self.start_time) / self.duration) if self.duration > 0 else 1.0
+        self.draw(ease_in_out(progress))
+        return progress < 1.0
 
+    """
+    Завершить анимацию досрочно: фигура сразу рисуется на конечном квадрате
+    """
 
-def draw_text(screen, text):
-    font = pg.font.SysFont("Helvitca", 34, False, False)  # Шрифт
-    text_obj = font.render(text, False, pg.Color("gray20"))
-    # Размещаем текст по центру
-    text_location = pg.Rect(0, 0, WIDTH, HEIGHT).move(WIDTH / 2 - text_obj.get_width() / 2,
-                                                      HEIGHT / 2 - text_obj.get_height() / 2)
+    def finish(self):
+        self.draw(1.0)
 
-    screen.blit(text_obj, text_location)
-    # Добавим поверх старого текста новый, чтобы получить обводку
-    text_obj = font.render(text, False, pg.Color("darkseagreen4"))
-    screen.blit(text_obj, text_location.move(2, 2))
+    """
+    Нарисовать фигуру, прошедшую часть пути fraction (0 - начальный квадрат, 1 - конечный)
+    """
 
+    def draw(self, fraction):
+        move = self.move
+        size = self.renderer.square_size
+        screen = self.renderer.screen
+        row = move.start_row + (move.end_row - move.start_row) * fraction
+        col = move.start_column + (move.end_column - move.start_column) * fraction
+        rect = pg.Rect(round(col * size), round(row * size), size, size)
+        rects = [rect]
+        if self.previous_rect is not None:
+            screen.blit(self.background, self.previous_rect, self.previous_rect)
+            rects.append(self.previous_rect)
+        # Отрисовка движущейся фигуры
+        screen.blit(self.sprite, rect)
+        pg.display.update(rects)
+        self.previous_rect = rect
+        # Фигура встала на конечный квадрат поверх съеденной фигуры, поэтому его содержимое не совпадает ни с одной
+        # клеткой доски. Квадрат помечается неизвестным, и следующий кадр перерисует его по доске, в том числе после
+        # отмены хода или новой партии во время анимации
+        if fraction >= 1.0:
+            self.renderer.shown[move.end_row][move.end_column] = None
 
 
 if __name__ == "__main__":
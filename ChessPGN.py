@@ -0,0 +1,357 @@
+"""
+Чтение и запись партий в формате PGN (Portable Game Notation).
+
+Ходы в PGN записываются в алгебраической нотации (SAN): 'e4', 'Nbd7', 'exd5', 'O-O', 'e8=Q+'. Здесь есть перевод хода
+в SAN и обратно, потоковое чтение партий из файла и запись партии из GameState.
+
+Чтение потоковое: файл читается построчно, а read_games - генератор, который отдаёт партии по одной, как только
+партия прочитана целиком. Поэтому в памяти одновременно находится только одна партия, и можно обрабатывать архивы
+размером в несколько гигабайт.
+
+Запуск из папки, в которой лежит пакет Chess:
+    python -m Chess.ChessPGN games.pgn   - прочитать и переиграть все партии файла, вывести статистику
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from Chess import ChessEngine
+from Chess.ChessEngine import Move
+
+# Обязательные теги PGN в том порядке, в котором они записываются
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+MAX_LINE_LENGTH = 80  # Стандарт PGN рекомендует строки не длиннее 80 символов
+
+# Значение тега - всё между первой и последней кавычкой, т.к. некоторые программы не экранируют кавычки внутри
+TAG_REGEX = re.compile(r'\[\s*(\w+)\s+"(.*)"\s*\]')
+# Токены записи ходов: комментарии, варианты, NAG ($1), номера ходов, результаты и сами ходы
+MOVETEXT_REGEX = re.compile(r'\s*(\{|;|\(|\)|\$\d+|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s{};()$]+)')
+SAN_REGEX = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+# Символы, которые могут стоять после хода: шах, мат, оценки хода
+SAN_SUFFIXES = "+#!?"
+
+
+class PGNGame:
+    """
+    Одна прочитанная партия.
+
+    self.headers - словарь тегов партии ('Event', 'White', 'FEN' и т.д.) в порядке их следования в файле
+    self.moves - ходы партии в алгебраической нотации, без номеров ходов, комментариев и вариантов
+    self.result - результат из записи ходов ('1-0', '0-1', '1/2-1/2' или '*')
+    """
+
+    def __init__(self, headers, moves, result):
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+
+    """
+    Позиция, с которой начинается партия: тег FEN, если он есть, иначе начальная позиция
+    """
+
+    def get_start_fen(self):
+        return self.headers.get("FEN", ChessEngine.START_FEN)
+
+    """
+    Переиграть партию через make_move. Генератор отдаёт каждый сделанный ход (объект Move), после чего позиция в gs
+    уже соответствует этому ходу. Если gs передан, позиция загружается в него, иначе создаётся новый GameState -
+    при обработке большого количества партий выгоднее использовать один объект. При невозможном ходе бросается
+    ValueError.
+    """
+
+    def replay(self, gs=None):
+        if gs is None:
+            gs = ChessEngine.GameState(self.get_start_fen())
+        else:
+            gs.load_fen(self.get_start_fen())
+        for san in self.moves:
+            move = parse_san(gs, san)
+            gs.make_move(move)
+            yield move
+
+
+"""
+Перевести ход move, возможный в позиции gs, в алгебраическую нотацию. legal_moves - возможные ходы позиции, если они
+уже посчитаны. Позиция после вызова не меняется.
+"""
+
+
+def get_san(gs, move, legal_moves=None):
+    if move.is_castling_move:
+        san = "O-O" if move.end_column > move.start_column else "O-O-O"
+    else:
+        piece_type = move.piece_moved[1]
+        end_square = move.get_rank_file(move.end_row, move.end_column)
+        is_capture = move.piece_captured != "--"
+        if piece_type == "P":
+            san = (Move.columns_to_files[move.start_column] + "x" if is_capture else "") + end_square
+            if move.pawn_promotion:
+                san += "=" + move.promotion_piece
+        else:
+            # Если такая же фигура может пойти на тот же квадрат, указываем вертикаль, горизонталь или обе
+            if legal_moves is None:
+                legal_moves = gs.get_valid_moves()
+            rivals = [other for other in legal_moves
+                      if other.piece_moved == move.piece_moved and other.end_row == move.end_row and
+                      other.end_column == move.end_column and
+                      (other.start_row, other.start_column) != (move.start_row, move.start_column)]
+            disambiguation = ""
+            if rivals:
+                if all(other.start_column != move.start_column for other in rivals):
+                    disambiguation = Move.columns_to_files[move.start_column]
+                elif all(other.start_row != move.start_row for other in rivals):
+                    disambiguation = Move.rows_to_ranks[move.start_row]
+                else:
+                    disambiguation = move.get_rank_file(move.start_row, move.start_column)
+            san = piece_type + disambiguation + ("x" if is_capture else "") + end_square
+
+    # Шах или мат: для мата достаточно убедиться, что у противника нет ни одного хода, поэтому используем
+    # поэтапный генератор и берём из него только первый ход
+    gs.make_move(move)
+    if gs.is_in_check():
+        san += "+" if next(gs.generate_moves_staged(), None) is not None else "#"
+    gs.undo_move()
+    return san
+
+
+"""
+Найти ход, записанный в алгебраической нотации, среди возможных ходов позиции gs. Допускаются распространённые
+отклонения от стандарта: '0-0' вместо 'O-O', превращение без '=' ('e8Q'), лишнее указание начального квадрата.
+Если ход невозможен или записан неоднозначно, бросается ValueError.
+"""
+
+
+def parse_san(gs, san, legal_moves=None):
+    if legal_moves is None:
+        legal_moves = gs.get_valid_moves()
+    notation = san.rstrip(SAN_SUFFIXES)
+    if notation.endswith("e.p."):
+        notation = notation[:-4]
+
+    if notation in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        king_side = len(notation) == 3
+        for move in legal_moves:
+            if move.is_castling_move and (move.end_column > move.start_column) == king_side:
+                return move
+        raise ValueError("Невозможный ход: " + san)
+
+    match = SAN_REGEX.match(notation)
+    if match is None:
+        raise ValueError("Некорректная запись хода: " + san)
+    piece_type, from_file, from_rank, end_square, promotion_piece = match.groups()
+    piece_type = piece_type or "P"
+    end_row = Move.ranks_to_rows[end_square[1]]
+    end_column = Move.files_to_columns[end_square[0]]
+
+    found = None
+    for move in legal_moves:
+        if move.end_row != end_row or move.end_column != end_column or move.piece_moved[1] != piece_type or \
+                move.is_castling_move:
+            continue
+        if from_file is not None and move.start_column != Move.files_to_columns[from_file]:
+            continue
+        if from_rank is not None and move.start_row != Move.ranks_to_rows[from_rank]:
+            continue
+        if move.pawn_promotion and move.promotion_piece != (promotion_piece or "Q"):
+            continue
+        if found is not None:
+            raise ValueError("Неоднозначная запись хода: " + san)
+        found = move
+    if found is None:
+        raise ValueError("Невозможный ход: " + san)
+    return found
+
+
+"""
+Прочитать партии из текстового файла (или любого итерируемого объекта строк). Генератор отдаёт объекты PGNGame по
+одному. Комментарии, варианты и оценки ходов (NAG) пропускаются.
+"""
+
+
+def read_games(file):
+    headers = {}
+    moves = []
+    result = "*"
+    in_movetext = False  # Началась ли запись ходов текущей партии
+    in_comment = False  # Комментарий в фигурных скобках может продолжаться на нескольких строках
+    variation_depth = 0  # Глубина вложенности вариантов в круглых скобках
+
+    for line in file:
+        position = 0
+        if in_comment:
+            position = line.find("}")
+            if position < 0:
+                continue
+            position += 1
+            in_comment = False
+
+        stripped = line.strip()
+        if not stripped or line.startswith("%"):  # Пустые строки и строки 'экранирования' пропускаются
+            continue
+        if position == 0 and stripped.startswith("[") and variation_depth == 0:
+            if in_movetext:  # Теги новой партии - значит, предыдущая закончилась
+                yield PGNGame(headers, moves, result)
+                headers = {}
+                moves = []
+                result = "*"
+                in_movetext = False
+            match = TAG_REGEX.match(stripped)
+            if match is not None:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+            continue
+
+        in_movetext = True
+        length = len(line)
+        while position < length:
+            match = MOVETEXT_REGEX.match(line, position)
+            if match is None:
+                break
+            token = match.group(1)
+            position = match.end()
+            if token == "{":
+                end = line.find("}", position)
+                if end < 0:
+                    in_comment = True
+                    break
+                position = end + 1
+            elif token == ";":  # Комментарий до конца строки
+                break
+            elif token == "(":
+                variation_depth += 1
+            elif token == ")":
+                variation_depth = max(0, variation_depth - 1)
+            elif variation_depth or token[0] == "$" or token[-1] == ".":
+                continue
+            elif token in RESULTS:
+                result = token
+            else:
+                moves.append(token)
+
+    if in_movetext or headers:
+        yield PGNGame(headers, moves, result)
+
+
+"""
+Прочитать партии из файла по пути path. Неверно закодированные символы (архивы часто бывают в разных кодировках)
+заменяются, а не прерывают чтение.
+"""
+
+
+def read_games_from_path(path):
+    with open(path, encoding="utf-8", errors="replace") as file:
+        yield from read_games(file)
+
+
+"""
+Результат партии в позиции gs: мат - победа стороны, которая его поставила, пат и ничья по правилам (повторение
+позиции, правило 50 ходов, недостаточный материал) - ничья, иначе партия не закончена. legal_moves - возможные ходы
+позиции, если они уже посчитаны (тогда ходы заново не генерируются); результат определяется по ним, а не по флагам
+checkmate и stalemate, которые могли остаться от другой позиции.
+"""
+
+
+def get_result(gs, legal_moves=None):
+    if legal_moves is None:
+        legal_moves = gs.get_valid_moves()
+    if not legal_moves:
+        if gs.is_in_check():
+            return "0-1" if gs.white_turn else "1-0"
+        return "1/2-1/2"
+    if gs.get_draw_reason() is not None:
+        return "1/2-1/2"
+    return "*"
+
+
+"""
+Записать партию, сыгранную в gs (все ходы из gs.move_log), в формате PGN. headers - дополнительные теги, обязательные
+теги без значения заполняются знаком '?'. Если result не передан, он определяется по позиции. Если партия начиналась
+не с начальной позиции, добавляются теги SetUp и FEN.
+"""
+
+
+def game_to_pgn(gs, headers=None, result=None):
+    # Возвращаемся к началу партии на копии, чтобы не трогать переданную позицию
+    position = gs.copy()
+    while position.move_log:
+        position.undo_move()
+
+    if result is None:
+        result = get_result(gs.copy())
+    tags = {tag: "?" for tag in SEVEN_TAG_ROSTER}
+    tags["Date"] = "????.??.??"
+    if headers:
+        tags.update(headers)
+    tags["Result"] = result
+    start_fen = position.get_fen()
+    if start_fen != ChessEngine.START_FEN:
+        tags["SetUp"] = "1"
+        tags["FEN"] = start_fen
+
+    lines = ['[%s "%s"]' % (tag, str(value).replace("\\", "\\\\").replace('"', '\\"')) for tag, value in tags.items()]
+    lines.append("")
+
+    tokens = []
+    for move in gs.move_log:
+        if position.white_turn:
+            tokens.append("%d." % position.fullmove_number)
+        elif not tokens:  # Партия начинается с хода чёрных
+            tokens.append("%d..." % position.fullmove_number)
+        tokens.append(get_san(position, move))
+        position.make_move(move)
+    tokens.append(result)
+
+    # Переносим запись ходов так, чтобы строки были не длиннее MAX_LINE_LENGTH
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > MAX_LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+"""
+Дописать партию в открытый текстовый файл. Партии отделяются друг от друга пустой строкой.
+"""
+
+
+def write_game(file, gs, headers=None, result=None):
+    file.write(game_to_pgn(gs, headers, result))
+    file.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Чтение партий из файла PGN")
+    parser.add_argument("path", help="файл PGN")
+    parser.add_argument("--limit", type=int, default=None, help="сколько партий прочитать")
+    args = parser.parse_args(argv)
+
+    gs = ChessEngine.GameState()
+    games = 0
+    positions = 0
+    errors = 0
+    start_time = time.perf_counter()
+    for game in read_games_from_path(args.path):
+        if args.limit is not None and games >= args.limit:
+            break
+        games += 1
+        try:
+            for _ in game.replay(gs):
+                positions += 1
+        except ValueError as error:
+            errors += 1
+            print("партия %d (%s - %s): %s" % (games, game.headers.get("White", "?"), game.headers.get("Black", "?"),
+                                                error), file=sys.stderr)
+    elapsed = time.perf_counter() - start_time
+    print("games: %d, positions: %d, errors: %d, time: %.3f s, %d positions/s" %
+          (games, positions, errors, elapsed, int(positions / elapsed) if elapsed > 0 else 0))
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
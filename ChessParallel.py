@@ -0,0 +1,225 @@
+"""
+Параллельный поиск по схеме Lazy SMP. Несколько процессов ищут одну и ту же позицию одновременно и общаются только
+через общую таблицу транспозиций, которая лежит в multiprocessing.shared_memory. Основной процесс ведёт обычный
+поиск, а процессы-помощники начинают итеративное углубление с разных глубин (1 или 2), поэтому их деревья поиска
+расходятся, и они заполняют таблицу результатами, которые основной поиск потом берёт готовыми.
+
+Блокировок у таблицы нет: 'разорванные' одновременной записью элементы отбрасываются проверкой хеш XOR данные (см.
+ChessTransposition). Лучшим ходом считается ход самой глубокой полностью завершённой итерации среди всех процессов.
+
+Запуск из папки, в которой лежит пакет Chess:
+    python -m Chess.ChessParallel --depth 5 --workers 4   - замер времени до глубины на наборе позиций для 1 и
+                                                            4 процессов
+    python -m Chess.ChessParallel --min-speedup 1.2       - код возврата 1, если ускорение меньше 1.2
+
+Ускорение имеет смысл мерить только на машине, где ядер не меньше, чем процессов: иначе процессы делят ядра, и
+параллельный поиск медленнее обычного.
+"""
+
+import argparse
+import multiprocessing.util
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Event
+from multiprocessing.shared_memory import SharedMemory
+
+from Chess import ChessEngine, ChessSearch
+from Chess.ChessTransposition import TranspositionTable
+
+# Позиции для замера времени до глубины: начальная позиция, миттельшпиль и эндшпиль
+BENCHMARK_FENS = (
+    ChessEngine.START_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+)
+
+# Состояние процесса-помощника: создаётся один раз в init_helper
+HELPER_STATE = {}
+
+"""
+Инициализация процесса-помощника: подключиться к общей таблице транспозиций и запомнить событие остановки. При
+завершении процесса помощник отключается от общей памяти (close_helper). Обработчики atexit в процессах пула,
+созданных через fork, не вызываются, поэтому отключение регистрируется финализатором multiprocessing.
+"""
+
+
+def init_helper(shared_memory_name, stop_event):
+    shared_memory = SharedMemory(name=shared_memory_name)
+    HELPER_STATE["shared_memory"] = shared_memory
+    HELPER_STATE["gs"] = ChessEngine.GameState()
+    searcher = ChessSearch.Searcher(TranspositionTable(buffer=shared_memory.buf))
+    searcher.stop_event = stop_event
+    HELPER_STATE["searcher"] = searcher
+    multiprocessing.util.Finalize(None, close_helper, exitpriority=10)
+
+
+# Буфер общей памяти нельзя закрыть, пока на него ссылается таблица, поэтому сначала освобождается таблица
+def close_helper():
+    HELPER_STATE.pop("searcher").tt.release()
+    HELPER_STATE.pop("shared_memory").close()
+
+
+"""
+Поиск в процессе-помощнике. Позиция передаётся начальной позицией партии и упакованными ходами, чтобы у помощника была
+та же история партии, что и у основного процесса. age - 'возраст' таблицы транспозиций основного процесса перед
+поиском: счётчик возраста у каждого процесса свой, а элементы общей таблицы должны записываться с одним и тем же
+возрастом, иначе замещение старых элементов работает неправильно. Возвращает (упакованный лучший ход, оценка, глубина,
+узлы) по последней завершённой итерации; если ходов нет, глубина 0.
+"""
+
+
+def helper_search(start_fen, encoded_moves, depth, time_limit, node_limit, start_depth, age):
+    gs = HELPER_STATE["gs"]
+    gs.load_fen(start_fen)
+    for encoded in encoded_moves:
+        gs.make_move(gs.move_from_encoded(encoded))
+    searcher = HELPER_STATE["searcher"]
+    searcher.tt.age = age  # search() увеличит его так же, как в основном процессе
+    result = searcher.search(gs, depth=depth, time_limit=time_limit, node_limit=node_limit, start_depth=start_depth)
+    if result.best_move is None:
+        return 0, 0, 0, result.nodes
+    return result.best_move.encoded, result.score, result.depth, result.nodes
+
+
+class ParallelSearcher:
+    """
+    workers - общее количество процессов поиска, включая основной. При workers=1 это обычный Searcher, только с
+    таблицей в общей памяти.
+    tt_size_mb - размер общей таблицы транспозиций.
+
+    Процессы-помощники создаются один раз и живут до вызова close(), поэтому объект удобно использовать как контекстный
+    менеджер (with ParallelSearcher(4) as searcher: ...).
+    """
+
+    def __init__(self, workers=2, tt_size_mb=ChessSearch.DEFAULT_TT_SIZE_MB):
+        self.workers = max(1, workers)
+        self.shared_memory = SharedMemory(create=True, size=tt_size_mb * 1024 * 1024)
+        self.stop_event = Event()
+        self.searcher = ChessSearch.Searcher(TranspositionTable(buffer=self.shared_memory.buf))
+        self.searcher.stop_event = self.stop_event
+        self.executor = None
+        if self.workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers - 1, initializer=init_helper,
+                                                initargs=(self.shared_memory.name, self.stop_event))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    """
+    Остановить помощников и освободить общую память
+    """
+
+    def close(self):
+        if self.executor is not None:
+            self.stop_event.set()
+            self.executor.shutdown()
+            self.executor = None
+        if self.shared_memory is not None:
+            self.searcher.tt.release()
+            self.shared_memory.close()
+            self.shared_memory.unlink()
+            self.shared_memory = None
+
+    """
+    Очистить общую таблицу транспозиций (например, перед новой партией или для честного замера)
+    """
+
+    def clear(self):
+        self.searcher.tt.clear()
+
+    """
+    Найти лучший ход для позиции gs. Ограничения те же, что у Searcher.search. Возвращает SearchResult с ходом самой
+    глубокой завершённой итерации среди всех процессов; nodes - сумма узлов всех процессов.
+    """
+
+    def search(self, gs, depth=None, time_limit=None, node_limit=None, info_callback=None):
+        start_time = time.perf_counter()
+        self.stop_event.clear()
+        futures = []
+        if self.executor is not None:
+            position = gs.copy()
+            encoded_moves = [move.encoded for move in position.move_log]
+            while position.move_log:
+                position.undo_move()
+            start_fen = position.get_fen()
+            for helper in range(1, self.workers):
+                futures.append(self.executor.submit(helper_search, start_fen, encoded_moves, depth, time_limit,
+                                                    node_limit, 1 + helper % 2, self.searcher.tt.age))
+
+        result = self.searcher.search(gs, depth=depth, time_limit=time_limit, node_limit=node_limit,
+                                      info_callback=info_callback)
+        # Основной поиск закончен - останавливаем помощников и выбираем самую глубокую завершённую итерацию
+        self.stop_event.set()
+        for future in futures:
+            encoded, score, helper_depth, nodes = future.result()
+            result.nodes += nodes
+            if helper_depth > result.depth and encoded:
+                move = gs.move_from_encoded(encoded)
+                result.best_move = move
+                result.score = score
+                result.depth = helper_depth
+                result.pv = self.searcher.extend_pv_from_tt(gs, [move], helper_depth)
+        result.elapsed = time.perf_counter() - start_time
+        return result
+
+
+"""
+Замер времени до глубины: для каждой позиции из fens засекается время, за которое поиск на workers процессах
+завершает итерацию глубины depth. Перед каждой позицией таблица очищается. Возвращает список (FEN, время, узлы).
+"""
+
+
+def time_to_depth(fens, depth, workers, tt_size_mb=ChessSearch.DEFAULT_TT_SIZE_MB):
+    measurements = []
+    with ParallelSearcher(workers, tt_size_mb) as searcher:
+        for fen in fens:
+            searcher.clear()
+            gs = ChessEngine.GameState(fen)
+            start_time = time.perf_counter()
+            result = searcher.search(gs, depth=depth)
+            measurements.append((fen, time.perf_counter() - start_time, result.nodes))
+    return measurements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер времени до глубины для параллельного поиска")
+    parser.add_argument("--depth", type=int, default=5, help="глубина поиска")
+    parser.add_argument("--workers", type=int, default=4, help="количество процессов поиска")
+    parser.add_argument("--hash", type=int, default=ChessSearch.DEFAULT_TT_SIZE_MB,
+                        help="размер общей таблицы транспозиций в МБ")
+    parser.add_argument("--fen", action="append", default=None, help="позиция для замера (можно указать несколько)")
+    parser.add_argument("--min-speedup", type=float, default=None,
+                        help="вернуть код 1, если ускорение относительно одного процесса меньше этого значения")
+    args = parser.parse_args(argv)
+
+    fens = args.fen or BENCHMARK_FENS
+    cpu_count = os.cpu_count() or 1
+    print("time to depth %d, %d processes, %d cores" % (args.depth, args.workers, cpu_count))
+    if args.workers > cpu_count:
+        print("warning: processes share %d cores, the speedup is not representative" % cpu_count)
+    baseline = time_to_depth(fens, args.depth, 1, args.hash)
+    parallel = time_to_depth(fens, args.depth, args.workers, args.hash) if args.workers > 1 else baseline
+    total_baseline = sum(elapsed for _, elapsed, _ in baseline)
+    total_parallel = sum(elapsed for _, elapsed, _ in parallel)
+    for (fen, single_time, single_nodes), (_, parallel_time, parallel_nodes) in zip(baseline, parallel):
+        print("%-72s 1: %7.3f s %9d nodes   %d: %7.3f s %9d nodes   %.2fx" % (
+            fen, single_time, single_nodes, args.workers, parallel_time, parallel_nodes,
+            single_time / parallel_time if parallel_time > 0 else 0.0))
+    speedup = total_baseline / total_parallel if total_parallel > 0 else 0.0
+    print("total: 1 process %.3f s, %d processes %.3f s, speedup %.2fx%s" % (
+        total_baseline, args.workers, total_parallel, speedup, "" if speedup >= 1 else " (slower than 1 process)"))
+    if args.min_speedup is not None and speedup < args.min_speedup:
+        print("speedup %.2fx is below --min-speedup %.2fx" % (speedup, args.min_speedup))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
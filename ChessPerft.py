@@ -0,0 +1,221 @@
+"""
+Perft (performance test) - подсчёт всех позиций, которые получаются из данной позиции за depth полуходов. Количество
+таких позиций для известных позиций давно посчитано, поэтому perft одновременно проверяет правильность генерации ходов
+(get_valid_moves, make_move, undo_move) и измеряет её скорость.
+
+Запуск из папки, в которой лежит пакет Chess:
+    python -m Chess.ChessPerft --depth 4                  - perft начальной позиции
+    python -m Chess.ChessPerft --fen "<FEN>" --depth 3 --divide
+                                                          - количество позиций отдельно для каждого хода из корня
+    python -m Chess.ChessPerft --suite --max-depth 3      - проверка набора известных позиций
+    python -m Chess.ChessPerft --suite --save-baseline    - сохранить скорость как эталон для следующих запусков
+
+При прогоне набора скорость каждой позиции сравнивается с сохранённым эталоном (perft_baselines.json). Если посчитано
+неверное количество позиций или скорость упала больше допустимого, программа завершается с кодом 1.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from Chess import ChessEngine
+
+"""
+Набор позиций с известными результатами perft. counts[i] - количество позиций на глубине i + 1.
+Источники: https://www.chessprogramming.org/Perft_Results и набор пограничных случаев Мартина Седлака (взятие 'на
+проходе', рокировки, превращения, паты).
+"""
+PERFT_SUITE = [
+    {"name": "startpos", "fen": ChessEngine.START_FEN,
+     "counts": [20, 400, 8902, 197281, 4865609]},
+    {"name": "kiwipete", "fen": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     "counts": [48, 2039, 97862, 4085603]},
+    {"name": "position3", "fen": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     "counts": [14, 191, 2812, 43238, 674624]},
+    {"name": "position4", "fen": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     "counts": [6, 264, 9467, 422333]},
+    {"name": "position4_mirrored", "fen": "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     "counts": [6, 264, 9467, 422333]},
+    {"name": "position5", "fen": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     "counts": [44, 1486, 62379, 2103487]},
+    {"name": "position6", "fen": "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     "counts": [46, 2079, 89890, 3894594]},
+    {"name": "illegal_en_passant_1", "fen": "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+     "counts": [18, 92, 1670, 10138]},
+    {"name": "illegal_en_passant_2", "fen": "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+     "counts": [13, 102, 1266, 10276]},
+    {"name": "en_passant_gives_check", "fen": "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     "counts": [15, 126, 1928, 13931]},
+    {"name": "short_castle_gives_check", "fen": "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+     "counts": [15, 66, 1198, 6399]},
+    {"name": "long_castle_gives_check", "fen": "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1",
+     "counts": [16, 71, 1286, 7418]},
+    {"name": "castle_rights", "fen": "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+     "counts": [26, 1141, 27826, 1274206]},
+    {"name": "castling_prevented", "fen": "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+     "counts": [44, 1494, 50509, 1720476]},
+    {"name": "promote_out_of_check", "fen": "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+     "counts": [11, 133, 1442, 19174]},
+    {"name": "discovered_check", "fen": "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1",
+     "counts": [29, 165, 5160, 31961]},
+    {"name": "promote_to_give_check", "fen": "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+     "counts": [9, 40, 472, 2661]},
+    {"name": "underpromote_to_give_check", "fen": "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+     "counts": [6, 27, 273, 1329]},
+    {"name": "self_stalemate", "fen": "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+     "counts": [2, 6, 13, 63]},
+    {"name": "stalemate_and_checkmate", "fen": "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+     "counts": [10, 25, 268, 926]},
+    {"name": "double_check", "fen": "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1",
+     "counts": [37, 183, 6559, 23527]},
+]
+
+DEFAULT_BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perft_baselines.json")
+DEFAULT_TOLERANCE = 0.10  # Допустимое падение скорости относительно эталона (10%)
+
+"""
+Количество позиций на глубине depth. На последнем полуходе ходы не совершаются, а просто считаются (bulk counting).
+"""
+
+
+def perft(gs, depth):
+    if depth == 0:
+        return 1
+    moves = gs.get_valid_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+"""
+perft отдельно для каждого хода из корня. Удобно для поиска ошибок: сравнив вывод с другой программой, сразу видно,
+после какого хода количество позиций расходится.
+"""
+
+
+def divide(gs, depth):
+    results = []
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        results.append((move.get_chess_notation(), perft(gs, depth - 1)))
+        gs.undo_move()
+    return results
+
+
+"""
+Позиция из записи FEN
+"""
+
+
+def position_from_fen(fen):
+    return ChessEngine.GameState(fen)
+
+
+"""
+Посчитать perft и засечь время. Возвращает (количество позиций, время в секундах).
+"""
+
+
+def timed_perft(gs, depth):
+    start_time = time.perf_counter()
+    nodes = perft(gs, depth)
+    return nodes, time.perf_counter() - start_time
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_baselines(path, baselines):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+"""
+Прогнать набор позиций до глубины max_depth (или до самой большой известной глубины, если она меньше). Скорость
+сравнивается с эталоном baselines, если он есть для этой позиции и глубины. Возвращает (количество ошибок,
+словарь измеренной скорости для сохранения в эталон).
+"""
+
+
+def run_suite(max_depth, baselines, tolerance=DEFAULT_TOLERANCE, out=sys.stdout):
+    failures = 0
+    measurements = {}
+    total_nodes = 0
+    total_time = 0.0
+    for position in PERFT_SUITE:
+        depth = min(max_depth, len(position["counts"]))
+        expected = position["counts"][depth - 1]
+        nodes, elapsed = timed_perft(position_from_fen(position["fen"]), depth)
+        nps = int(nodes / elapsed) if elapsed > 0 else 0
+        key = "%s/%d" % (position["name"], depth)
+        measurements[key] = nps
+        total_nodes += nodes
+        total_time += elapsed
+
+        status = "ok"
+        if nodes != expected:
+            status = "FAIL (ожидалось %d)" % expected
+            failures += 1
+        elif key in baselines and nps < baselines[key] * (1 - tolerance):
+            status = "REGRESSION (эталон %d nps)" % baselines[key]
+            failures += 1
+        print("%-28s depth %d  nodes %10d  %8.3f s  %9d nps  %s" % (position["name"], depth, nodes, elapsed, nps,
+                                                                    status), file=out)
+
+    total_nps = int(total_nodes / total_time) if total_time > 0 else 0
+    print("total: %d nodes, %.3f s, %d nps, %d failures" % (total_nodes, total_time, total_nps, failures), file=out)
+    return failures, measurements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft: проверка и замер скорости генерации ходов")
+    parser.add_argument("--fen", default=ChessEngine.START_FEN, help="позиция в записи FEN")
+    parser.add_argument("--depth", type=int, default=4, help="глубина perft для одной позиции")
+    parser.add_argument("--divide", action="store_true", help="вывести количество позиций для каждого хода из корня")
+    parser.add_argument("--suite", action="store_true", help="прогнать набор известных позиций")
+    parser.add_argument("--max-depth", type=int, default=3, help="максимальная глубина для набора позиций")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_FILE, help="файл с эталонной скоростью")
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить измеренную скорость как эталон")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое падение скорости относительно эталона (доля)")
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        baselines = load_baselines(args.baseline)
+        failures, measurements = run_suite(args.max_depth, baselines, args.tolerance)
+        if args.save_baseline:
+            baselines.update(measurements)
+            save_baselines(args.baseline, baselines)
+            print("эталон сохранён в " + args.baseline)
+        return 1 if failures else 0
+
+    gs = position_from_fen(args.fen)
+    start_time = time.perf_counter()
+    if args.divide:
+        results = divide(gs, args.depth)
+        for notation, nodes in results:
+            print("%s: %d" % (notation, nodes))
+        nodes = sum(count for _, count in results)
+        print("moves: %d" % len(results))
+    else:
+        nodes = perft(gs, args.depth)
+    elapsed = time.perf_counter() - start_time
+    nps = int(nodes / elapsed) if elapsed > 0 else 0
+    print("nodes: %d, time: %.3f s, %d nps" % (nodes, elapsed, nps))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
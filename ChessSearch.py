@@ -0,0 +1,434 @@
+"""
+Этот файл отвечает за выбор хода компьютером. Поиск работает поверх GameState: ходы перебираются поэтапным
+генератором generate_moves_staged, совершаются make_move и отменяются undo_move, поэтому после поиска позиция остаётся
+прежней.
+
+Используется алгоритм negamax с альфа-бета отсечением и итеративным углублением: сначала позиция просматривается на
+глубину 1, потом 2 и т.д., пока не закончится отведённое время, лимит узлов или не будет достигнута нужная глубина.
+Результат последней полностью завершённой итерации и считается лучшим ходом.
+
+Результаты просмотренных позиций сохраняются в таблице транспозиций (ChessTransposition) по хешу GameState.zobrist_key,
+поэтому позиции, повторно встреченные через другой порядок ходов или в следующей итерации, не ищутся заново.
+
+Если поиску переданы эндшпильные таблицы (ChessTablebase), позиции с малым количеством фигур не ищутся: в корне ход
+выбирается по таблицам DTZ, а в узлах поиска после взятия или хода пешкой оценка берётся из таблиц WDL.
+"""
+
+import time
+
+from Chess.ChessEvaluation import evaluate
+from Chess.ChessTablebase import WDL_WIN, WDL_LOSS, WIN_RANK_BOUND
+from Chess.ChessTransposition import TranspositionTable, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER
+
+MATE_SCORE = 100000  # Оценка мата. Мат в n полуходов оценивается как MATE_SCORE - n
+INFINITY = MATE_SCORE + 1
+MAX_PLY = 128  # Максимальная глубина поиска в полуходах, включая форсированные размены
+# Оценка выигрыша по эндшпильным таблицам: ниже любого найденного мата, но выше любой оценки позиции
+TB_WIN_SCORE = MATE_SCORE - 2 * MAX_PLY
+
+DEFAULT_TT_SIZE_MB = 16  # Размер таблицы транспозиций по умолчанию
+
+# Оценка 'ходов-убийц' при сортировке тихих ходов, выше любой оценки из таблицы истории
+KILLER_SCORE = 1 << 30
+
+NODES_BETWEEN_TIME_CHECKS = 1024  # Как часто (в узлах) проверять, не закончилось ли время
+
+"""
+Оценка мата зависит от глубины, на которой он найден (MATE_SCORE - ply), как и оценка выигрыша по эндшпильным таблицам
+(TB_WIN_SCORE - ply). В таблице транспозиций такие оценки хранятся относительно самой позиции, а не корня поиска, иначе
+одна и та же позиция на разной глубине давала бы неверный мат или выигрыш.
+"""
+
+
+def score_to_tt(score, ply):
+    if score >= TB_WIN_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -(TB_WIN_SCORE - MAX_PLY):
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= TB_WIN_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -(TB_WIN_SCORE - MAX_PLY):
+        return score + ply
+    return score
+
+
+"""
+Оценка хода по рангу из ChessTablebase.probe_root. Выигрыш и проигрыш, которые не успевают случиться до ничьей по
+правилу 50 ходов, оцениваются как ничья - так же, как 'проклятая' победа и 'спасённое' поражение в negamax.
+"""
+
+
+def tb_rank_to_score(rank):
+    if rank >= WIN_RANK_BOUND:
+        return TB_WIN_SCORE
+    if rank <= -WIN_RANK_BOUND:
+        return -TB_WIN_SCORE
+    return 0
+
+
+class SearchResult:
+    """
+    Результат поиска:
+    best_move - лучший найденный ход (объект Move) или None, если ходов нет
+    score - оценка позиции в сотых долях пешки с точки зрения стороны, чья очередь ходить
+    depth - глубина последней завершённой итерации
+    pv - главный вариант (список ходов, который поиск считает лучшей игрой обеих сторон)
+    nodes - количество просмотренных позиций
+    elapsed - затраченное время в секундах
+    """
+
+    def __init__(self, best_move, score, depth, pv, nodes, elapsed):
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.pv = pv
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    # Количество позиций, просматриваемых в секунду
+    def get_nodes_per_second(self):
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+    def get_pv_notation(self):
+        return " ".join(move.get_chess_notation() for move in self.pv)
+
+
+class Searcher:
+    """
+    self.killers - для каждой глубины (ply) moveID двух последних 'тихих' ходов (не взятий), которые вызвали отсечение. В
+    соседних позициях на той же глубине такие ходы часто снова оказываются сильными, поэтому их пробуем раньше.
+    self.history - 'история' тихих ходов: чем чаще ход фигурой на квадрат вызывал отсечение, тем больше его оценка.
+    self.pv_table - треугольная таблица главного варианта: pv_table[ply] - лучшее продолжение, найденное из позиции
+    на глубине ply.
+    self.stopped - флаг остановки поиска (по времени, лимиту узлов или вызову stop()).
+    self.tt - таблица транспозиций. Её можно передать снаружи, чтобы она сохранялась между ходами партии.
+    self.stop_event - объект с методом is_set() (например, multiprocessing.Event), через который поиск может
+    остановить другой процесс. Проверяется вместе с ограничениями по времени.
+    self.tablebase - эндшпильные таблицы (ChessTablebase.Tablebase) или None.
+    self.tb_hits - сколько раз за поиск оценка была взята из эндшпильных таблиц.
+    """
+
+    def __init__(self, transposition_table=None, tablebase=None):
+        self.tt = transposition_table if transposition_table is not None else TranspositionTable(DEFAULT_TT_SIZE_MB)
+        self.tablebase = tablebase
+        self.tb_hits = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = {}
+        self.pv_table = [[] for _ in range(MAX_PLY + 1)]
+        self.previous_pv = []
+        self.nodes = 0
+        self.node_limit = None
+        self.deadline = None
+        self.stopped = False
+        self.stop_event = None
+
+    """
+    Остановить текущий поиск. Поиск вернёт результат последней завершённой итерации.
+    """
+
+    def stop(self):
+        self.stopped = True
+
+    """
+    Найти лучший ход для позиции gs. Можно задать максимальную глубину (depth), время в секундах (time_limit) и
+    максимальное количество узлов (node_limit). Если не задано ни одно ограничение, поиск идёт до глубины 4.
+    info_callback(result) вызывается после каждой завершённой итерации, например, чтобы выводить главный вариант и
+    скорость поиска. start_depth - глубина первой итерации (помощники параллельного поиска начинают с разных глубин).
+    """
+
+    def search(self, gs, depth=None, time_limit=None, node_limit=None, info_callback=None, start_depth=1):
+        if depth is None and time_limit is None and node_limit is None:
+            depth = 4
+        max_depth = min(depth, MAX_PLY) if depth is not None else MAX_PLY
+
+        start_time = time.perf_counter()
+        self.deadline = start_time + time_limit if time_limit is not None else None
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.tb_hits = 0
+        self.stopped = False
+        self.previous_pv = []
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history.clear()
+        self.tt.new_search()
+
+        root_moves = gs.get_valid_moves()
+        # Флаги позиции (checkmate, stalemate, draw, in_check) после поиска должны описывать корень. Поиск их не
+        # меняет, кроме 'закреплений': generate_moves_staged записывает в gs.pins 'закрепления' каждого узла
+        root_pins = gs.pins
+        if len(root_moves) == 0:
+            score = -MATE_SCORE if gs.in_check else 0
+            return SearchResult(None, score, 0, [], 0, time.perf_counter() - start_time)
+
+        # Позиция есть в эндшпильных таблицах - ход выбирается по ним без поиска
+        if self.tablebase is not None:
+            ranked_moves = self.tablebase.probe_root(gs)
+            if ranked_moves:
+                self.tb_hits += 1
+                best_move, rank, _ = ranked_moves[0]
+                score = tb_rank_to_score(rank)
+                result = SearchResult(best_move, score, 1, [best_move], 1, time.perf_counter() - start_time)
+                gs.pins = root_pins
+                if info_callback is not None:
+                    info_callback(result)
+                return result
+
+        result = None
+        for current_depth in range(min(start_depth, max_depth), max_depth + 1):
+            score = self.negamax(gs, current_depth, 0, -INFINITY, INFINITY)
+            if self.stopped:
+                break  # Незавершённая итерация не используется: её оценка 0 и главный вариант ничего не значат
+            result = self.get_iteration_result(gs, root_moves, score, current_depth, start_time)
+            if info_callback is not None:
+                info_callback(result)
+            # Если ход всего один, искать нечего, но вернём его с оценкой неглубокого поиска
+            if len(root_moves) == 1 or abs(score) >= MATE_SCORE - MAX_PLY:
+                break
+
+        # Ограничение сработало раньше, чем завершилась первая итерация. Ограничения уже исчерпаны, поэтому ход
+        # выбирается самым дешёвым поиском на глубину 1: без форсированных разменов, по оценке позиции после хода
+        if result is None:
+            result = self.search_root_static(gs, root_moves, start_time)
+            if info_callback is not None:
+                info_callback(result)
+        gs.pins = root_pins
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start_time
+        return result
+
+    """
+    Поиск на глубину 1 без форсированных разменов (quiescence): каждый ход корня оценивается статической оценкой
+    позиции после него, а ход, который ставит мат или пат, - как мат или ничья. Просматривает ровно len(root_moves) позиций.
+    """
+
+    def search_root_static(self, gs, root_moves, start_time):
+        best_move = root_moves[0]
+        best_score = -INFINITY
+        for move in root_moves:
+            gs.make_move(move)
+            self.nodes += 1
+            if next(gs.generate_moves_staged(), None) is None:
+                score = MATE_SCORE - 1 if gs.is_in_check() else 0
+            else:
+                score = -evaluate(gs)
+            gs.undo_move()
+            if score > best_score:
+                best_move, best_score = move, score
+        return SearchResult(best_move, best_score, 1, [best_move], self.nodes, time.perf_counter() - start_time)
+
+    """
+    Результат завершённой итерации глубины depth. Главный вариант дополняется ходами из таблицы транспозиций и
+    запоминается, чтобы следующая итерация пробовала его ходы первыми.
+    """
+
+    def get_iteration_result(self, gs, root_moves, score, depth, start_time):
+        pv = self.extend_pv_from_tt(gs, list(self.pv_table[0]), depth)
+        self.previous_pv = pv
+        return SearchResult(pv[0] if pv else root_moves[0], score, depth, pv or [root_moves[0]], self.nodes,
+                            time.perf_counter() - start_time)
+
+    """
+    Проверка ограничений по времени и узлам. Вызывается не в каждом узле, а раз в NODES_BETWEEN_TIME_CHECKS узлов.
+    """
+
+    def check_limits(self):
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            self.stopped = True
+        elif self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.stopped = True
+        elif self.stop_event is not None and self.stop_event.is_set():
+            self.stopped = True
+
+    """
+    Negamax с альфа-бета отсечением. Возвращает оценку позиции с точки зрения стороны, чья очередь ходить.
+    alpha - оценка, которую текущая сторона уже может себе гарантировать, beta - оценка, выше которой противник не
+    допустит. Если ход даёт оценку >= beta, остальные ходы можно не рассматривать (отсечение).
+    """
+
+    def negamax(self, gs, depth, ply, alpha, beta):
+        self.pv_table[ply] = []
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(gs, ply, alpha, beta)
+
+        self.nodes += 1
+        if self.nodes % NODES_BETWEEN_TIME_CHECKS == 0:
+            self.check_limits()
+
+        # Повторение позиции, правило 50 ходов и недостаточный материал - ничья. Повторением внутри поиска считается
+        # любая позиция, которая уже встречалась в партии или в текущем варианте
+        if ply > 0 and gs.get_draw_reason(2) is not None:
+            return 0
+
+        # Если позиция уже была просмотрена на нужную глубину, её оценку можно взять из таблицы. В корне поиска этого
+        # не делаем, чтобы всегда получать лучший ход и главный вариант.
+        key = gs.zobrist_key
+        entry = self.tt.probe(key)
+        tt_move_id = 0
+        if entry is not None:
+            tt_move_id, tt_depth, tt_bound, tt_score = entry
+            if ply > 0 and tt_depth >= depth:
+                tt_score = score_from_tt(tt_score, ply)
+                if tt_bound == BOUND_EXACT or (tt_bound == BOUND_LOWER and tt_score >= beta) or \
+                        (tt_bound == BOUND_UPPER and tt_score <= alpha):
+                    return tt_score
+
+        # После взятия или хода пешкой позиция может оказаться в эндшпильных таблицах. Оценка из таблиц точная,
+        # дальше искать не нужно, поэтому в таблицу транспозиций она записывается с наибольшей глубиной. 'Проклятая'
+        # победа и 'спасённое' поражение считаются ничьей из-за правила 50 ходов
+        if self.tablebase is not None and ply > 0 and gs.halfmove_clock == 0:
+            wdl = self.tablebase.probe_wdl(gs)
+            if wdl is not None:
+                self.tb_hits += 1
+                score = TB_WIN_SCORE - ply if wdl == WDL_WIN else -(TB_WIN_SCORE - ply) if wdl == WDL_LOSS else 0
+                self.tt.store(key, 0, MAX_PLY, BOUND_EXACT, score_to_tt(score, ply))
+                return score
+
+        # Первым пробуется ход из таблицы транспозиций, а если его нет - ход главного варианта предыдущей итерации
+        if not tt_move_id and ply < len(self.previous_pv):
+            tt_move_id = self.previous_pv[ply].moveID
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        moves_searched = 0
+        for move in gs.generate_moves_staged(tt_move_id, self.get_quiet_order_key(ply)):
+            moves_searched += 1
+            gs.make_move(move)
+            score = -self.negamax(gs, depth - 1, ply + 1, -beta, -alpha)
+            gs.undo_move()
+            if self.stopped:
+                return 0
+
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    best_move = move
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+                    if score >= beta:
+                        if move.piece_captured == "--":
+                            self.store_quiet_cutoff(move, depth, ply)
+                        break
+
+        if moves_searched == 0:
+            # Мат оценивается тем выше, чем быстрее он ставится, пат - ничья
+            return -(MATE_SCORE - ply) if gs.is_in_check() else 0
+
+        if best_score <= original_alpha:
+            bound = BOUND_UPPER  # Ни один ход не улучшил alpha, лучший ход неизвестен
+        elif best_score >= beta:
+            bound = BOUND_LOWER
+        else:
+            bound = BOUND_EXACT
+        self.tt.store(key, best_move.moveID if best_move is not None else 0, depth, bound,
+                      score_to_tt(best_score, ply))
+        return best_score
+
+    """
+    Поиск только по взятиям в конце основного поиска, чтобы не оценивать позицию посреди размена. Сторона может
+    'остановиться' (stand pat) и не брать, если текущая оценка уже достаточно хороша, кроме случая, когда ей объявлен
+    шах. Без шаха генерируются только взятия и превращения, поэтому пат здесь не распознаётся.
+    """
+
+    def quiescence(self, gs, ply, alpha, beta):
+        self.nodes += 1
+        if self.nodes % NODES_BETWEEN_TIME_CHECKS == 0:
+            self.check_limits()
+
+        in_check = gs.is_in_check()
+        if in_check:
+            best_score = -INFINITY
+        else:
+            best_score = evaluate(gs)
+            if best_score >= beta or ply >= MAX_PLY:
+                return best_score
+            alpha = max(alpha, best_score)
+
+        moves_searched = 0
+        for move in gs.generate_moves_staged(quiet_order_key=self.get_quiet_order_key(ply), captures_only=not in_check):
+            moves_searched += 1
+            gs.make_move(move)
+            score = -self.quiescence(gs, ply + 1, -beta, -alpha)
+            gs.undo_move()
+            if self.stopped:
+                return 0
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if score >= beta:
+                        break
+
+        if in_check and moves_searched == 0:
+            return -(MATE_SCORE - ply)
+        return best_score
+
+    """
+    Ключ сортировки тихих ходов для generate_moves_staged (ход из таблицы транспозиций и взятия генератор выдаёт раньше
+    сам). Первыми идут 'ходы-убийцы' для этой глубины, остальные - по оценке из таблицы истории.
+    """
+
+    def get_quiet_order_key(self, ply):
+        first_killer, second_killer = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        history = self.history
+
+        def quiet_score(move):
+            move_id = move.moveID
+            if move_id == first_killer or move_id == second_killer:
+                return KILLER_SCORE
+            return history.get((move.piece_moved, move.end_row, move.end_column), 0)
+
+        return quiet_score
+
+    """
+    Главный вариант может оборваться, если в одном из его узлов оценка была взята из таблицы транспозиций. В этом случае
+    продолжаем его лучшими ходами, сохранёнными в таблице, пока они есть и пока вариант не станет длиной depth. Ход из
+    таблицы проверяется поэтапным генератором: он выдаёт его первым, если ход возможен, и, в отличие от
+    get_valid_moves, не меняет флаги позиции.
+    """
+
+    def extend_pv_from_tt(self, gs, pv, depth):
+        made_moves = 0
+        for move in pv:
+            gs.make_move(move)
+            made_moves += 1
+        while len(pv) < depth:
+            entry = self.tt.probe(gs.zobrist_key)
+            if entry is None or entry[0] == 0:
+                break
+            next_move = next(gs.generate_moves_staged(hash_move_id=entry[0]), None)
+            if next_move is None or next_move.moveID != entry[0]:
+                break
+            pv.append(next_move)
+            gs.make_move(next_move)
+            made_moves += 1
+        for _ in range(made_moves):
+            gs.undo_move()
+        return pv
+
+    """
+    Запомнить тихий ход, вызвавший отсечение: добавить его в 'ходы-убийцы' и увеличить его оценку в таблице истории.
+    """
+
+    def store_quiet_cutoff(self, move, depth, ply):
+        killers = self.killers[ply]
+        if move.moveID != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = move.moveID
+        key = (move.piece_moved, move.end_row, move.end_column)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+
+"""
+Найти лучший ход одной функцией, без создания объекта Searcher. transposition_table - таблица транспозиций, которая
+сохраняется между ходами партии; без неё каждый вызов начинает с пустой таблицы.
+"""
+
+
+def find_best_move(gs, depth=None, time_limit=None, node_limit=None, tablebase=None, transposition_table=None):
+    return Searcher(transposition_table, tablebase).search(gs, depth=depth, time_limit=time_limit,
+                                                           node_limit=node_limit).best_move
@@ -0,0 +1,386 @@
+"""
+Сервер партий на asyncio: один процесс обслуживает много клиентов и много партий одновременно. Клиенты подключаются
+по TCP и обмениваются с сервером объектами JSON, по одному на строку (как в файлах JSON lines). Каждый ответ - тоже
+одна строка JSON с полем "ok"; при ошибке в поле "error" лежит её описание.
+
+Запросы (поле "command"):
+    {"command": "new", "fen": <FEN, необязательно>}                 - новая партия, в ответе её номер "session"
+    {"command": "move", "session": <номер>, "move": "e2e4", "reply": true}
+                                                                     - ход игрока; при "reply": true компьютер
+                                                                       отвечает, и его ход приходит в поле "reply"
+    {"command": "go", "session": <номер>}                           - ход компьютера в текущей позиции
+    {"command": "state", "session": <номер>}                        - позиция и список возможных ходов
+    {"command": "close", "session": <номер>}                        - закончить партию
+
+Ходы записываются координатами, как в UCI (e2e4, e7e8q). Партии хранятся в таблице сессий: номер -> Session с
+GameState и закешированным индексом возможных ходов (MoveSet), поэтому проверка хода игрока - поиск в словаре, а не
+генерация ходов. Ход компьютера ищется в пуле процессов, чтобы цикл событий не блокировался поиском: в процесс
+передаются начальная позиция и упакованные ходы партии. Партии, в которых не ходили дольше --compact-after секунд,
+хранятся компактным снимком (GameSnapshot) вместо GameState и восстанавливаются при следующем обращении, а партии, к
+которым не обращались дольше --ttl секунд, удаляются.
+
+Запуск из папки, в которой лежит пакет Chess:
+    python -m Chess.ChessServer --port 8765 --workers 4            - сервер
+    python -m Chess.ChessServer --port 8765 --client --games 20    - тестовый клиент: 20 партий одновременно,
+                                                                     игрок делает случайные ходы, компьютер отвечает
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import secrets
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Chess import ChessEngine, ChessPGN, ChessSearch, ChessUCI
+from Chess.ChessTransposition import TranspositionTable
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_SESSION_TTL = 30 * 60  # Сколько секунд хранится партия, к которой не обращались
+DEFAULT_COMPACT_AFTER = 60  # Через сколько секунд без обращений партия сжимается в снимок
+DEFAULT_ENGINE_TIME = 0.5  # Время поиска хода компьютера в секундах
+WORKER_TT_SIZE_MB = 8  # Размер таблицы транспозиций каждого процесса поиска
+MAX_REQUEST_SIZE = 1 << 16  # Максимальная длина строки запроса в байтах
+
+# Состояние процесса поиска: создаётся один раз в init_worker и используется для всех ходов всех партий
+WORKER_STATE = {}
+
+"""
+Инициализация процесса поиска
+"""
+
+
+def init_worker(tt_size_mb):
+    WORKER_STATE["gs"] = ChessEngine.GameState()
+    WORKER_STATE["searcher"] = ChessSearch.Searcher(TranspositionTable(tt_size_mb))
+
+
+"""
+Поиск хода компьютера в процессе пула. Позиция передаётся начальной позицией партии и упакованными ходами, чтобы у
+процесса была та же история партии, что и у сервера. Возвращает упакованный лучший ход (0, если ходов нет).
+"""
+
+
+def engine_move(start_fen, encoded_moves, time_limit, depth):
+    gs = WORKER_STATE["gs"]
+    gs.load_fen(start_fen)
+    for encoded in encoded_moves:
+        gs.make_move(gs.move_from_encoded(encoded))
+    result = WORKER_STATE["searcher"].search(gs, depth=depth, time_limit=time_limit)
+    return result.best_move.encoded if result.best_move is not None else 0
+
+
+class Session:
+    """
+    Партия на сервере.
+    self.gs - позиция партии, self.start_fen - позиция, с которой партия началась.
+    self.valid_moves - возможные ходы текущей позиции (MoveSet с индексом). Считаются один раз после каждого хода и
+    используются для проверки всех ходов игрока.
+    self.snapshot - снимок партии (GameSnapshot), пока она сжата (см. compact), иначе None. У сжатой партии self.gs и
+    self.valid_moves равны None.
+    self.last_used - время последнего обращения (time.monotonic), по нему удаляются забытые партии.
+    self.busy - компьютер ищет ход, и ходить в партии пока нельзя.
+    """
+
+    # Партий могут быть тысячи, поэтому атрибуты хранятся в слотах
+    __slots__ = ("gs", "start_fen", "valid_moves", "snapshot", "last_used", "busy")
+
+    def __init__(self, fen=ChessEngine.START_FEN):
+        self.gs = ChessEngine.GameState(fen)
+        self.start_fen = fen
+        self.valid_moves = self.gs.get_valid_moves(indexed=True)
+        self.snapshot = None
+        self.last_used = time.monotonic()
+        self.busy = False
+
+    """
+    Заменить GameState и индекс ходов компактным снимком партии
+    """
+
+    def compact(self):
+        if self.snapshot is None:
+            self.snapshot = self.gs.get_snapshot()
+            self.gs = None
+            self.valid_moves = None
+
+    """
+    Восстановить GameState сжатой партии
+    """
+
+    def expand(self):
+        if self.snapshot is not None:
+            self.gs = self.snapshot.restore()
+            self.valid_moves = self.gs.get_valid_moves(indexed=True)
+            self.snapshot = None
+
+    def make_move(self, move):
+        self.gs.make_move(move)
+        self.valid_moves = self.gs.get_valid_moves(indexed=True)
+
+    def get_encoded_moves(self):
+        return [move.encoded for move in self.gs.move_log]
+
+    def get_state(self):
+        return {"fen": self.gs.get_fen(), "result": ChessPGN.get_result(self.gs, self.valid_moves),
+                "white_turn": self.gs.white_turn, "in_check": self.gs.in_check}
+
+
+class GameServer:
+    """
+    self.sessions - таблица партий: номер (строка) -> Session.
+    self.pool - пул процессов для поиска ходов компьютера.
+    engine_time, engine_depth - ограничения поиска хода компьютера, session_ttl - время жизни забытой партии в секундах,
+    compact_after - через сколько секунд без обращений партия сжимается в снимок.
+    """
+
+    def __init__(self, workers=None, engine_time=DEFAULT_ENGINE_TIME, engine_depth=None,
+                 session_ttl=DEFAULT_SESSION_TTL, compact_after=DEFAULT_COMPACT_AFTER):
+        self.sessions = {}
+        self.engine_time = engine_time
+        self.engine_depth = engine_depth
+        self.session_ttl = session_ttl
+        self.compact_after = compact_after
+        self.pool = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(WORKER_TT_SIZE_MB,))
+        self.server = None
+        self.evict_task = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_REQUEST_SIZE)
+        self.evict_task = asyncio.get_running_loop().create_task(self.evict_idle_sessions())
+        return self.server
+
+    async def close(self):
+        if self.evict_task is not None:
+            self.evict_task.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.pool.shutdown(cancel_futures=True)
+
+    """
+    Удалять партии, к которым не обращались дольше session_ttl секунд, и сжимать партии, к которым не обращались
+    дольше compact_after секунд. Проверка идёт несколько раз за эти промежутки, поэтому партия живёт не дольше
+    1.25 * session_ttl.
+    """
+
+    async def evict_idle_sessions(self):
+        while True:
+            await asyncio.sleep(max(min(self.session_ttl, self.compact_after) / 4, 0.1))
+            now = time.monotonic()
+            expired = []
+            for key, session in self.sessions.items():
+                if session.busy:
+                    continue
+                if session.last_used < now - self.session_ttl:
+                    expired.append(key)
+                elif session.last_used < now - self.compact_after:
+                    session.compact()
+            for key in expired:
+                del self.sessions[key]
+
+    """
+    Обслуживание одного клиента: запросы обрабатываются по очереди, ответ на запрос отправляется до чтения следующего
+    """
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # Строка длиннее MAX_REQUEST_SIZE
+                    writer.write(b'{"ok": false, "error": "request too long"}\n')
+                    break
+                if not line:
+                    break
+                response = await self.handle_request(line)
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"ok": False, "error": "invalid json"}
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "request must be an object"}
+        command = request.get("command")
+        if command == "new":
+            return self.new_session(request.get("fen", ChessEngine.START_FEN))
+
+        key = request.get("session")
+        session = self.sessions.get(key) if isinstance(key, str) else None
+        if session is None:
+            return {"ok": False, "error": "unknown session"}
+        if command == "close":
+            del self.sessions[key]
+            return {"ok": True}
+        session.last_used = time.monotonic()
+        session.expand()
+        if command == "state":
+            response = {"ok": True, "moves": [move.get_chess_notation() for move in session.valid_moves]}
+            response.update(session.get_state())
+            return response
+        if command not in ("move", "go"):
+            return {"ok": False, "error": "unknown command"}
+        if session.busy:
+            return {"ok": False, "error": "engine is thinking"}
+
+        response = {"ok": True}
+        if command == "move":
+            move = ChessUCI.parse_uci_move(session.gs, str(request.get("move", "")), session.valid_moves)
+            if move is None:
+                return {"ok": False, "error": "illegal move"}
+            session.make_move(move)
+        # Партия, закончившаяся ничьей по правилам (повторение, 50 ходов, недостаточный материал), закончена, хотя ходы
+        # в позиции есть: компьютер не ходит, а в ответе возвращается результат. Флаг draw уже выставлен при подсчёте
+        # session.valid_moves
+        if (command == "go" or request.get("reply")) and session.valid_moves and not session.gs.draw:
+            reply = await self.get_engine_move(session)
+            if reply is not None:
+                response["reply"] = reply.get_chess_notation()
+        response.update(session.get_state())
+        return response
+
+    def new_session(self, fen):
+        try:
+            session = Session(fen)
+        except (ValueError, IndexError, KeyError, TypeError, AttributeError):
+            return {"ok": False, "error": "invalid fen"}
+        key = secrets.token_hex(8)
+        self.sessions[key] = session
+        response = {"ok": True, "session": key}
+        response.update(session.get_state())
+        return response
+
+    """
+    Найти и сделать ход компьютера в партии session. Поиск идёт в пуле процессов, а цикл событий тем временем
+    обслуживает других клиентов. Возвращает сделанный ход или None.
+    """
+
+    async def get_engine_move(self, session):
+        session.busy = True
+        try:
+            encoded = await asyncio.get_running_loop().run_in_executor(
+                self.pool, engine_move, session.start_fen, session.get_encoded_moves(), self.engine_time,
+                self.engine_depth)
+        finally:
+            session.busy = False
+            session.last_used = time.monotonic()
+        if not encoded:
+            return None
+        move = session.gs.move_from_encoded(encoded)
+        session.make_move(move)
+        return move
+
+
+async def serve(host, port, workers, engine_time, engine_depth, session_ttl, compact_after):
+    server = GameServer(workers, engine_time, engine_depth, session_ttl, compact_after)
+    await server.start(host, port)
+    print("Сервер запущен на %s:%d" % (host, port), file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+"""
+Тестовый клиент
+"""
+
+
+async def send_request(reader, writer, request):
+    writer.write(json.dumps(request).encode("utf-8") + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+"""
+Сыграть одну партию: игрок делает случайные ходы, компьютер отвечает на каждый. Возвращает результат партии и
+список задержек ответов сервера в секундах.
+"""
+
+
+async def play_random_game(host, port, max_moves, random_generator):
+    reader, writer = await asyncio.open_connection(host, port)
+    latencies = []
+    try:
+        state = await send_request(reader, writer, {"command": "new"})
+        session = state["session"]
+        for _ in range(max_moves):
+            state = await send_request(reader, writer, {"command": "state", "session": session})
+            if state["result"] != "*":
+                break
+            start_time = time.perf_counter()
+            state = await send_request(reader, writer, {"command": "move", "session": session,
+                                                        "move": random_generator.choice(state["moves"]),
+                                                        "reply": True})
+            latencies.append(time.perf_counter() - start_time)
+            if not state["ok"]:
+                raise RuntimeError(state["error"])
+        await send_request(reader, writer, {"command": "close", "session": session})
+        return state["result"], latencies
+    finally:
+        writer.close()
+
+
+"""
+Открыть idle_sessions партий без ходов (проверка памяти и таблицы сессий), затем сыграть games партий одновременно
+"""
+
+
+async def run_client(host, port, games, max_moves, idle_sessions, seed):
+    if idle_sessions:
+        reader, writer = await asyncio.open_connection(host, port)
+        for _ in range(idle_sessions):
+            await send_request(reader, writer, {"command": "new"})
+        writer.close()
+        print("idle sessions opened: %d" % idle_sessions)
+
+    start_time = time.perf_counter()
+    random_generator = random.Random(seed)
+    results = await asyncio.gather(*(play_random_game(host, port, max_moves, random_generator)
+                                     for _ in range(games)))
+    latencies = sorted(latency for _, game_latencies in results for latency in game_latencies)
+    print("games: %d, moves: %d, time: %.3f s" % (games, len(latencies), time.perf_counter() - start_time))
+    if latencies:
+        print("reply latency: median %.3f s, max %.3f s" % (latencies[len(latencies) // 2], latencies[-1]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сервер партий по TCP (JSON lines) и тестовый клиент")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="процессов поиска (по умолчанию - по ядрам)")
+    parser.add_argument("--time", type=float, default=DEFAULT_ENGINE_TIME, help="время хода компьютера в секундах")
+    parser.add_argument("--depth", type=int, default=None, help="глубина поиска хода компьютера")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_SESSION_TTL,
+                        help="через сколько секунд без обращений партия удаляется")
+    parser.add_argument("--compact-after", type=float, default=DEFAULT_COMPACT_AFTER,
+                        help="через сколько секунд без обращений партия хранится компактным снимком")
+    parser.add_argument("--client", action="store_true", help="запустить тестовый клиент вместо сервера")
+    parser.add_argument("--games", type=int, default=10, help="клиент: партий одновременно")
+    parser.add_argument("--max-moves", type=int, default=40, help="клиент: ходов игрока в партии")
+    parser.add_argument("--idle", type=int, default=0, help="клиент: открыть столько партий без ходов")
+    parser.add_argument("--seed", type=int, default=None, help="клиент: зерно случайных ходов")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.client:
+            asyncio.run(run_client(args.host, args.port, args.games, args.max_moves, args.idle, args.seed))
+        else:
+            asyncio.run(serve(args.host, args.port, args.workers, args.time, args.depth, args.ttl,
+                              args.compact_after))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
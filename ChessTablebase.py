@@ -0,0 +1,954 @@
+"""
+Чтение эндшпильных таблиц в формате Syzygy. В таблицах заранее посчитан результат каждой позиции с небольшим
+количеством фигур, поэтому в эндшпиле можно не искать, а сразу знать, выиграна позиция, проиграна или ничейна.
+
+Таблицы бывают двух видов:
+    .rtbw (WDL - win/draw/loss) - результат позиции при правильной игре с учётом правила 50 ходов
+    .rtbz (DTZ - distance to zeroing) - сколько полуходов осталось до взятия или хода пешкой (обнуления счётчика
+          50 ходов) при лучшей игре. По этим таблицам выбирается ход в корне, чтобы выигрыш действительно был доведён
+          до конца, а не ходил по кругу.
+Описание формата и исходный код оригинального модуля чтения: https://github.com/syzygy1/tb
+
+Файлы таблиц большие, поэтому они не читаются в память. Файл отображается в память через mmap при первом обращении
+к таблице, а из него читаются только заголовок и нужный сжатый блок. Значения в блоке закодированы кодом Хаффмана
+поверх сжатия 'рекурсивными парами', и раскодировать блок каждый раз дорого. Поэтому раскодированные блоки хранятся
+в кеше LRU ограниченного размера: при переполнении выбрасывается блок, к которому дольше всего не обращались.
+
+Внутри модуля квадраты нумеруются так же, как в таблицах: a1 = 0, h1 = 7, a8 = 56 (номер квадрата GameState
+отличается от него XOR 56).
+
+Запуск из папки, в которой лежит пакет Chess:
+    python -m Chess.ChessTablebase syzygy --fen "8/8/8/8/8/8/2Rk4/1K6 b - - 0 1"
+"""
+
+import argparse
+import bisect
+import mmap
+import os
+import re
+import struct
+import sys
+from collections import OrderedDict
+from math import comb
+
+from Chess import ChessEngine
+from Chess.ChessBitboards import pop_count
+
+WDL_SUFFIX = ".rtbw"
+DTZ_SUFFIX = ".rtbz"
+WDL_MAGIC = b"\x71\xe8\x23\x5d"
+DTZ_MAGIC = b"\xd7\x66\x0c\xa5"
+TABLE_NAME_REGEX = re.compile(r"^K[QRBNP]*vK[QRBNP]*$")
+
+"""
+Результат по таблице WDL с точки зрения стороны, чья очередь ходить. 'Проклятая' победа (cursed win) и 'спасённое'
+поражение (blessed loss) - победа и поражение, которые не успевают случиться до ничьей по правилу 50 ходов.
+"""
+WDL_LOSS = -2
+WDL_BLESSED_LOSS = -1
+WDL_DRAW = 0
+WDL_CURSED_WIN = 1
+WDL_WIN = 2
+
+# Флаги части таблицы
+FLAG_STM = 1  # DTZ: для какой стороны хранится таблица (0 - белые, 1 - чёрные)
+FLAG_MAPPED = 2  # DTZ: значения перекодируются через таблицу перекодировки
+FLAG_WIN_PLIES = 4  # DTZ: выигрыши хранятся в полуходах, а не в ходах
+FLAG_LOSS_PLIES = 8  # DTZ: проигрыши хранятся в полуходах, а не в ходах
+FLAG_WIDE = 16  # DTZ: таблица перекодировки из 16-битных чисел
+FLAG_SINGLE_VALUE = 128  # Все позиции части таблицы имеют одно значение
+
+# Коды фигур в файлах таблиц: белые 1-6, чёрные 9-14, поэтому цвет фигуры меняется XOR 8
+PIECE_CODES = {"wP": 1, "wN": 2, "wB": 3, "wR": 4, "wQ": 5, "wK": 6,
+               "bP": 9, "bN": 10, "bB": 11, "bR": 12, "bQ": 13, "bK": 14}
+CODE_PIECES = {code: piece for piece, code in PIECE_CODES.items()}
+MATERIAL_ORDER = ("K", "Q", "R", "B", "N", "P")  # Порядок фигур в названии таблицы (KQRvK)
+
+# Номер таблицы перекодировки DTZ для каждого результата WDL (индекс - результат WDL + 2)
+WDL_TO_MAP_INDEX = (1, 3, 0, 2, 0)
+
+DEFAULT_CACHE_BLOCKS = 4096  # Сколько раскодированных блоков хранить в кеше
+MAX_DTZ = 1 << 18  # Ранг гарантированного выигрыша при выборе хода в корне
+WIN_RANK_BOUND = MAX_DTZ // 2  # Ранги не ниже этого - выигрыш, который успевает случиться до ничьей по 50 ходам
+
+MASK_64 = (1 << 64) - 1
+UINT16 = struct.Struct("<H")
+UINT32 = struct.Struct("<I")
+UINT32_BIG = struct.Struct(">I")
+UINT64_BIG = struct.Struct(">Q")
+SPARSE_ENTRY = struct.Struct("<IH")
+
+
+class MissingTableError(LookupError):
+    """
+    Для позиции (или позиции после взятия) нет нужного файла таблицы. Наружу не выходит: функции проверки таблиц
+    в этом случае возвращают None.
+    """
+
+
+"""
+На сколько квадрат выше (> 0) или ниже (< 0) диагонали a1-h8
+"""
+
+
+def off_diagonal(square):
+    return (square >> 3) - (square & 7)
+
+
+"""
+Таблицы для вычисления номера позиции в таблице. Расположение фигур сводится к одному из симметричных вариантов
+(отражения доски), а затем фигуры одной группы кодируются сочетаниями без повторений.
+    MAP_B1H1H7[square] - номер квадрата ниже диагонали a1-h8 (0..27)
+    MAP_A1D1D4[square] - номер квадрата треугольника a1-d1-d4 (0..9), квадраты диагонали - последние
+    MAP_KK[index][square] - номер расположения двух королей, когда первый стоит на квадрате index треугольника
+    MAP_PAWNS[square] - номер квадрата для пешек (a2-h7): чем ближе к краю доски и к своей горизонтали, тем больше
+    LEAD_PAWN_INDEX, LEAD_PAWNS_SIZE - номера и количество расположений ведущих пешек для каждой вертикали a-d
+"""
+
+
+def build_index_tables():
+    map_b1h1h7 = [0] * 64
+    code = 0
+    for square in range(64):
+        if off_diagonal(square) < 0:
+            map_b1h1h7[square] = code
+            code += 1
+
+    map_a1d1d4 = [0] * 64
+    diagonal = []
+    code = 0
+    for square in range(28):  # a1..d4
+        if square & 7 > 3:
+            continue
+        if off_diagonal(square) < 0:
+            map_a1d1d4[square] = code
+            code += 1
+        elif off_diagonal(square) == 0:
+            diagonal.append(square)
+    for square in diagonal:
+        map_a1d1d4[square] = code
+        code += 1
+
+    map_kk = [[0] * 64 for _ in range(10)]
+    both_on_diagonal = []
+    code = 0
+    for index in range(10):
+        for first in range(28):
+            if map_a1d1d4[first] != index or (index == 0 and first != 1):  # Квадрат b1 имеет номер 0
+                continue
+            for second in range(64):
+                if max(abs((first >> 3) - (second >> 3)), abs((first & 7) - (second & 7))) <= 1:
+                    continue  # Короли рядом - позиция невозможна
+                if off_diagonal(first) == 0 and off_diagonal(second) > 0:
+                    continue  # Первый король на диагонали, второй выше неё - это отражение другой позиции
+                if off_diagonal(first) == 0 and off_diagonal(second) == 0:
+                    both_on_diagonal.append((index, second))
+                else:
+                    map_kk[index][second] = code
+                    code += 1
+    for index, second in both_on_diagonal:
+        map_kk[index][second] = code
+        code += 1
+
+    binomial = [[comb(n, k) for n in range(64)] for k in range(7)]
+
+    map_pawns = [0] * 64
+    lead_pawn_index = [[0] * 64 for _ in range(6)]
+    lead_pawns_size = [[0] * 4 for _ in range(6)]
+    available_squares = 47
+    for lead_pawns_count in range(1, 6):
+        for file in range(4):
+            index = 0
+            for rank in range(1, 7):
+                square = rank * 8 + file
+                if lead_pawns_count == 1:
+                    map_pawns[square] = available_squares
+                    map_pawns[square ^ 7] = available_squares - 1
+                    available_squares -= 2
+                lead_pawn_index[lead_pawns_count][square] = index
+                index += binomial[lead_pawns_count - 1][map_pawns[square]]
+            lead_pawns_size[lead_pawns_count][file] = index
+    return map_b1h1h7, map_a1d1d4, map_kk, binomial, map_pawns, lead_pawn_index, lead_pawns_size
+
+
+MAP_B1H1H7, MAP_A1D1D4, MAP_KK, BINOMIAL, MAP_PAWNS, LEAD_PAWN_INDEX, LEAD_PAWNS_SIZE = build_index_tables()
+
+"""
+Название таблицы для позиции: фигуры белых, 'v', фигуры чёрных (например, KRPvKR)
+"""
+
+
+def get_material_name(bitboards):
+    return "v".join("".join(piece_type * pop_count(bitboards[color + piece_type]) for piece_type in MATERIAL_ORDER)
+                    for color in ("w", "b"))
+
+
+def mirror_name(name):
+    white, black = name.split("v")
+    return black + "v" + white
+
+
+def sign(value):
+    return (value > 0) - (value < 0)
+
+
+"""
+DTZ хода, который сам обнуляет счётчик 50 ходов, по результату позиции WDL
+"""
+
+
+def dtz_before_zeroing(wdl):
+    if wdl == WDL_WIN:
+        return 1
+    if wdl == WDL_CURSED_WIN:
+        return 101
+    if wdl == WDL_BLESSED_LOSS:
+        return -101
+    if wdl == WDL_LOSS:
+        return -1
+    return 0
+
+
+class BlockCache:
+    """
+    Кеш LRU раскодированных блоков. Ключ - (часть таблицы, номер блока). При обращении блок переносится в конец
+    очереди, а при переполнении удаляется блок из начала, т.е. тот, к которому дольше всего не обращались.
+    """
+
+    def __init__(self, capacity=DEFAULT_CACHE_BLOCKS):
+        self.capacity = capacity
+        self.blocks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        block = self.blocks.get(key)
+        if block is None:
+            self.misses += 1
+            return None
+        self.blocks.move_to_end(key)
+        self.hits += 1
+        return block
+
+    def put(self, key, block):
+        self.blocks[key] = block
+        if len(self.blocks) > self.capacity:
+            self.blocks.popitem(last=False)
+
+    def clear(self):
+        self.blocks.clear()
+
+
+class PairsData:
+    """
+    Заголовок одной части таблицы. Таблица делится на части по стороне, чья очередь ходить (только WDL), и для таблиц
+    с пешками - по вертикали ведущей пешки (a-d).
+    pieces - порядок фигур (коды файла) при вычислении номера позиции
+    group_lengths, group_indices - размеры групп фигур, кодируемых вместе, и множители номеров групп
+    base, lowest_symbols, min_symbol_length - канонический код Хаффмана
+    left, right, symbol_lengths - дерево 'рекурсивных пар': символ раскрывается в пару символов left и right, всего
+    в symbol_lengths[symbol] + 1 значений
+    sparse_index, block_lengths, data - смещения в файле разреженного индекса, длин блоков и самих блоков
+    """
+
+    def __init__(self):
+        self.pieces = []
+        self.group_lengths = []
+        self.group_indices = []
+        self.flags = 0
+        self.map_indices = [0, 0, 0, 0]
+        self.min_symbol_length = 0
+        self.block_size = 0
+        self.span = 0
+        self.blocks_count = 0
+        self.base = []
+        self.lowest_symbols = []
+        self.left = []
+        self.right = []
+        self.symbol_lengths = []
+        self.sparse_index = 0
+        self.block_lengths = 0
+        self.data = 0
+
+
+class TableFile:
+    """
+    Один файл таблицы (.rtbw или .rtbz). Свойства таблицы берутся из названия, а сам файл открывается только при
+    первом обращении (open).
+    name - название таблицы, сильнейшая сторона записана первой (KRvK)
+    symmetric - у обеих сторон одинаковые фигуры (KRvKR), тогда хранятся только позиции с ходом белых
+    pawn_counts - количество пешек ведущей стороны (той, у которой пешек меньше, но не ноль) и второй стороны
+    has_unique_pieces - есть фигура (не король), которая у своей стороны одна: тогда вместе кодируются три фигуры,
+    иначе только короли
+    """
+
+    def __init__(self, path, name, is_wdl):
+        self.path = path
+        self.name = name
+        self.is_wdl = is_wdl
+        self.symmetric = name == mirror_name(name)
+        white, black = name.split("v")
+        self.piece_count = len(white) + len(black)
+        self.has_pawns = "P" in name
+        self.has_unique_pieces = any(side.count(piece_type) == 1 for side in (white, black) for piece_type in "QRBNP")
+        white_pawns = white.count("P")
+        black_pawns = black.count("P")
+        if not black_pawns or (white_pawns and black_pawns >= white_pawns):
+            self.pawn_counts = (white_pawns, black_pawns)
+        else:
+            self.pawn_counts = (black_pawns, white_pawns)
+        self.file = None
+        self.data = None
+        self.parts = []
+        self.dtz_map = 0
+
+    """
+    Отобразить файл в память и разобрать заголовок
+    """
+
+    def open(self):
+        self.file = open(self.path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] != (WDL_MAGIC if self.is_wdl else DTZ_MAGIC):
+            self.close()
+            raise ValueError("Неверная сигнатура файла таблицы: " + self.path)
+        self.read_header()
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def read_header(self):
+        data = self.data
+        sides = 2 if self.is_wdl and not self.symmetric else 1
+        files = 4 if self.has_pawns else 1
+        both_sides_pawns = self.has_pawns and self.pawn_counts[1] > 0
+        self.parts = [[PairsData() for _ in range(files)] for _ in range(sides)]
+
+        position = 5  # Сигнатура и байт флагов
+        for file in range(files):
+            second_order = data[position + 1] if both_sides_pawns else 0xFF
+            orders = ((data[position] & 0xF, second_order & 0xF), (data[position] >> 4, second_order >> 4))
+            position += 2 if both_sides_pawns else 1
+            for _ in range(self.piece_count):
+                for side in range(sides):
+                    self.parts[side][file].pieces.append(data[position] >> 4 if side else data[position] & 0xF)
+                position += 1
+            for side in range(sides):
+                self.set_groups(self.parts[side][file], orders[side], file)
+
+        position += position & 1
+        for file in range(files):
+            for side in range(sides):
+                position = self.read_sizes(self.parts[side][file], position)
+        if not self.is_wdl:
+            position = self.read_dtz_map(position, files)
+        for file in range(files):
+            for side in range(sides):
+                part = self.parts[side][file]
+                part.sparse_index = position
+                position += part.sparse_index_size * SPARSE_ENTRY.size
+        for file in range(files):
+            for side in range(sides):
+                part = self.parts[side][file]
+                part.block_lengths = position
+                position += part.block_length_size * UINT16.size
+        for file in range(files):
+            for side in range(sides):
+                part = self.parts[side][file]
+                position = (position + 0x3F) & ~0x3F  # Блоки выровнены по 64 байта
+                part.data = position
+                position += part.blocks_count * part.block_size
+
+    """
+    Разбить фигуры части таблицы на группы и посчитать множители номеров групп. Номер позиции складывается из номеров
+    групп как число в смешанной системе счисления, порядок групп в нём задан в файле (orders).
+    """
+
+    def set_groups(self, part, orders, file):
+        first_length = 0 if self.has_pawns else 3 if self.has_unique_pieces else 2
+        lengths = [1]
+        for i in range(1, self.piece_count):
+            first_length -= 1
+            if first_length > 0 or part.pieces[i] == part.pieces[i - 1]:
+                lengths[-1] += 1
+            else:
+                lengths.append(1)
+        groups_count = len(lengths)
+        lengths.append(0)
+
+        both_sides_pawns = self.has_pawns and self.pawn_counts[1] > 0
+        next_group = 2 if both_sides_pawns else 1
+        free_squares = 64 - lengths[0] - (lengths[1] if both_sides_pawns else 0)
+        indices = [0] * (groups_count + 1)
+        index = 1
+        k = 0
+        while next_group < groups_count or k == orders[0] or k == orders[1]:
+            if k == orders[0]:  # Ведущие пешки или фигуры
+                indices[0] = index
+                if self.has_pawns:
+                    index *= LEAD_PAWNS_SIZE[lengths[0]][file]
+                else:
+                    index *= 31332 if self.has_unique_pieces else 462
+            elif k == orders[1]:  # Остальные пешки
+                indices[1] = index
+                index *= BINOMIAL[lengths[1]][48 - lengths[0]]
+            else:  # Остальные фигуры
+                indices[next_group] = index
+                index *= BINOMIAL[lengths[next_group]][free_squares]
+                free_squares -= lengths[next_group]
+                next_group += 1
+            k += 1
+        indices[groups_count] = index
+        part.group_lengths = lengths
+        part.group_indices = indices
+
+    """
+    Прочитать параметры сжатия части таблицы: размеры блоков, код Хаффмана и дерево 'рекурсивных пар'
+    """
+
+    def read_sizes(self, part, position):
+        data = self.data
+        part.flags = data[position]
+        position += 1
+        if part.flags & FLAG_SINGLE_VALUE:
+            part.min_symbol_length = data[position]  # Здесь хранится единственное значение
+            part.sparse_index_size = part.block_length_size = 0
+            return position + 1
+
+        table_size = part.group_indices[part.group_lengths.index(0)]
+        part.block_size = 1 << data[position]
+        part.span = 1 << data[position + 1]
+        part.sparse_index_size = (table_size + part.span - 1) // part.span
+        padding = data[position + 2]
+        part.blocks_count = UINT32.unpack_from(data, position + 3)[0]
+        part.block_length_size = part.blocks_count + padding
+        max_symbol_length = data[position + 7]
+        part.min_symbol_length = data[position + 8]
+        position += 9
+
+        # Канонический код Хаффмана: base[i] - наименьший код длины min_symbol_length + i, дополненный до 64 бит
+        lengths_count = max_symbol_length - part.min_symbol_length + 1
+        part.lowest_symbols = [UINT16.unpack_from(data, position + 2 * i)[0] for i in range(lengths_count)]
+        base = [0] * lengths_count
+        for i in range(lengths_count - 2, -1, -1):
+            base[i] = (base[i + 1] + part.lowest_symbols[i] - part.lowest_symbols[i + 1]) // 2
+        part.base = [(base[i] << (64 - i - part.min_symbol_length)) & MASK_64 for i in range(lengths_count)]
+        position += 2 * lengths_count
+
+        symbols_count = UINT16.unpack_from(data, position)[0]
+        position += 2
+        part.left = [0] * symbols_count
+        part.right = [0] * symbols_count
+        for symbol in range(symbols_count):
+            first, second, third = data[position + 3 * symbol:position + 3 * symbol + 3]
+            part.left[symbol] = ((second & 0xF) << 8) | first
+            part.right[symbol] = (third << 4) | (second >> 4)
+        part.symbol_lengths = self.get_symbol_lengths(part.left, part.right)
+        return position + 3 * symbols_count + (symbols_count & 1)
+
+    """
+    Количество значений, в которое раскрывается каждый символ, минус один. Символ с правой частью 0xFFF - лист дерева.
+    Дерево обходится своим стеком, а не рекурсией, так как его глубина заранее неизвестна.
+    """
+
+    @staticmethod
+    def get_symbol_lengths(left, right):
+        symbol_lengths = [0] * len(left)
+        done = [False] * len(left)
+        for root in range(len(left)):
+            stack = [root]
+            while stack:
+                symbol = stack[-1]
+                if done[symbol]:
+                    stack.pop()
+                    continue
+                if right[symbol] == 0xFFF:
+                    done[symbol] = True
+                    stack.pop()
+                    continue
+                pending = [child for child in (left[symbol], right[symbol]) if not done[child]]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                symbol_lengths[symbol] = symbol_lengths[left[symbol]] + symbol_lengths[right[symbol]] + 1
+                done[symbol] = True
+                stack.pop()
+        return symbol_lengths
+
+    """
+    Таблицы перекодировки значений DTZ (по одной на каждый результат WDL) для каждой вертикали
+    """
+
+    def read_dtz_map(self, position, files):
+        data = self.data
+        self.dtz_map = position
+        for file in range(files):
+            part = self.parts[0][file]
+            if not part.flags & FLAG_MAPPED:
+                continue
+            if part.flags & FLAG_WIDE:
+                position += position & 1
+                for i in range(4):
+                    part.map_indices[i] = (position - self.dtz_map) // 2 + 1
+                    position += 2 * UINT16.unpack_from(data, position)[0] + 2
+            else:
+                for i in range(4):
+                    part.map_indices[i] = position - self.dtz_map + 1
+                    position += data[position] + 1
+        return position + (position & 1)
+
+    def get_block_length(self, part, block):
+        return UINT16.unpack_from(self.data, part.block_lengths + 2 * block)[0]
+
+    """
+    Раскодировать блок: список символов блока и для каждого символа количество значений блока до его конца
+    включительно. Блок хранит get_block_length + 1 значений.
+    """
+
+    def decode_block(self, part, block):
+        data = self.data
+        values_count = self.get_block_length(part, block) + 1
+        position = part.data + block * part.block_size
+        buffer = UINT64_BIG.unpack_from(data, position)[0]
+        position += 8
+        buffer_size = 64
+        base = part.base
+        lowest_symbols = part.lowest_symbols
+        min_symbol_length = part.min_symbol_length
+        symbol_lengths = part.symbol_lengths
+        symbols = []
+        ends = []
+        total = 0
+        while True:
+            length = 0
+            while buffer < base[length]:
+                length += 1
+            symbol = ((buffer - base[length]) >> (64 - length - min_symbol_length)) + lowest_symbols[length]
+            symbols.append(symbol)
+            total += symbol_lengths[symbol] + 1
+            ends.append(total)
+            if total >= values_count:
+                return symbols, ends
+            length += min_symbol_length
+            buffer = (buffer << length) & MASK_64
+            buffer_size -= length
+            if buffer_size <= 32:
+                buffer_size += 32
+                if position + 4 <= len(data):
+                    buffer |= UINT32_BIG.unpack_from(data, position)[0] << (64 - buffer_size)
+                position += 4
+
+    """
+    Значение позиции с номером index. Разреженный индекс указывает блок и смещение в нём для каждой span-ой позиции,
+    от него нужный блок находится переходом через соседние блоки.
+    """
+
+    def read_value(self, part, index, cache):
+        if part.flags & FLAG_SINGLE_VALUE:
+            return part.min_symbol_length
+        span = part.span
+        block, offset = SPARSE_ENTRY.unpack_from(self.data, part.sparse_index + SPARSE_ENTRY.size * (index // span))
+        offset += index % span - span // 2
+        while offset < 0:
+            block -= 1
+            offset += self.get_block_length(part, block) + 1
+        block_length = self.get_block_length(part, block)
+        while offset > block_length:
+            offset -= block_length + 1
+            block += 1
+            block_length = self.get_block_length(part, block)
+
+        key = (part, block)
+        decoded = cache.get(key)
+        if decoded is None:
+            decoded = self.decode_block(part, block)
+            cache.put(key, decoded)
+        symbols, ends = decoded
+        position = bisect.bisect_right(ends, offset)
+        if position:
+            offset -= ends[position - 1]
+        symbol = symbols[position]
+
+        # Раскрываем символ по дереву пар, пока не дойдём до символа, хранящего одно значение
+        left = part.left
+        symbol_lengths = part.symbol_lengths
+        while symbol_lengths[symbol]:
+            left_symbol = left[symbol]
+            if offset <= symbol_lengths[left_symbol]:
+                symbol = left_symbol
+            else:
+                offset -= symbol_lengths[left_symbol] + 1
+                symbol = part.right[symbol]
+        return left[symbol]
+
+    """
+    Значение позиции gs в таблице. black_stronger - у чёрных фигуры 'сильнейшей' стороны из названия таблицы, тогда
+    цвета фигур меняются местами, а доска отражается. Для WDL возвращает результат (WDL_LOSS..WDL_WIN), для DTZ -
+    количество полуходов до обнуления (wdl - результат позиции) или None, если таблица DTZ хранит позиции только
+    с ходом другой стороны.
+    """
+
+    def probe(self, gs, black_stronger, cache, wdl=WDL_DRAW):
+        flip = black_stronger or (self.symmetric and not gs.white_turn)
+        flip_color = 8 if flip else 0
+        square_flip = 0 if flip else 56  # Номер квадрата GameState -> номер квадрата таблицы
+        side = int(flip) ^ (0 if gs.white_turn else 1)
+
+        squares = []
+        pieces = []
+        lead_piece = None
+        lead_pawns_count = 0
+        table_file = 0
+        if self.has_pawns:
+            # Ведущие пешки стоят в начале порядка фигур, их цвет одинаков для всех частей таблицы
+            lead_code = self.parts[0][0].pieces[0]
+            lead_piece = CODE_PIECES[lead_code ^ flip_color]
+            bitboard = gs.bitboards[lead_piece]
+            while bitboard:
+                lowest_bit = bitboard & -bitboard
+                squares.append((lowest_bit.bit_length() - 1) ^ square_flip)
+                pieces.append(lead_code)
+                bitboard ^= lowest_bit
+            lead_pawns_count = len(squares)
+            lead = max(range(lead_pawns_count), key=lambda i: MAP_PAWNS[squares[i]])
+            squares[0], squares[lead] = squares[lead], squares[0]
+            table_file = min(squares[0] & 7, 7 - (squares[0] & 7))
+
+        if not self.is_wdl:
+            flags = self.parts[0][table_file].flags
+            if (flags & FLAG_STM) != side and not (self.symmetric and not self.has_pawns):
+                return None
+
+        for piece, bitboard in gs.bitboards.items():
+            if piece == lead_piece:
+                continue
+            code = PIECE_CODES[piece] ^ flip_color
+            while bitboard:
+                lowest_bit = bitboard & -bitboard
+                squares.append((lowest_bit.bit_length() - 1) ^ square_flip)
+                pieces.append(code)
+                bitboard ^= lowest_bit
+
+        part = self.parts[side % len(self.parts)][table_file]
+        # Расставляем фигуры в порядке, в котором они закодированы в таблице
+        size = len(squares)
+        for i in range(lead_pawns_count, size - 1):
+            for j in range(i + 1, size):
+                if part.pieces[i] == pieces[j]:
+                    pieces[i], pieces[j] = pieces[j], pieces[i]
+                    squares[i], squares[j] = squares[j], squares[i]
+                    break
+
+        # Отражаем доску по горизонтали, чтобы первая фигура стояла на вертикалях a-d
+        if squares[0] & 7 > 3:
+            squares = [square ^ 7 for square in squares]
+
+        if self.has_pawns:
+            index = LEAD_PAWN_INDEX[lead_pawns_count][squares[0]]
+            squares[1:lead_pawns_count] = sorted(squares[1:lead_pawns_count], key=MAP_PAWNS.__getitem__)
+            for i in range(1, lead_pawns_count):
+                index += BINOMIAL[i][MAP_PAWNS[squares[i]]]
+        else:
+            index = self.encode_leading_group(part, squares)
+
+        # Остальные группы кодируются сочетаниями свободных квадратов
+        index *= part.group_indices[0]
+        remaining_pawns = self.has_pawns and self.pawn_counts[1] > 0
+        group_start = part.group_lengths[0]
+        group = 1
+        while part.group_lengths[group]:
+            group_length = part.group_lengths[group]
+            group_squares = sorted(squares[group_start:group_start + group_length])
+            squares[group_start:group_start + group_length] = group_squares
+            previous_squares = squares[:group_start]
+            combination = 0
+            for i, square in enumerate(group_squares):
+                adjust = sum(1 for previous in previous_squares if square > previous)
+                combination += BINOMIAL[i + 1][square - adjust - 8 * remaining_pawns]
+            remaining_pawns = False
+            index += combination * part.group_indices[group]
+            group_start += group_length
+            group += 1
+
+        value = self.read_value(part, index, cache)
+        if self.is_wdl:
+            return value - 2
+        return self.map_dtz(part, value, wdl)
+
+    """
+    Номер расположения первой группы фигур в таблице без пешек. Доска отражается так, чтобы первая фигура оказалась
+    в треугольнике a1-d1-d4, а первая фигура группы не на диагонали a1-h8 - ниже неё. Если в таблице есть фигура без
+    пары, первая группа - это три фигуры, иначе только два короля.
+    """
+
+    def encode_leading_group(self, part, squares):
+        if squares[0] >> 3 > 3:
+            for i in range(len(squares)):
+                squares[i] ^= 56
+        for i in range(part.group_lengths[0]):
+            offset = off_diagonal(squares[i])
+            if not offset:
+                continue
+            if offset > 0:
+                for j in range(i, len(squares)):
+                    squares[j] = ((squares[j] >> 3) | (squares[j] << 3)) & 63
+            break
+
+        if not self.has_unique_pieces:
+            return MAP_KK[MAP_A1D1D4[squares[0]]][squares[1]]
+
+        first, second, third = squares[0], squares[1], squares[2]
+        adjust1 = int(second > first)
+        adjust2 = (third > first) + (third > second)
+        if off_diagonal(first):
+            return (MAP_A1D1D4[first] * 63 + (second - adjust1)) * 62 + third - adjust2
+        if off_diagonal(second):
+            return (6 * 63 + (first >> 3) * 28 + MAP_B1H1H7[second]) * 62 + third - adjust2
+        if off_diagonal(third):
+            return 6 * 63 * 62 + 4 * 28 * 62 + (first >> 3) * 7 * 28 + ((second >> 3) - adjust1) * 28 + \
+                MAP_B1H1H7[third]
+        return 6 * 63 * 62 + 4 * 28 * 62 + 4 * 7 * 28 + (first >> 3) * 7 * 6 + ((second >> 3) - adjust1) * 6 + \
+            (third >> 3) - adjust2
+
+    """
+    Перевести значение из таблицы DTZ в полуходы
+    """
+
+    def map_dtz(self, part, value, wdl):
+        flags = part.flags
+        if flags & FLAG_MAPPED:
+            map_index = part.map_indices[WDL_TO_MAP_INDEX[wdl + 2]] + value
+            if flags & FLAG_WIDE:
+                value = UINT16.unpack_from(self.data, self.dtz_map + 2 * map_index)[0]
+            else:
+                value = self.data[self.dtz_map + map_index]
+        if (wdl == WDL_WIN and not flags & FLAG_WIN_PLIES) or (wdl == WDL_LOSS and not flags & FLAG_LOSS_PLIES) or \
+                wdl == WDL_CURSED_WIN or wdl == WDL_BLESSED_LOSS:
+            value *= 2
+        return value + 1
+
+
+class Tablebase:
+    """
+    directory - папка с файлами таблиц (несколько папок перечисляются через os.pathsep). Файлы только находятся по
+    названиям, открываются они при первом обращении.
+    max_pieces - позиции с большим количеством фигур (включая королей) не проверяются. По умолчанию - наибольшее
+    количество фигур среди найденных таблиц.
+    cache_blocks - сколько раскодированных блоков хранить в кеше.
+
+    Таблицы не учитывают рокировку, поэтому позиции, в которых она ещё возможна, не проверяются. Взятие 'на проходе'
+    в таблицах тоже не учитывается, поэтому перед обращением к таблице перебираются все взятия позиции.
+    Таблицы удобно использовать как контекстный менеджер (with Tablebase("syzygy") as tablebase: ...).
+    """
+
+    def __init__(self, directory, max_pieces=None, cache_blocks=DEFAULT_CACHE_BLOCKS):
+        self.wdl_tables = {}
+        self.dtz_tables = {}
+        largest = 0
+        for path in directory.split(os.pathsep):
+            for file_name in sorted(os.listdir(path)):
+                name, suffix = os.path.splitext(file_name)
+                if suffix not in (WDL_SUFFIX, DTZ_SUFFIX) or not TABLE_NAME_REGEX.match(name):
+                    continue
+                table = TableFile(os.path.join(path, file_name), name, suffix == WDL_SUFFIX)
+                tables = self.wdl_tables if table.is_wdl else self.dtz_tables
+                tables[name] = table
+                tables[mirror_name(name)] = table
+                largest = max(largest, table.piece_count)
+        self.max_pieces = largest if max_pieces is None else min(max_pieces, largest)
+        self.cache = BlockCache(cache_blocks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.cache.clear()
+        for table in list(self.wdl_tables.values()) + list(self.dtz_tables.values()):
+            table.close()
+
+    """
+    Можно ли проверять позицию по таблицам: фигур не больше max_pieces и рокировок нет
+    """
+
+    def can_probe(self, gs):
+        rights = gs.current_castle_rights
+        return pop_count(gs.all_occupancy) <= self.max_pieces and \
+            not (rights.wks or rights.bks or rights.wqs or rights.bqs)
+
+    """
+    Значение позиции в таблице из tables (WDL или DTZ) без учёта взятий
+    """
+
+    def probe_table(self, gs, tables, wdl=WDL_DRAW):
+        name = get_material_name(gs.bitboards)
+        table = tables.get(name)
+        if table is None:
+            raise MissingTableError(name)
+        if table.data is None:
+            table.open()
+        return table.probe(gs, name != table.name, self.cache, wdl)
+
+    def probe_wdl_table(self, gs):
+        if gs.all_occupancy == gs.bitboards["wK"] | gs.bitboards["bK"]:
+            return WDL_DRAW  # Остались одни короли
+        return self.probe_table(gs, self.wdl_tables)
+
+    """
+    Результат WDL с перебором взятий (среди них взятие 'на проходе', которого нет в таблицах). При check_zeroing
+    перебираются и ходы пешками. Возвращает (результат, лучший ход обнуляет счётчик 50 ходов).
+    """
+
+    def search_zeroing_moves(self, gs, check_zeroing):
+        best_value = WDL_LOSS
+        moves = list(gs.generate_moves_staged())
+        moves_searched = 0
+        for move in moves:
+            if move.piece_captured == "--" and (not check_zeroing or move.piece_moved[1] != "P"):
+                continue
+            moves_searched += 1
+            gs.make_move(move)
+            try:
+                value = -self.search_zeroing_moves(gs, False)[0]
+            finally:
+                gs.undo_move()
+            if value > best_value:
+                best_value = value
+                if value >= WDL_WIN:
+                    return value, True
+
+        # Если перебраны все ходы, значение таблицы не нужно (и может быть неверным из-за взятия 'на проходе')
+        no_more_moves = moves_searched > 0 and moves_searched == len(moves)
+        value = best_value if no_more_moves else self.probe_wdl_table(gs)
+        if best_value >= value:
+            return best_value, best_value > WDL_DRAW or no_more_moves
+        return value, False
+
+    """
+    DTZ позиции: количество полуходов до обнуления счётчика 50 ходов со знаком результата (положительное - выигрыш)
+    """
+
+    def get_dtz(self, gs):
+        wdl, zeroing_best = self.search_zeroing_moves(gs, True)
+        if wdl == WDL_DRAW:
+            return 0
+        if zeroing_best:
+            return dtz_before_zeroing(wdl)
+        dtz = self.probe_table(gs, self.dtz_tables, wdl)
+        if dtz is not None:
+            return (dtz + 100 * (wdl == WDL_BLESSED_LOSS or wdl == WDL_CURSED_WIN)) * sign(wdl)
+
+        # Таблица хранит позиции с ходом другой стороны - ищем на один полуход глубже
+        min_dtz = 0xFFFF
+        for move in list(gs.generate_moves_staged()):
+            zeroing = move.piece_captured != "--" or move.piece_moved[1] == "P"
+            gs.make_move(move)
+            try:
+                if zeroing:
+                    dtz = -dtz_before_zeroing(self.search_zeroing_moves(gs, False)[0])
+                else:
+                    dtz = -self.get_dtz(gs)
+                if dtz == 1 and gs.is_in_check() and next(gs.generate_moves_staged(), None) is None:
+                    min_dtz = 1  # Ход ставит мат
+            finally:
+                gs.undo_move()
+            if not zeroing:
+                dtz += sign(dtz)
+            if dtz < min_dtz and sign(dtz) == sign(wdl):
+                min_dtz = dtz
+        return -1 if min_dtz == 0xFFFF else min_dtz
+
+    """
+    Результат позиции gs по таблицам WDL (WDL_LOSS..WDL_WIN) или None, если позицию нельзя проверить
+    """
+
+    def probe_wdl(self, gs):
+        if not self.can_probe(gs):
+            return None
+        try:
+            return self.search_zeroing_moves(gs, False)[0]
+        except MissingTableError:
+            return None
+
+    """
+    DTZ позиции gs или None, если позицию нельзя проверить
+    """
+
+    def probe_dtz(self, gs):
+        if not self.can_probe(gs):
+            return None
+        try:
+            return self.get_dtz(gs)
+        except MissingTableError:
+            return None
+
+    """
+    Оценить все ходы позиции gs по таблицам DTZ с учётом счётчика 50 ходов. Возвращает список (ход, ранг, dtz),
+    отсортированный от лучшего хода к худшему, или None, если позицию нельзя проверить. Ранг MAX_DTZ - выигрыш,
+    -MAX_DTZ - проигрыш, 0 - ничья. Выигрыш или проигрыш, который не успевает случиться до ничьей по правилу 50 ходов,
+    получает ранг по модулю меньше WIN_RANK_BOUND (MAX_DTZ // 2 - (dtz + счётчик) и наоборот для проигрыша). Среди
+    выигрывающих ходов лучше тот, что быстрее обнуляет счётчик, среди проигрывающих - тот, что дольше оттягивает
+    проигрыш.
+    """
+
+    def probe_root(self, gs):
+        if not self.can_probe(gs):
+            return None
+        halfmove_clock = gs.halfmove_clock
+        ranked_moves = []
+        try:
+            for move in list(gs.generate_moves_staged()):
+                gs.make_move(move)
+                try:
+                    if gs.halfmove_clock == 0:
+                        dtz = dtz_before_zeroing(-self.search_zeroing_moves(gs, False)[0])
+                    else:
+                        dtz = -self.get_dtz(gs)
+                        dtz += sign(dtz)
+                    if dtz == 2 and gs.is_in_check() and next(gs.generate_moves_staged(), None) is None:
+                        dtz = 1  # Ход ставит мат
+                finally:
+                    gs.undo_move()
+                if dtz > 0:
+                    rank = MAX_DTZ if dtz + halfmove_clock <= 99 else MAX_DTZ // 2 - (dtz + halfmove_clock)
+                elif dtz < 0:
+                    rank = -MAX_DTZ if -dtz * 2 + halfmove_clock < 100 else -MAX_DTZ // 2 + (-dtz + halfmove_clock)
+                else:
+                    rank = 0
+                ranked_moves.append((move, rank, dtz))
+        except MissingTableError:
+            return None
+        ranked_moves.sort(key=lambda ranked_move: (ranked_move[1], -ranked_move[2]), reverse=True)
+        return ranked_moves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка позиции по эндшпильным таблицам Syzygy")
+    parser.add_argument("path", help="папка с файлами таблиц .rtbw и .rtbz")
+    parser.add_argument("--fen", required=True, help="позиция в записи FEN")
+    args = parser.parse_args(argv)
+
+    gs = ChessEngine.GameState(args.fen)
+    with Tablebase(args.path) as tablebase:
+        if not tablebase.can_probe(gs):
+            print("позиция не проверяется: фигур больше %d или возможна рокировка" % tablebase.max_pieces)
+            return 1
+        wdl = tablebase.probe_wdl(gs)
+        if wdl is None:
+            print("нет таблицы для " + get_material_name(gs.bitboards))
+            return 1
+        print("wdl: %d, dtz: %s" % (wdl, tablebase.probe_dtz(gs)))
+        for move, rank, dtz in tablebase.probe_root(gs) or []:
+            print("%-6s rank %7d dtz %4d" % (move.get_chess_notation(), rank, dtz))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
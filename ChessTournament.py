@@ -0,0 +1,565 @@
+"""
+Турнир двух движков друг против друга: проверка, играет ли изменённый движок (A) сильнее прежнего (B). Движки
+запускаются как отдельные процессы, с которыми турнир общается по протоколу UCI (например, python -m Chess.ChessUCI из
+двух копий пакета: с изменением и без него). Партии ведёт GameState: он проверяет ходы движков, находит мат, пат и
+ничьи по правилам и следит за временем.
+
+Партии играются параллельно в пуле процессов, по одной партии на процесс, поэтому при --workers, равном количеству
+ядер, заняты все ядра. Каждый дебют из набора играется дважды, движки меняются цветами. После каждой партии
+считаются разница в рейтинге Эло с 95% доверительным интервалом и логарифм отношения правдоподобия (LLR) для
+последовательного теста SPRT. Турнир останавливается, как только тест даёт ответ: H1 (A сильнее B хотя бы на elo1)
+или H0 (A сильнее не больше, чем на elo0).
+
+Партии записываются в файл PGN (--pgn), результаты - в файл JSON lines (--output).
+
+Запуск из папки, в которой лежит пакет Chess:
+    python -m Chess.ChessTournament --cwd-a new --cwd-b old --tc 10+0.1 --games 2000 --pgn games.pgn
+    python -m Chess.ChessTournament --depth 3 --games 100 --openings openings.pgn --opening-plies 8
+"""
+
+import argparse
+import json
+import math
+import multiprocessing.util
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from Chess import ChessEngine, ChessPGN, ChessUCI
+
+DEFAULT_ENGINE_COMMAND = "%s -m Chess.ChessUCI" % shlex.quote(sys.executable)
+DEFAULT_TIME_CONTROL = "10+0.1"  # Контроль времени: секунды на партию + добавка за ход в секундах
+TIME_MARGIN = 0.1  # На сколько секунд можно превысить время, прежде чем засчитать поражение
+DEFAULT_MOVE_TIMEOUT = 60.0  # Сколько секунд ждать ход при ограничении глубиной, узлами или временем на ход
+READY_TIMEOUT = 10.0  # Сколько секунд ждать ответ на команды uci и isready
+DEFAULT_MAX_PLIES = 400  # После стольких полуходов партия присуждается как ничья
+PENDING_GAMES_PER_WORKER = 2  # Сколько партий на процесс держать в очереди
+
+# Дебюты по умолчанию: ходы из начальной позиции
+DEFAULT_OPENINGS = (
+    "e2e4 e7e5 g1f3 b8c6",
+    "e2e4 c7c5 g1f3 d7d6",
+    "e2e4 e7e6 d2d4 d7d5",
+    "e2e4 c7c6 d2d4 d7d5",
+    "d2d4 d7d5 c2c4 e7e6",
+    "d2d4 g8f6 c2c4 g7g6",
+    "c2c4 e7e5 b1c3 g8f6",
+    "g1f3 d7d5 g2g3 g8f6",
+)
+
+# Состояние процесса, который играет партии: процессы движков создаются один раз и используются во всех партиях
+WORKER_STATE = {}
+
+
+class EngineError(RuntimeError):
+    """
+    Движок завершился или ответил не по протоколу
+    """
+
+
+class EngineTimeout(EngineError):
+    """
+    Движок не ответил вовремя. Такой движок уже остановлен (kill)
+    """
+
+
+class EngineProcess:
+    """
+    Движок UCI в отдельном процессе. command - команда запуска (строка), cwd - папка, из которой он запускается.
+    self.name - имя, которое движок сообщил в ответ на команду uci.
+    Вывод движка читает отдельный поток и складывает строки в очередь self.lines (None - движок завершился), поэтому
+    ответ можно ждать с ограничением по времени: зависший движок не останавливает процесс, который играет партии.
+    """
+
+    def __init__(self, command, cwd=None):
+        self.process = subprocess.Popen(shlex.split(command), cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        self.lines = queue.Queue()
+        threading.Thread(target=self.read_output, daemon=True).start()
+        self.name = None
+        self.send("uci")
+        for line in self.read_until("uciok", READY_TIMEOUT):
+            if line.startswith("id name "):
+                self.name = line[len("id name "):]
+        self.wait_ready()
+
+    def send(self, line):
+        try:
+            self.process.stdin.write(line + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise EngineError("движок завершился")
+
+    def read_output(self):
+        for line in self.process.stdout:
+            self.lines.put(line.strip())
+        self.lines.put(None)
+
+    """
+    Читать строки движка до строки, которая начинается с prefix. Отдаёт все прочитанные строки, включая последнюю.
+    Если за timeout секунд (None - без ограничения) нужная строка не пришла, движок останавливается и бросается
+    EngineTimeout.
+    """
+
+    def read_until(self, prefix, timeout=None):
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        while True:
+            try:
+                line = self.lines.get(timeout=max(deadline - time.perf_counter(), 0) if deadline is not None else None)
+            except queue.Empty:
+                self.process.kill()
+                raise EngineTimeout("движок не ответил за %.1f с" % timeout)
+            if line is None:
+                raise EngineError("движок завершился")
+            yield line
+            if line.startswith(prefix):
+                return
+
+    def wait_ready(self):
+        self.send("isready")
+        for _ in self.read_until("readyok", READY_TIMEOUT):
+            pass
+
+    def new_game(self):
+        self.send("ucinewgame")
+        self.wait_ready()
+
+    """
+    Ход движка в позиции start_fen после ходов moves (записанных координатами). go_arguments - ограничения поиска для
+    команды go, timeout - сколько секунд ждать ход. Возвращает ход, записанный координатами.
+    """
+
+    def get_move(self, start_fen, moves, go_arguments, timeout=None):
+        position = "startpos" if start_fen == ChessEngine.START_FEN else "fen " + start_fen
+        self.send("position %s moves %s" % (position, " ".join(moves)) if moves else "position " + position)
+        self.send("go " + go_arguments)
+        for line in self.read_until("bestmove", timeout):
+            best_line = line
+        tokens = best_line.split()
+        if len(tokens) < 2:
+            raise EngineError("некорректный ответ движка: " + best_line)
+        return tokens[1]
+
+    def close(self):
+        try:
+            self.send("quit")
+            self.process.wait(timeout=2)
+        except (EngineError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+
+
+"""
+Разобрать контроль времени 'секунды+добавка' (например, '10+0.1' или '60'). Возвращает (секунды, добавка).
+"""
+
+
+def parse_time_control(text):
+    base, _, increment = text.partition("+")
+    return float(base), float(increment or 0)
+
+
+"""
+Позиция после ходов moves (записанных координатами) из позиции start_fen. При некорректном FEN или невозможном ходе
+бросается ValueError.
+"""
+
+
+def replay_moves(start_fen, moves):
+    gs = ChessEngine.GameState(start_fen)
+    for text in moves:
+        move = ChessUCI.parse_uci_move(gs, text)
+        if move is None:
+            raise ValueError("Невозможный ход: " + text)
+        gs.make_move(move)
+    return gs
+
+
+"""
+Прочитать набор дебютов: файл PGN (берутся первые opening_plies ходов каждой партии) или файл FEN/EPD (по одной
+позиции на строку). Дебют - пара (FEN начальной позиции, список ходов координатами). Каждый дебют проверяется
+переигрыванием; дебюты с некорректным FEN или невозможным ходом пропускаются с предупреждением в stderr.
+"""
+
+
+def read_openings(path, opening_plies):
+    openings = []
+    if path.lower().endswith(".pgn"):
+        for number, game in enumerate(ChessPGN.read_games_from_path(path)):
+            moves = []
+            try:
+                for move in game.replay():
+                    if len(moves) >= opening_plies:
+                        break
+                    moves.append(move.get_chess_notation())
+            except ValueError as error:
+                print("%s: партия %d пропущена: %s" % (path, number + 1, error), file=sys.stderr)
+                continue
+            openings.append((game.get_start_fen(), moves))
+    else:
+        with open(path, encoding="utf-8") as file:
+            for number, line in enumerate(file):
+                fen = line.split(";")[0].strip()
+                if not fen or fen.startswith("#"):
+                    continue
+                try:
+                    replay_moves(fen, [])
+                except ValueError as error:
+                    print("%s:%d: позиция пропущена: %s" % (path, number + 1, error), file=sys.stderr)
+                    continue
+                openings.append((fen, []))
+    return openings
+
+
+"""
+Статистика матча. Все оценки - с точки зрения движка A: wins - победы A, losses - поражения A.
+"""
+
+
+def elo_to_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_to_elo(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+# Средний результат за партию и дисперсия результата одной партии
+def get_score_variance(wins, draws, losses):
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    return score, variance
+
+
+"""
+Разница в рейтинге Эло и половина ширины её 95% доверительного интервала. При счёте 100% или 0% разница бесконечна,
+поэтому средний результат и границы интервала отодвигаются от 0 и 1 примерно на половину партии (limit). Пока все
+партии закончились одинаково, дисперсия равна нулю, и интервал был бы нулевым как раз тогда, когда о силе движков
+известно меньше всего, поэтому дисперсия не меньше дисперсии результата, равного limit.
+"""
+
+
+def get_elo(wins, draws, losses):
+    games = wins + draws + losses
+    if not games:
+        return 0.0, math.inf
+    score, variance = get_score_variance(wins, draws, losses)
+    limit = 0.5 / (games + 1)
+    variance = max(variance, limit * (1 - limit))
+    margin = 1.96 * math.sqrt(variance / games)
+    lower, score, upper = (min(max(value, limit), 1 - limit) for value in (score - margin, score, score + margin))
+    return score_to_elo(score), (score_to_elo(upper) - score_to_elo(lower)) / 2
+
+
+"""
+Логарифм отношения правдоподобия гипотез H1 (разница elo1) и H0 (разница elo0) в нормальном приближении, как в
+распределённых тестах движков. Когда он выходит за границы get_sprt_bounds, тест закончен.
+"""
+
+
+def get_llr(wins, draws, losses, elo0, elo1):
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    score, variance = get_score_variance(wins, draws, losses)
+    # Как и в get_elo, дисперсия не меньше дисперсии результата limit, иначе матч, в котором все партии закончились
+    # одинаково, никогда не закончил бы тест
+    limit = 0.5 / (games + 1)
+    variance = max(variance, limit * (1 - limit))
+    score0 = elo_to_score(elo0)
+    score1 = elo_to_score(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+"""
+Границы LLR: ниже нижней принимается H0, выше верхней - H1. alpha и beta - вероятности ошибок первого и второго рода.
+"""
+
+
+def get_sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+"""
+Инициализация процесса, который играет партии. engines - список (команда, папка) для движков A и B. Сами движки
+запускаются при первой партии, а при завершении процесса им отправляется quit. Обработчики atexit в процессах пула,
+созданных через fork, не вызываются, поэтому закрытие движков регистрируется в multiprocessing: его финализаторы
+выполняются при завершении процесса при любом способе запуска.
+"""
+
+
+def init_worker(engines):
+    WORKER_STATE["specs"] = engines
+    WORKER_STATE["engines"] = [None] * len(engines)
+    multiprocessing.util.Finalize(None, close_engines, exitpriority=10)
+
+
+def close_engines():
+    for index in range(len(WORKER_STATE["engines"])):
+        drop_engine(index)
+
+
+def get_engine(index):
+    engine = WORKER_STATE["engines"][index]
+    if engine is None:
+        command, cwd = WORKER_STATE["specs"][index]
+        engine = EngineProcess(command, cwd)
+        WORKER_STATE["engines"][index] = engine
+    return engine
+
+
+# Движок, который сломался во время партии, перезапускается к следующей партии
+def drop_engine(index):
+    engine = WORKER_STATE["engines"][index]
+    WORKER_STATE["engines"][index] = None
+    if engine is not None:
+        engine.close()
+
+
+"""
+Сыграть одну партию. opening - (FEN, ходы дебюта), white - номер движка (0 - A, 1 - B), который играет белыми.
+params - ограничения: depth, nodes, movetime (мс) или контроль времени base и increment (секунды), max_plies.
+move_timeout - сколько секунд ждать ход без контроля времени (с контролем времени ход ждут, пока не кончится время).
+Движку, который не ответил вовремя, засчитывается поражение по времени. Возвращает словарь с результатом партии,
+причиной её окончания и ходами (без ходов дебюта).
+"""
+
+
+def play_game(opening, white, params):
+    start_fen, opening_moves = opening
+    gs = replay_moves(start_fen, opening_moves)
+    sides = (white, 1 - white)  # Номер движка, который играет белыми и чёрными
+    for color, index in enumerate(sides):
+        try:
+            get_engine(index).new_game()
+        except (EngineError, OSError):
+            drop_engine(index)
+            return {"white": white, "result": "0-1" if color == 0 else "1-0", "termination": "engine error",
+                    "moves": []}
+
+    clocks = [params["base"], params["base"]]  # Оставшееся время белых и чёрных
+    moves = []
+    while True:
+        gs.get_valid_moves()
+        if gs.checkmate:
+            result, termination = ("0-1" if gs.white_turn else "1-0"), "checkmate"
+            break
+        if gs.stalemate:
+            result, termination = "1/2-1/2", "stalemate"
+            break
+        if gs.draw:
+            result, termination = "1/2-1/2", gs.get_draw_reason()
+            break
+        if len(moves) >= params["max_plies"]:
+            result, termination = "1/2-1/2", "adjudication"
+            break
+
+        color = 0 if gs.white_turn else 1
+        loss = "0-1" if gs.white_turn else "1-0"
+        if params.get("depth"):
+            go_arguments = "depth %d" % params["depth"]
+        elif params.get("nodes"):
+            go_arguments = "nodes %d" % params["nodes"]
+        elif params.get("movetime"):
+            go_arguments = "movetime %d" % params["movetime"]
+        else:
+            go_arguments = "wtime %d btime %d winc %d binc %d" % (clocks[0] * 1000, clocks[1] * 1000,
+                                                                  params["increment"] * 1000,
+                                                                  params["increment"] * 1000)
+        timeout = clocks[color] + TIME_MARGIN if params["base"] else params.get("move_timeout", DEFAULT_MOVE_TIMEOUT)
+        start_time = time.perf_counter()
+        try:
+            text = get_engine(sides[color]).get_move(start_fen, opening_moves + moves, go_arguments, timeout)
+        except EngineTimeout:
+            drop_engine(sides[color])
+            result, termination = loss, "time forfeit"
+            break
+        except (EngineError, OSError):
+            drop_engine(sides[color])
+            result, termination = loss, "engine error"
+            break
+        elapsed = time.perf_counter() - start_time
+
+        if params["base"]:
+            clocks[color] -= elapsed
+            if clocks[color] < -TIME_MARGIN:
+                result, termination = loss, "time forfeit"
+                break
+            clocks[color] = max(clocks[color], 0) + params["increment"]
+        move = ChessUCI.parse_uci_move(gs, text)
+        if move is None:
+            result, termination = loss, "illegal move " + text
+            break
+        gs.make_move(move)
+        moves.append(text)
+    return {"white": white, "result": result, "termination": termination, "moves": moves}
+
+
+"""
+Партии турнира: каждый дебют по кругу, дважды подряд, со сменой цветов. Отдаёт (номер партии, дебют, кто белыми).
+"""
+
+
+def generate_games(openings, games):
+    for number in range(games):
+        yield number, openings[(number // 2) % len(openings)], number % 2
+
+
+"""
+Записать партию в файл PGN. Партия переигрывается в GameState, чтобы записать ходы в алгебраической нотации.
+"""
+
+
+def write_pgn(file, number, opening, game, names):
+    gs = replay_moves(opening[0], opening[1] + game["moves"])
+    headers = {"Event": "Tournament", "Round": number + 1, "White": names[game["white"]],
+               "Black": names[1 - game["white"]], "Termination": game["termination"]}
+    ChessPGN.write_game(file, gs, headers, game["result"])
+
+
+"""
+Сыграть турнир. Результаты записываются в открытые файлы pgn_file и output (если они не None) по мере готовности.
+Возвращает (победы A, ничьи, поражения A, решение SPRT: 'H0', 'H1' или None).
+"""
+
+
+def run_tournament(openings, games, params, engines, names, workers=None, sprt=None, pgn_file=None, output=None):
+    workers = workers or os.cpu_count() or 1
+    tasks = generate_games(openings, games)
+    wins = draws = losses = 0
+    decision = None
+    if sprt is not None:
+        lower_bound, upper_bound = get_sprt_bounds(sprt["alpha"], sprt["beta"])
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(engines,)) as executor:
+        pending = {}
+        exhausted = False
+        while decision is None:
+            while not exhausted and len(pending) < workers * PENDING_GAMES_PER_WORKER:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                else:
+                    number, opening, white = task
+                    pending[executor.submit(play_game, opening, white, params)] = (number, opening)
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                number, opening = pending.pop(future)
+                # Ошибка в процессе с партией не должна останавливать турнир: партия просто не засчитывается
+                try:
+                    game = future.result()
+                except Exception as error:
+                    print("game %d failed: %r" % (number + 1, error), file=sys.stderr)
+                    continue
+                result = game["result"]
+                if result == "1/2-1/2":
+                    draws += 1
+                elif (result == "1-0") == (game["white"] == 0):
+                    wins += 1
+                else:
+                    losses += 1
+
+                if pgn_file is not None:
+                    write_pgn(pgn_file, number, opening, game, names)
+                if output is not None:
+                    record = {"game": number, "white": names[game["white"]], "black": names[1 - game["white"]],
+                              "start_fen": opening[0], "opening": opening[1], "result": result,
+                              "termination": game["termination"], "moves": game["moves"]}
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+                elo, margin = get_elo(wins, draws, losses)
+                status = "games %d: +%d =%d -%d, elo %.1f +- %.1f" % (wins + draws + losses, wins, draws, losses,
+                                                                      elo, margin)
+                if sprt is not None:
+                    llr = get_llr(wins, draws, losses, sprt["elo0"], sprt["elo1"])
+                    status += ", LLR %.2f (%.2f, %.2f)" % (llr, lower_bound, upper_bound)
+                    if llr >= upper_bound:
+                        decision = "H1"
+                    elif llr <= lower_bound:
+                        decision = "H0"
+                print(status, file=sys.stderr)
+            for file in (pgn_file, output):
+                if file is not None:
+                    file.flush()
+        # Тест закончен - партии, которые ещё не начались, больше не нужны
+        for future in pending:
+            future.cancel()
+    return wins, draws, losses, decision
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Турнир двух движков UCI со статистикой Эло и тестом SPRT")
+    parser.add_argument("--engine-a", default=DEFAULT_ENGINE_COMMAND, help="команда запуска движка A (проверяемого)")
+    parser.add_argument("--engine-b", default=DEFAULT_ENGINE_COMMAND, help="команда запуска движка B (эталонного)")
+    parser.add_argument("--cwd-a", default=None, help="папка, из которой запускается движок A")
+    parser.add_argument("--cwd-b", default=None, help="папка, из которой запускается движок B")
+    parser.add_argument("--name-a", default="A", help="имя движка A в PGN")
+    parser.add_argument("--name-b", default="B", help="имя движка B в PGN")
+    parser.add_argument("--games", type=int, default=1000, help="наибольшее количество партий")
+    parser.add_argument("--tc", default=DEFAULT_TIME_CONTROL, help="контроль времени 'секунды+добавка'")
+    parser.add_argument("--movetime", type=int, default=None, help="время на ход в мс (вместо контроля времени)")
+    parser.add_argument("--depth", type=int, default=None, help="глубина поиска (вместо контроля времени)")
+    parser.add_argument("--nodes", type=int, default=None, help="лимит узлов (вместо контроля времени)")
+    parser.add_argument("--move-timeout", type=float, default=DEFAULT_MOVE_TIMEOUT,
+                        help="сколько секунд ждать ход при --movetime, --depth или --nodes")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES,
+                        help="после стольких полуходов партия присуждается как ничья")
+    parser.add_argument("--openings", default=None, help="набор дебютов: файл PGN или FEN/EPD")
+    parser.add_argument("--opening-plies", type=int, default=8, help="сколько ходов брать из партий PGN")
+    parser.add_argument("--workers", type=int, default=None, help="партий одновременно (по умолчанию - по ядрам)")
+    parser.add_argument("--elo0", type=float, default=0.0, help="SPRT: разница Эло гипотезы H0")
+    parser.add_argument("--elo1", type=float, default=10.0, help="SPRT: разница Эло гипотезы H1")
+    parser.add_argument("--alpha", type=float, default=0.05, help="SPRT: вероятность ошибки первого рода")
+    parser.add_argument("--beta", type=float, default=0.05, help="SPRT: вероятность ошибки второго рода")
+    parser.add_argument("--no-sprt", action="store_true", help="сыграть все --games партий без SPRT")
+    parser.add_argument("--pgn", default=None, help="файл, в конец которого записываются партии")
+    parser.add_argument("--output", default=None, help="файл результатов JSON lines")
+    args = parser.parse_args(argv)
+
+    if args.openings is not None:
+        openings = read_openings(args.openings, args.opening_plies)
+        if not openings:
+            parser.error("в файле --openings нет дебютов")
+    else:
+        openings = [(ChessEngine.START_FEN, opening.split()) for opening in DEFAULT_OPENINGS]
+    base, increment = parse_time_control(args.tc)
+    params = {"depth": args.depth, "nodes": args.nodes, "movetime": args.movetime, "max_plies": args.max_plies,
+              "move_timeout": args.move_timeout, "base": 0.0, "increment": 0.0}
+    if args.depth is None and args.nodes is None and args.movetime is None:
+        params["base"] = base
+        params["increment"] = increment
+    sprt = None if args.no_sprt else {"elo0": args.elo0, "elo1": args.elo1, "alpha": args.alpha, "beta": args.beta}
+    engines = [(args.engine_a, args.cwd_a), (args.engine_b, args.cwd_b)]
+
+    pgn_file = open(args.pgn, "a", encoding="utf-8") if args.pgn is not None else None
+    output = open(args.output, "w", encoding="utf-8") if args.output is not None else None
+    start_time = time.perf_counter()
+    try:
+        wins, draws, losses, decision = run_tournament(openings, args.games, params, engines,
+                                                       (args.name_a, args.name_b), args.workers, sprt, pgn_file,
+                                                       output)
+    finally:
+        for file in (pgn_file, output):
+            if file is not None:
+                file.close()
+    elo, margin = get_elo(wins, draws, losses)
+    print("%s vs %s: +%d =%d -%d, elo %.1f +- %.1f, time %.1f s" % (args.name_a, args.name_b, wins, draws, losses,
+                                                                    elo, margin, time.perf_counter() - start_time))
+    if sprt is not None:
+        print("SPRT: " + ({"H1": "A сильнее (H1)", "H0": "A не сильнее (H0)"}.get(decision) or "нет решения"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
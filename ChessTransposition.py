@@ -0,0 +1,173 @@
+"""
+Таблица транспозиций - кэш результатов поиска. Одна и та же позиция часто достигается разными порядками ходов, и,
+если она уже была просмотрена на достаточную глубину, повторно её можно не искать.
+
+Таблица имеет фиксированный размер, который задаётся в мегабайтах, и не растёт во время поиска. Она хранится в
+плоском массиве 64-битных чисел (array('Q')), а не в словаре, поэтому один элемент занимает ровно 16 байт: полный
+хеш Zobrist позиции и упакованные в одно число данные.
+
+Таблица разбита на корзины по два элемента:
+- первый элемент заменяется только более глубоким результатом (или результатом из нового поиска), чтобы дорогие
+  результаты не вытеснялись мелкими;
+- второй элемент заменяется всегда, туда попадают свежие результаты, для которых не нашлось места в первом.
+
+Таблица может лежать в чужом буфере, например, в multiprocessing.shared_memory, и тогда её одновременно используют
+несколько процессов параллельного поиска. Блокировок при этом нет: вместо хеша в элементе хранится хеш XOR данные.
+Если два процесса одновременно записали один элемент и хеш остался от одной записи, а данные от другой, то при
+чтении хеш XOR данные не совпадёт с хешем позиции, и такой 'разорванный' элемент просто не будет найден.
+"""
+
+from array import array
+
+# Тип оценки, которая хранится в таблице
+BOUND_EXACT = 0  # Точная оценка
+BOUND_LOWER = 1  # Произошло отсечение, настоящая оценка не меньше сохранённой
+BOUND_UPPER = 2  # Ни один ход не улучшил alpha, настоящая оценка не больше сохранённой
+
+ENTRY_SIZE = 2  # Количество 64-битных чисел в одном элементе: хеш XOR данные и данные
+BUCKET_SIZE = 2  # Количество элементов в корзине
+BUCKET_BYTES = ENTRY_SIZE * BUCKET_SIZE * 8
+
+"""
+Раскладка данных элемента по битам:
+0-15   - moveID лучшего хода (0 - хода нет)
+16-23  - глубина
+24-25  - тип оценки
+26-31  - 'поколение' поиска, в котором записан элемент
+32-51  - оценка, сдвинутая на SCORE_OFFSET, чтобы быть неотрицательной
+"""
+DEPTH_SHIFT = 16
+BOUND_SHIFT = 24
+AGE_SHIFT = 26
+SCORE_SHIFT = 32
+MOVE_MASK = 0xFFFF
+DEPTH_MASK = 0xFF
+BOUND_MASK = 0x3
+AGE_MASK = 0x3F
+SCORE_MASK = 0xFFFFF
+SCORE_OFFSET = 1 << 19
+
+
+class TranspositionTable:
+    """
+    size_mb - максимальный размер таблицы в мегабайтах. Количество корзин округляется вниз до степени двойки, чтобы
+    номер корзины получался из хеша одной операцией AND.
+    buffer - готовый буфер (bytearray, mmap, SharedMemory.buf), в котором будет лежать таблица. Размер таблицы тогда
+    определяется размером буфера, а size_mb не используется. Буфер должен быть заполнен нулями или содержать таблицу,
+    записанную другим объектом TranspositionTable.
+
+    self.hits - сколько раз позиция была найдена в таблице
+    self.misses - сколько раз позиции в таблице не было
+    self.collisions - сколько раз корзина была занята другими позициями (при поиске или при записи, когда пришлось
+    вытеснить другую позицию)
+    """
+
+    def __init__(self, size_mb=16, buffer=None):
+        size_bytes = len(buffer) if buffer is not None else size_mb * 1024 * 1024
+        bucket_count = 1
+        while bucket_count * 2 * BUCKET_BYTES <= size_bytes:
+            bucket_count *= 2
+        self.bucket_count = bucket_count
+        self.index_mask = bucket_count - 1
+        if buffer is not None:
+            self.table = memoryview(buffer)[:bucket_count * BUCKET_BYTES].cast('Q')
+        else:
+            self.table = array('Q', bytes(bucket_count * BUCKET_BYTES))
+        self.shared = buffer is not None
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    """
+    Освободить чужой буфер. После этого таблицей пользоваться нельзя. Без вызова этого метода SharedMemory нельзя
+    закрыть, пока жив объект таблицы.
+    """
+
+    def release(self):
+        if self.shared:
+            self.table.release()
+
+    """
+    Очистить таблицу и счётчики
+    """
+
+    def clear(self):
+        if self.shared:
+            self.table.cast('B')[:] = bytes(self.bucket_count * BUCKET_BYTES)
+        else:
+            self.table = array('Q', bytes(self.bucket_count * BUCKET_BYTES))
+        self.age = 0
+        self.hits = self.misses = self.collisions = 0
+
+    """
+    Вызывается перед каждым новым поиском. Элементы предыдущих поисков остаются доступными, но при записи вытесняются
+    в первую очередь.
+    """
+
+    def new_search(self):
+        self.age = (self.age + 1) & AGE_MASK
+
+    """
+    Найти позицию по хешу. Возвращает кортеж (move_id, depth, bound, score) или None.
+    """
+
+    def probe(self, key):
+        table = self.table
+        index = (key & self.index_mask) * (ENTRY_SIZE * BUCKET_SIZE)
+        # Данные непустого элемента никогда не равны нулю (оценка хранится со сдвигом), поэтому 0 - пустой элемент
+        data = table[index + 1]
+        if not data or table[index] ^ data != key:
+            data = table[index + 3]
+            if not data or table[index + 2] ^ data != key:
+                self.misses += 1
+                if table[index + 1] or data:
+                    self.collisions += 1
+                return None
+        self.hits += 1
+        return (data & MOVE_MASK, (data >> DEPTH_SHIFT) & DEPTH_MASK, (data >> BOUND_SHIFT) & BOUND_MASK,
+                ((data >> SCORE_SHIFT) & SCORE_MASK) - SCORE_OFFSET)
+
+    """
+    Записать результат поиска позиции key. Если в этой позиции лучший ход не найден, move_id = 0.
+    """
+
+    def store(self, key, move_id, depth, bound, score):
+        table = self.table
+        index = (key & self.index_mask) * (ENTRY_SIZE * BUCKET_SIZE)
+        data = ((move_id & MOVE_MASK) | (min(depth, DEPTH_MASK) << DEPTH_SHIFT) | (bound << BOUND_SHIFT) |
+                (self.age << AGE_SHIFT) | ((score + SCORE_OFFSET) << SCORE_SHIFT))
+
+        stored_data = table[index + 1]
+        if not stored_data or table[index] ^ stored_data == key:
+            # Если позиция та же, но новый результат не даёт лучшего хода, сохраняем старый ход
+            if stored_data and move_id == 0:
+                data |= stored_data & MOVE_MASK
+            table[index] = key ^ data
+            table[index + 1] = data
+            return
+
+        stored_depth = (stored_data >> DEPTH_SHIFT) & DEPTH_MASK
+        stored_age = (stored_data >> AGE_SHIFT) & AGE_MASK
+        if depth >= stored_depth or stored_age != self.age:
+            # Первый элемент вытесняется более глубоким результатом, а его старое содержимое переезжает во второй
+            table[index + 2] = table[index]
+            table[index + 3] = stored_data
+            table[index] = key ^ data
+            table[index + 1] = data
+        else:
+            second_data = table[index + 3]
+            if second_data and table[index + 2] ^ second_data != key:
+                self.collisions += 1
+            table[index + 2] = key ^ data
+            table[index + 3] = data
+
+    """
+    Заполненность таблицы в промилле (как hashfull в протоколе UCI), считается по первым 1000 корзинам
+    """
+
+    def get_hashfull(self):
+        buckets = min(1000, self.bucket_count)
+        step = ENTRY_SIZE * BUCKET_SIZE
+        used = sum(1 for index in range(1, buckets * step, ENTRY_SIZE) if self.table[index])
+        return used * 1000 // (buckets * BUCKET_SIZE)
@@ -0,0 +1,315 @@
+"""
+Движок без графики, который общается по протоколу UCI (Universal Chess Interface) через stdin/stdout. Так движок
+подключается к шахматным оболочкам и турнирным программам. Этот модуль не импортирует pygame и не загружает
+изображения, поэтому процесс движка запускается быстро.
+
+Поддерживаемые команды:
+    uci, isready, ucinewgame, quit
+    setoption name Hash value <мегабайты>
+    setoption name SyzygyPath value <папка с таблицами Syzygy>
+    position startpos [moves <ход> ...]
+    position fen <FEN> [moves <ход> ...]
+    go [depth <n>] [nodes <n>] [movetime <мс>] [wtime <мс>] [btime <мс>] [winc <мс>] [binc <мс>] [movestogo <n>]
+       [infinite]
+    stop
+
+Ходы записываются координатами: e2e4, e7e8q (превращение), e1g1 (рокировка). Поиск идёт в отдельном потоке, поэтому
+во время поиска движок продолжает читать команды: stop останавливает поиск сразу, а isready отвечает readyok.
+
+Запуск из папки, в которой лежит пакет Chess:
+    python -m Chess.ChessUCI
+    python -m Chess.ChessUCI --hash 64 --syzygy syzygy
+"""
+
+import argparse
+import sys
+import threading
+
+from Chess import ChessEngine, ChessSearch, ChessTablebase
+from Chess.ChessTransposition import TranspositionTable
+
+ENGINE_NAME = "PyChess"
+ENGINE_AUTHOR = "PyChess"
+MAX_HASH_MB = 1024
+DEFAULT_MOVES_TO_GO = 30  # На сколько ходов делить оставшееся время, если movestogo не задан
+MOVE_OVERHEAD = 0.05  # Запас времени в секундах на передачу хода оболочке
+MIN_TIME_LIMIT = 0.01
+# Выигрыш по эндшпильным таблицам сообщается как 'cp' с этим значением (минус полуходы до позиции из таблиц): больше
+# любой настоящей оценки, но, в отличие от внутренней оценки TB_WIN_SCORE, не похоже на мат
+TB_WIN_CP = 20000
+
+"""
+Найти ход, записанный координатами (например, e2e4 или e7e8q), среди возможных ходов позиции gs. Возвращает ход или
+None, если такого хода нет.
+"""
+
+
+def parse_uci_move(gs, text, valid_moves=None):
+    if len(text) not in (4, 5) or text[0] not in ChessEngine.Move.files_to_columns or \
+            text[2] not in ChessEngine.Move.files_to_columns or text[1] not in ChessEngine.Move.ranks_to_rows or \
+            text[3] not in ChessEngine.Move.ranks_to_rows:
+        return None
+    if valid_moves is None:
+        valid_moves = gs.get_valid_moves(indexed=True)
+    start_square = (ChessEngine.Move.ranks_to_rows[text[1]], ChessEngine.Move.files_to_columns[text[0]])
+    end_square = (ChessEngine.Move.ranks_to_rows[text[3]], ChessEngine.Move.files_to_columns[text[2]])
+    promotion_piece = text[4].upper() if len(text) == 5 else None
+    move = valid_moves.find(start_square, end_square, promotion_piece or "Q")
+    if move is not None and move.pawn_promotion != (promotion_piece is not None):
+        return None
+    return move
+
+
+"""
+Оценка в формате UCI: 'cp <сотые доли пешки>' или 'mate <ходы>' (отрицательное число - мат получает сторона, чья
+очередь ходить). Выигрыш и поражение по эндшпильным таблицам - 'cp' около +-TB_WIN_CP: ходы до мата таблицы WDL не
+знают.
+"""
+
+
+def format_score(score):
+    if abs(score) >= ChessSearch.MATE_SCORE - ChessSearch.MAX_PLY:
+        plies = ChessSearch.MATE_SCORE - abs(score)
+        moves = (plies + 1) // 2
+        return "mate %d" % (moves if score > 0 else -moves)
+    if abs(score) >= ChessSearch.TB_WIN_SCORE - ChessSearch.MAX_PLY:
+        plies = ChessSearch.TB_WIN_SCORE - abs(score)
+        return "cp %d" % (TB_WIN_CP - plies if score > 0 else plies - TB_WIN_CP)
+    return "cp %d" % score
+
+
+"""
+Сколько секунд думать над ходом при игре с контролем времени: оставшееся время делится на число ходов до контроля,
+плюс большая часть добавки. Больше половины оставшегося времени на один ход не тратится.
+"""
+
+
+def get_time_limit(time_left, increment=0.0, moves_to_go=None):
+    moves = moves_to_go if moves_to_go else DEFAULT_MOVES_TO_GO
+    time_limit = min(time_left / moves + increment * 0.75, time_left * 0.5)
+    return max(MIN_TIME_LIMIT, time_limit - MOVE_OVERHEAD)
+
+
+class UCIEngine:
+    """
+    Состояние движка между командами. output - поток, в который пишутся ответы (по умолчанию sys.stdout).
+    self.gs - текущая позиция (команда position). Во время поиска её использует только поток поиска.
+    self.stop_event - событие остановки поиска: его проверяет Searcher (см. Searcher.stop_event), а в режиме
+    'go infinite' поток поиска ждёт его, прежде чем сообщить лучший ход.
+    self.search_thread - поток текущего поиска или None.
+    self.output_lock - ответы пишут и основной поток, и поток поиска, поэтому строки выводятся под блокировкой.
+    """
+
+    def __init__(self, output=None, hash_mb=ChessSearch.DEFAULT_TT_SIZE_MB, tablebase_dir=None):
+        self.output = output if output is not None else sys.stdout
+        self.output_lock = threading.Lock()
+        self.gs = ChessEngine.GameState()
+        self.tablebase = None
+        self.searcher = ChessSearch.Searcher(TranspositionTable(hash_mb))
+        self.set_tablebase(tablebase_dir)
+        self.stop_event = threading.Event()
+        self.searcher.stop_event = self.stop_event
+        self.search_thread = None
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    """
+    Обработать одну команду. Возвращает False после команды quit.
+    """
+
+    def handle_command(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max %d" % (ChessSearch.DEFAULT_TT_SIZE_MB,
+                                                                              MAX_HASH_MB))
+            self.send("option name SyzygyPath type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop_search()
+            self.searcher.tt.clear()
+            self.gs = ChessEngine.GameState()
+        elif command == "setoption":
+            self.stop_search()
+            self.set_option(arguments)
+        elif command == "position":
+            self.stop_search()
+            self.set_position(arguments)
+        elif command == "go":
+            self.stop_search()
+            self.start_search(arguments)
+        elif command == "stop":
+            self.stop_search()
+        elif command == "quit":
+            self.stop_search()
+            return False
+        else:
+            self.send("info string unknown command: " + line.strip())
+        return True
+
+    def set_option(self, arguments):
+        if "name" not in arguments:
+            return
+        name_end = arguments.index("value") if "value" in arguments else len(arguments)
+        name = " ".join(arguments[arguments.index("name") + 1:name_end]).lower()
+        value = " ".join(arguments[name_end + 1:])
+        if name == "hash":
+            try:
+                size_mb = min(max(int(value), 1), MAX_HASH_MB)
+            except ValueError:
+                self.send("info string invalid Hash value: " + value)
+                return
+            self.searcher.tt = TranspositionTable(size_mb)
+        elif name == "syzygypath":
+            self.set_tablebase(value)
+        else:
+            self.send("info string unknown option: " + name)
+
+    def set_tablebase(self, directory):
+        if self.tablebase is not None:
+            self.tablebase.close()
+            self.tablebase = None
+        if directory and directory != "<empty>":
+            # Неверный путь от оболочки не должен завершать движок: он просто работает без таблиц
+            try:
+                self.tablebase = ChessTablebase.Tablebase(directory)
+            except OSError as error:
+                self.send("info string cannot open tablebases: %s" % error)
+        self.searcher.tablebase = self.tablebase
+
+    """
+    position startpos [moves ...] или position fen <FEN> [moves ...]. Позиция строится ходами из начальной, чтобы
+    у GameState была история партии.
+    """
+
+    def set_position(self, arguments):
+        moves_index = arguments.index("moves") if "moves" in arguments else len(arguments)
+        if arguments and arguments[0] == "fen":
+            fen = " ".join(arguments[1:moves_index])
+        else:
+            fen = ChessEngine.START_FEN
+        try:
+            gs = ChessEngine.GameState(fen)
+        except (ValueError, IndexError, KeyError):
+            self.send("info string invalid fen: " + fen)
+            return
+        for text in arguments[moves_index + 1:]:
+            move = parse_uci_move(gs, text)
+            if move is None:
+                self.send("info string illegal move: " + text)
+                break
+            gs.make_move(move)
+        self.gs = gs
+
+    """
+    Разобрать параметры команды go и запустить поиск в отдельном потоке
+    """
+
+    def start_search(self, arguments):
+        limits = {}
+        infinite = False
+        index = 0
+        while index < len(arguments):
+            name = arguments[index]
+            if name == "infinite":
+                infinite = True
+            elif name in ("depth", "nodes", "movetime", "wtime", "btime", "winc", "binc", "movestogo") and \
+                    index + 1 < len(arguments):
+                try:
+                    limits[name] = int(arguments[index + 1])
+                except ValueError:
+                    pass
+                index += 1
+            index += 1
+
+        depth = limits.get("depth")
+        node_limit = limits.get("nodes")
+        time_limit = None
+        if "movetime" in limits:
+            time_limit = max(MIN_TIME_LIMIT, limits["movetime"] / 1000 - MOVE_OVERHEAD)
+        else:
+            time_left = limits.get("wtime" if self.gs.white_turn else "btime")
+            if time_left is not None:
+                increment = limits.get("winc" if self.gs.white_turn else "binc", 0)
+                time_limit = get_time_limit(time_left / 1000, increment / 1000, limits.get("movestogo"))
+        # Без ограничений поиск идёт, пока не придёт stop
+        if depth is None and node_limit is None and time_limit is None:
+            infinite = True
+            depth = ChessSearch.MAX_PLY
+
+        self.stop_event.clear()
+        self.search_thread = threading.Thread(target=self.run_search,
+                                              args=(depth, time_limit, node_limit, infinite), daemon=True)
+        self.search_thread.start()
+
+    """
+    Поиск в потоке: после каждой итерации выводится строка info, в конце - bestmove. В режиме infinite лучший ход
+    сообщается только после команды stop, как того требует протокол.
+    """
+
+    def run_search(self, depth, time_limit, node_limit, infinite):
+        searcher = self.searcher
+
+        def send_info(result):
+            self.send("info depth %d score %s nodes %d nps %d time %d hashfull %d tbhits %d pv %s" % (
+                result.depth, format_score(result.score), searcher.nodes, result.get_nodes_per_second(),
+                int(result.elapsed * 1000), searcher.tt.get_hashfull(), searcher.tb_hits, result.get_pv_notation()))
+
+        result = searcher.search(self.gs, depth=depth, time_limit=time_limit, node_limit=node_limit,
+                                 info_callback=send_info)
+        if infinite:
+            self.stop_event.wait()
+        self.send("bestmove " + (result.best_move.get_chess_notation() if result.best_move is not None else "0000"))
+
+    """
+    Остановить поиск, если он идёт, и дождаться, пока поток поиска выведет bestmove
+    """
+
+    def stop_search(self):
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+    def close(self):
+        self.stop_search()
+        if self.tablebase is not None:
+            self.tablebase.close()
+            self.tablebase = None
+
+    """
+    Читать команды из input_stream, пока не придёт quit или не закончится ввод
+    """
+
+    def run(self, input_stream=None):
+        input_stream = input_stream if input_stream is not None else sys.stdin
+        try:
+            for line in input_stream:
+                if not self.handle_command(line):
+                    break
+        finally:
+            self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Движок без графики с протоколом UCI (команды читаются из stdin)")
+    parser.add_argument("--hash", type=int, default=ChessSearch.DEFAULT_TT_SIZE_MB,
+                        help="размер таблицы транспозиций в мегабайтах")
+    parser.add_argument("--syzygy", default=None, help="папка с эндшпильными таблицами Syzygy")
+    args = parser.parse_args(argv)
+
+    UCIEngine(hash_mb=args.hash, tablebase_dir=args.syzygy).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
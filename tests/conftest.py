@@ -0,0 +1,18 @@
+"""
+Модули проекта импортируются как пакет Chess (from Chess import ChessEngine), поэтому для тестов в sys.path
+добавляется папка, в которой лежит пакет. Если папка проекта называется не Chess (например, после git clone в папку
+с другим именем), пакет Chess регистрируется напрямую с путём к папке проекта.
+"""
+
+import os
+import sys
+import types
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if os.path.basename(PROJECT_DIR) == "Chess":
+    sys.path.insert(0, os.path.dirname(PROJECT_DIR))
+elif "Chess" not in sys.modules:
+    package = types.ModuleType("Chess")
+    package.__path__ = [PROJECT_DIR]
+    sys.modules["Chess"] = package
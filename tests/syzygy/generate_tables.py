@@ -0,0 +1,389 @@
+"""
+Построение маленьких эндшпильных таблиц KRvK и KQvK в формате Syzygy для тестов ChessTablebase.
+
+Результат каждой позиции считается ретроградным анализом: от матов назад ход за ходом. Выигрыш белых - позиция, из
+которой есть ход в проигранную позицию чёрных, проигрыш чёрных - позиция, все ходы из которой ведут в выигрыш белых.
+В этих окончаниях у белых нет взятий, поэтому DTZ совпадает с расстоянием до мата в полуходах.
+
+Значения записываются так же, как в оригинальных таблицах: номер позиции вычисляется по тем же правилам, что
+в ChessTablebase.TableFile.probe, а поток значений сжимается 'рекурсивными парами' и кодом Хаффмана. Значения
+невозможных позиций (короли рядом, шах стороне, которая не ходит) ни на что не влияют и берутся равными предыдущему
+значению, чтобы поток лучше сжимался.
+
+Запуск из любой папки:
+    python tests/syzygy/generate_tables.py
+"""
+
+import heapq
+import os
+import struct
+import sys
+from bisect import bisect_right
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import conftest  # noqa: E402,F401 - регистрирует пакет Chess
+
+from Chess import ChessTablebase  # noqa: E402
+
+TABLES = {"KRvK": "R", "KQvK": "Q"}
+BLOCK_SIZE_BITS = 6  # Блок - 64 байта
+SPAN_BITS = 10  # Элемент разреженного индекса на каждые 1024 позиции
+MAX_SYMBOLS = 4095  # Номер символа - 12 бит, 0xFFF обозначает лист дерева
+MAX_SYMBOL_VALUES = 256  # Символ раскрывается не больше, чем в 256 значений (так читает Stockfish)
+MIN_PAIR_COUNT = 4  # Пара заменяется символом, только если встречается хотя бы столько раз
+MAX_BLOCK_VALUES = 1 << 16
+UNKNOWN = -1
+
+KING_STEPS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+ROOK_STEPS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_STEPS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+def get_rays(steps):
+    rays = []
+    for square in range(64):
+        square_rays = []
+        for rank_step, file_step in steps:
+            ray = []
+            rank, file = (square >> 3) + rank_step, (square & 7) + file_step
+            while 0 <= rank < 8 and 0 <= file < 8:
+                ray.append(rank * 8 + file)
+                rank, file = rank + rank_step, file + file_step
+            square_rays.append(ray)
+        rays.append(square_rays)
+    return rays
+
+
+KING_MOVES = [[ray[0] for ray in rays if ray] for rays in get_rays(KING_STEPS)]
+PIECE_RAYS = {"R": get_rays(ROOK_STEPS), "Q": [rook + bishop for rook, bishop in
+                                              zip(get_rays(ROOK_STEPS), get_rays(BISHOP_STEPS))]}
+
+
+def adjacent(first, second):
+    return max(abs((first >> 3) - (second >> 3)), abs((first & 7) - (second & 7))) <= 1
+
+
+"""
+Квадраты, на которые может пойти фигура с квадрата square, если на доске стоят фигуры blockers
+"""
+
+
+def get_piece_moves(rays, square, blockers):
+    moves = []
+    for ray in rays[square]:
+        for target in ray:
+            if target in blockers:
+                break
+            moves.append(target)
+    return moves
+
+
+"""
+Ретроградный анализ окончания король и фигура piece против короля. Возвращает два словаря (белый король, фигура,
+чёрный король) -> количество полуходов до мата: для выигранных позиций с ходом белых и проигранных с ходом чёрных.
+Остальные возможные позиции ничейные.
+"""
+
+
+def solve(piece):
+    rays = PIECE_RAYS[piece]
+
+    def attacks(square, king, piece_square):
+        return square in get_piece_moves(rays, piece_square, (king,))
+
+    def is_legal(king, piece_square, black_king):
+        return len({king, piece_square, black_king}) == 3 and not adjacent(king, black_king)
+
+    # Количество ходов чёрных в каждой позиции. Взятие фигуры ведёт к ничьей, поэтому такая позиция не проиграна
+    black_moves = {}
+    lost = {}
+    for king in range(64):
+        for piece_square in range(64):
+            for black_king in range(64):
+                if not is_legal(king, piece_square, black_king):
+                    continue
+                count = 0
+                for target in KING_MOVES[black_king]:
+                    if target == king or adjacent(target, king):
+                        continue
+                    if target == piece_square or not attacks(target, king, piece_square):
+                        count += 1
+                position = (king, piece_square, black_king)
+                black_moves[position] = count
+                if count == 0 and attacks(black_king, king, piece_square):
+                    lost[position] = 0
+
+    won = {}
+    frontier = list(lost)
+    plies = 0
+    while frontier:
+        new_won = []
+        for king, piece_square, black_king in frontier:
+            # Ход белых, который привёл в эту позицию: король или фигура пришли с другого квадрата
+            previous = [(square, piece_square, black_king) for square in KING_MOVES[king]
+                        if square != piece_square and square != black_king and not adjacent(square, black_king)]
+            previous += [(king, square, black_king)
+                         for square in get_piece_moves(rays, piece_square, (king, black_king))]
+            for position in previous:
+                if position not in won and not attacks(position[2], position[0], position[1]):
+                    won[position] = plies + 1
+                    new_won.append(position)
+        frontier = []
+        for king, piece_square, black_king in new_won:
+            for square in KING_MOVES[black_king]:
+                position = (king, piece_square, square)
+                if position in black_moves and position not in lost:
+                    black_moves[position] -= 1
+                    if black_moves[position] == 0:
+                        lost[position] = plies + 2
+                        frontier.append(position)
+        plies += 2
+    return won, lost, black_moves
+
+
+"""
+Номер позиции в таблице: фигуры в порядке pieces (белый король, фигура, чёрный король), квадраты нумеруются a1 = 0
+"""
+
+
+def get_index(table, part, squares):
+    squares = list(squares)
+    if squares[0] & 7 > 3:
+        squares = [square ^ 7 for square in squares]
+    return table.encode_leading_group(part, squares)
+
+
+"""
+Значения всех номеров таблицы. values - словарь (позиция) -> значение, позиции без значения получают значение
+предыдущего номера.
+"""
+
+
+def get_table_values(table, part, size, values):
+    table_values = [UNKNOWN] * size
+    for position, value in values.items():
+        index = get_index(table, part, position)
+        assert table_values[index] in (UNKNOWN, value), "симметричные позиции с разными значениями"
+        table_values[index] = value
+    previous = next(value for value in table_values if value != UNKNOWN)
+    for index, value in enumerate(table_values):
+        if value == UNKNOWN:
+            table_values[index] = previous
+        previous = table_values[index]
+    return table_values
+
+
+"""
+Сжатие 'рекурсивными парами': самая частая пара соседних символов заменяется новым символом, пока пары
+встречаются достаточно часто. Возвращает поток символов и дерево: для каждого символа (левый, правый), у листа
+правый - 0xFFF, а левый - само значение.
+"""
+
+
+def pair_compress(values):
+    leaves = sorted(set(values))
+    tree = [(value, 0xFFF) for value in leaves]
+    expanded = [1] * len(leaves)
+    leaf_symbols = {value: symbol for symbol, value in enumerate(leaves)}
+    stream = [leaf_symbols[value] for value in values]
+    while len(tree) < MAX_SYMBOLS:
+        counts = Counter()
+        previous_pair = None
+        for pair in zip(stream, stream[1:]):
+            if pair == previous_pair and pair[0] == pair[1]:
+                previous_pair = None  # Пересекающиеся пары (aaa) считаются один раз
+                continue
+            counts[pair] += 1
+            previous_pair = pair
+        pair, count = next(((pair, count) for pair, count in counts.most_common()
+                            if expanded[pair[0]] + expanded[pair[1]] <= MAX_SYMBOL_VALUES), (None, 0))
+        if count < MIN_PAIR_COUNT:
+            break
+        symbol = len(tree)
+        tree.append(pair)
+        expanded.append(expanded[pair[0]] + expanded[pair[1]])
+        new_stream = []
+        i = 0
+        while i < len(stream):
+            if i + 1 < len(stream) and (stream[i], stream[i + 1]) == pair:
+                new_stream.append(symbol)
+                i += 2
+            else:
+                new_stream.append(stream[i])
+                i += 1
+        stream = new_stream
+    return stream, tree, expanded
+
+
+# Длины кодов Хаффмана для частот counts (словарь символ -> частота)
+def get_code_lengths(counts):
+    heap = [(count, symbol, [symbol]) for symbol, count in counts.items()]
+    heapq.heapify(heap)
+    lengths = dict.fromkeys(counts, 0)
+    while len(heap) > 1:
+        first_count, first_key, first_symbols = heapq.heappop(heap)
+        second_count, _, second_symbols = heapq.heappop(heap)
+        for symbol in first_symbols + second_symbols:
+            lengths[symbol] += 1
+        heapq.heappush(heap, (first_count + second_count, first_key, first_symbols + second_symbols))
+    return lengths
+
+
+"""
+Записать одну часть таблицы. Возвращает (заголовок части, разреженный индекс, длины блоков, блоки).
+"""
+
+
+def encode_part(values, flags):
+    stream, tree, expanded = pair_compress(values)
+    lengths = get_code_lengths(Counter(stream))
+    assert len(lengths) > 1 and max(lengths.values()) <= 32
+
+    # Канонический код: символы с самыми длинными кодами получают меньшие номера, дерево перенумеровывается
+    order = sorted(lengths, key=lambda symbol: (-lengths[symbol], symbol))
+    order += [symbol for symbol in range(len(tree)) if symbol not in lengths]
+    renumber = {symbol: number for number, symbol in enumerate(order)}
+    min_length = min(lengths.values())
+    max_length = max(lengths.values())
+    levels = max_length - min_length + 1
+    level_counts = [0] * levels
+    for length in lengths.values():
+        level_counts[length - min_length] += 1
+    lowest_symbols = [0] * levels
+    base = [0] * levels
+    for i in range(levels - 2, -1, -1):
+        lowest_symbols[i] = lowest_symbols[i + 1] + level_counts[i + 1]
+        assert (base[i + 1] + level_counts[i + 1]) % 2 == 0
+        base[i] = (base[i + 1] + level_counts[i + 1]) // 2
+    codes = {}
+    for symbol in lengths:
+        level = lengths[symbol] - min_length
+        codes[symbol] = (base[level] + renumber[symbol] - lowest_symbols[level], lengths[symbol])
+
+    # Блоки: символы целиком, не больше block_size байт и MAX_BLOCK_VALUES значений в блоке
+    block_bits = 8 << BLOCK_SIZE_BITS
+    blocks = []
+    block_lengths = []
+    block_starts = []
+    bits = []
+    bit_count = value_count = start = 0
+    for symbol in stream:
+        code, length = codes[symbol]
+        if bit_count + length > block_bits or value_count + expanded[symbol] > MAX_BLOCK_VALUES:
+            blocks.append(pack_bits(bits, bit_count, block_bits))
+            block_lengths.append(value_count - 1)
+            block_starts.append(start)
+            start += value_count
+            bits, bit_count, value_count = [], 0, 0
+        bits.append((code, length))
+        bit_count += length
+        value_count += expanded[symbol]
+    blocks.append(pack_bits(bits, bit_count, block_bits))
+    block_lengths.append(value_count - 1)
+    block_starts.append(start)
+
+    span = 1 << SPAN_BITS
+    sparse_index = bytearray()
+    for entry in range((len(values) + span - 1) // span):
+        position = entry * span + span // 2
+        block = max(bisect_right(block_starts, position) - 1, 0)
+        offset = position - block_starts[block]
+        assert offset < 1 << 16
+        sparse_index += struct.pack("<IH", block, offset)
+
+    header = bytearray([flags, BLOCK_SIZE_BITS, SPAN_BITS, 0])
+    header += struct.pack("<I", len(blocks))
+    header += bytes([max_length, min_length])
+    header += b"".join(struct.pack("<H", symbol) for symbol in lowest_symbols)
+    header += struct.pack("<H", len(tree))
+    for symbol in order:
+        left, right = tree[symbol]
+        if right != 0xFFF:
+            left, right = renumber[left], renumber[right]
+        header += bytes([left & 0xFF, (left >> 8) | ((right & 0xF) << 4), right >> 4])
+    if len(tree) & 1:
+        header.append(0)
+    return header, sparse_index, b"".join(struct.pack("<H", length) for length in block_lengths), b"".join(blocks)
+
+
+def pack_bits(bits, bit_count, block_bits):
+    number = 0
+    for code, length in bits:
+        number = (number << length) | code
+    return (number << (block_bits - bit_count)).to_bytes(block_bits // 8, "big")
+
+
+def align(data, size):
+    data += bytes(-len(data) % size)
+
+
+"""
+Собрать файл таблицы из частей (header, sparse_index, block_lengths, blocks). В конце файла оригинальные таблицы
+хранят 16 байт контрольной суммы; читатели её не проверяют, поэтому здесь записываются нули.
+"""
+
+
+def build_file(magic, pieces, parts):
+    data = bytearray(magic)
+    data.append(1)  # Таблица несимметрична
+    data.append(0)  # Первая группа фигур кодируется первой для обеих сторон
+    data += bytes(piece | (piece << 4) for piece in pieces)
+    align(data, 2)
+    for header, _, _, _ in parts:
+        data += header
+    align(data, 2)  # Таблиц перекодировки DTZ нет
+    for _, sparse_index, _, _ in parts:
+        data += sparse_index
+    for _, _, block_lengths, _ in parts:
+        data += block_lengths
+    for _, _, _, blocks in parts:
+        align(data, 64)
+        data += blocks
+    align(data, 64)
+    return bytes(data + bytes(16))
+
+
+def generate(name, piece, directory):
+    won, lost, black_moves = solve(piece)
+    pieces = [ChessTablebase.PIECE_CODES["wK"], ChessTablebase.PIECE_CODES["w" + piece],
+              ChessTablebase.PIECE_CODES["bK"]]
+    table = ChessTablebase.TableFile(name, name, True)
+    part = ChessTablebase.PairsData()
+    part.group_lengths = [3, 0]
+    size = 31332
+
+    white_to_move = {position: ChessTablebase.WDL_DRAW + 2 for position in black_moves
+                     if position not in won and not black_in_check(piece, position)}
+    white_to_move.update((position, ChessTablebase.WDL_WIN + 2) for position in won)
+    black_to_move = {position: ChessTablebase.WDL_DRAW + 2 for position in black_moves}
+    black_to_move.update((position, ChessTablebase.WDL_LOSS + 2) for position in lost)
+    wdl_parts = [encode_part(get_table_values(table, part, size, values), 0)
+                 for values in (white_to_move, black_to_move)]
+    with open(os.path.join(directory, name + ChessTablebase.WDL_SUFFIX), "wb") as file:
+        file.write(build_file(ChessTablebase.WDL_MAGIC, pieces, wdl_parts))
+
+    # DTZ хранится для позиций с ходом белых в полуходах: значение - DTZ - 1
+    dtz = {position: plies - 1 for position, plies in won.items()}
+    dtz_flags = ChessTablebase.FLAG_WIN_PLIES | ChessTablebase.FLAG_LOSS_PLIES
+    dtz_parts = [encode_part(get_table_values(table, part, size, dtz), dtz_flags)]
+    with open(os.path.join(directory, name + ChessTablebase.DTZ_SUFFIX), "wb") as file:
+        file.write(build_file(ChessTablebase.DTZ_MAGIC, pieces, dtz_parts))
+    return max(won.values()), max(lost.values())
+
+
+# Чёрный король под шахом при ходе белых - позиция невозможна
+def black_in_check(piece, position):
+    king, piece_square, black_king = position
+    return black_king in get_piece_moves(PIECE_RAYS[piece], piece_square, (king,))
+
+
+def main():
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name, piece in TABLES.items():
+        longest_win, longest_loss = generate(name, piece, directory)
+        print("%s: самый долгий выигрыш %d полуходов, проигрыш %d" % (name, longest_win, longest_loss))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Пакетный анализ: обрезка недописанной строки, пропуск посчитанных задач с --resume, ошибки во входных данных и запуск
+от файла FEN до файла результатов
+"""
+
+import json
+
+import pytest
+
+from Chess import ChessBatch, ChessEngine
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+KIWIPETE_FEN = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+
+
+@pytest.fixture
+def worker():
+    ChessBatch.init_worker(1)
+    yield
+    ChessBatch.WORKER_STATE.clear()
+
+
+@pytest.fixture
+def fen_path(tmp_path):
+    path = tmp_path / "positions.fen"
+    path.write_text("# Позиции для проверки\n%s\n\n%s ;D1 48\n" % (START_FEN, KIWIPETE_FEN), encoding="utf-8")
+    return str(path)
+
+
+def read_results(path):
+    with open(path, encoding="utf-8") as file:
+        return sorted((json.loads(line) for line in file), key=lambda result: result["index"])
+
+
+def test_truncate_partial_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_bytes(b'{"index": 0}\n{"index": 1}\n{"ind')
+    ChessBatch.truncate_partial_line(str(path))
+    assert path.read_bytes() == b'{"index": 0}\n{"index": 1}\n'
+    # Целый файл не меняется
+    ChessBatch.truncate_partial_line(str(path))
+    assert path.read_bytes() == b'{"index": 0}\n{"index": 1}\n'
+    # Строка без перевода строки длиннее блока чтения
+    path.write_bytes(b'{"index": 0}\n' + b"x" * 70000)
+    ChessBatch.truncate_partial_line(str(path))
+    assert path.read_bytes() == b'{"index": 0}\n'
+    path.write_bytes(b'{"index": 0}')
+    ChessBatch.truncate_partial_line(str(path))
+    assert path.read_bytes() == b""
+    ChessBatch.truncate_partial_line(str(tmp_path / "missing.jsonl"))
+
+
+def test_load_checkpoint(tmp_path):
+    assert ChessBatch.load_checkpoint(str(tmp_path / "missing.jsonl")) == set()
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"index": 0}\n{"index": 2, "score": 5}\n{"score": 1}\n[3]\n{"ind', encoding="utf-8")
+    assert ChessBatch.load_checkpoint(str(path)) == {0, 2}
+
+
+def test_make_chunks_skips_done():
+    tasks = [{"index": index} for index in range(7)]
+    chunks = list(ChessBatch.make_chunks(tasks, 3, {1, 4}))
+    assert [[task["index"] for task in chunk] for chunk in chunks] == [[0, 2, 3], [5, 6]]
+
+
+def test_read_fen_tasks(fen_path):
+    assert list(ChessBatch.read_fen_tasks(fen_path)) == [{"index": 0, "fen": START_FEN},
+                                                          {"index": 1, "fen": KIWIPETE_FEN}]
+
+
+def test_run_task_bad_fen(worker):
+    result = ChessBatch.run_task({"index": 3, "fen": "8/8/8/8/8/8/8/8 w - - 0 1"}, "evaluate", {})
+    assert result["index"] == 3
+    assert "error" in result and "score" not in result
+
+
+def test_run_task_illegal_san(worker):
+    task = {"index": 0, "fen": START_FEN, "moves": ["e4", "e5", "Ke3"], "white": "A", "black": "B", "result": "*"}
+    result = ChessBatch.run_task(task, "evaluate", {})
+    assert "Ke3" in result["error"]
+    assert "positions" not in result
+
+
+def test_run_task_game(worker):
+    task = {"index": 0, "fen": START_FEN, "moves": ["e4", "e5", "Nf3"], "white": "A", "black": "B", "result": "*"}
+    result = ChessBatch.run_task(task, "perft", {"depth": 1})
+    assert "error" not in result
+    assert [(position["ply"], position["san"]) for position in result["positions"]] == [(1, "e4"), (2, "e5"),
+                                                                                        (3, "Nf3")]
+    assert [position["nodes"] for position in result["positions"]] == [20, 29, 29]
+
+
+def test_run_batch(fen_path, tmp_path):
+    output_path = tmp_path / "results.jsonl"
+    with open(output_path, "w", encoding="utf-8") as output:
+        completed = ChessBatch.run_batch(ChessBatch.read_fen_tasks(fen_path), "perft", {"depth": 2}, output,
+                                         workers=1, tt_size_mb=1)
+    assert completed == 2
+    results = read_results(output_path)
+    assert [(result["index"], result["fen"], result["nodes"]) for result in results] == [
+        (0, START_FEN, 400), (1, KIWIPETE_FEN, 2039)]
+
+
+def test_run_batch_search(fen_path, tmp_path):
+    output_path = tmp_path / "results.jsonl"
+    with open(output_path, "w", encoding="utf-8") as output:
+        ChessBatch.run_batch(ChessBatch.read_fen_tasks(fen_path), "search", {"depth": 1}, output, workers=1,
+                             tt_size_mb=1)
+    for result in read_results(output_path):
+        valid_moves = [move.get_chess_notation() for move in ChessEngine.GameState(result["fen"]).get_valid_moves()]
+        assert result["best_move"] in valid_moves
+        assert result["pv"][0] == result["best_move"]
+
+
+def test_main_resume(fen_path, tmp_path):
+    output_path = tmp_path / "results.jsonl"
+    # Прерванный запуск: первая задача посчитана, вторая записана не до конца
+    output_path.write_text('{"index": 0, "fen": "%s", "nodes": 20}\n{"index": 1, "fe' % START_FEN,
+                           encoding="utf-8")
+    argv = [fen_path, "--job", "perft", "--depth", "1", "--workers", "1", "--hash", "1", "--output",
+            str(output_path), "--resume"]
+    assert ChessBatch.main(argv) == 0
+    results = read_results(output_path)
+    assert [(result["index"], result["nodes"]) for result in results] == [(0, 20), (1, 48)]
+    # Повторный запуск ничего не пересчитывает
+    assert ChessBatch.main(argv) == 0
+    assert read_results(output_path) == results
@@ -0,0 +1,99 @@
+"""
+Дебютная книга Polyglot: поиск записей двоичным поиском, разбор ходов, рокировка и выбор хода по весу
+"""
+
+import pytest
+
+from Chess import ChessBook, ChessEngine
+
+CASTLING_FEN = "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"
+
+
+# Ход Polyglot: горизонтали нумеруются с нуля снизу, вертикали - с нуля слева
+def polyglot_move(text, promotion=0):
+    start_file, start_rank = ord(text[0]) - ord("a"), int(text[1]) - 1
+    end_file, end_rank = ord(text[2]) - ord("a"), int(text[3]) - 1
+    return (promotion << 12) | (start_rank << 9) | (start_file << 6) | (end_rank << 3) | end_file
+
+
+class FixedRandom:
+    def __init__(self, value):
+        self.value = value
+
+    def randrange(self, stop):
+        assert 0 <= self.value < stop
+        return self.value
+
+
+@pytest.fixture
+def book_path(tmp_path):
+    start_key = ChessEngine.GameState().zobrist_key
+    castling_key = ChessEngine.GameState(CASTLING_FEN).zobrist_key
+    entries = [
+        (start_key - 1, polyglot_move("a2a3"), 5),
+        (start_key, polyglot_move("e2e4"), 3),
+        (start_key, polyglot_move("d2d4"), 1),
+        (start_key, polyglot_move("g1f3"), 0),  # Нулевой вес - ход не выбирается
+        (start_key, polyglot_move("e2e5"), 7),  # Невозможный ход
+        (start_key + 1, polyglot_move("h2h4"), 5),
+        (castling_key, polyglot_move("e1h1"), 1),
+        (castling_key, polyglot_move("e1a1"), 1),
+    ]
+    path = tmp_path / "book.bin"
+    path.write_bytes(b"".join(ChessBook.ENTRY_FORMAT.pack(key, move, weight, 0) for key, move, weight in
+                              sorted(entries, key=lambda entry: entry[0])))
+    return str(path)
+
+
+def get_notations(moves):
+    return [(move.get_chess_notation(), weight) for move, weight in moves]
+
+
+def test_start_position_key():
+    assert ChessEngine.GameState().zobrist_key == 0x463B96181691FC9C
+
+
+def test_find_first(book_path):
+    key = ChessEngine.GameState().zobrist_key
+    with ChessBook.OpeningBook(book_path) as book:
+        assert book.size == 8
+        first = book.find_first(key)
+        assert ChessBook.KEY_FORMAT.unpack_from(book.data, (first - 1) * ChessBook.ENTRY_SIZE)[0] < key
+        assert len(book.get_entries(key)) == 4
+        assert book.get_entries(key + 2) == []
+        assert book.find_first(0) == 0
+        assert book.find_first(2 ** 64 - 1) == book.size
+
+
+def test_decode_polyglot_move():
+    assert ChessBook.decode_polyglot_move(polyglot_move("e2e4")) == ((6, 4), (4, 4), None)
+    assert ChessBook.decode_polyglot_move(polyglot_move("a7a8", 4)) == ((1, 0), (0, 0), "Q")
+    assert ChessBook.decode_polyglot_move(polyglot_move("h2h1", 1)) == ((6, 7), (7, 7), "N")
+
+
+def test_get_moves(book_path):
+    with ChessBook.OpeningBook(book_path) as book:
+        assert get_notations(book.get_moves(ChessEngine.GameState())) == [("e2e4", 3), ("d2d4", 1)]
+        # Рокировка записана ходом короля на квадрат ладьи
+        castling_moves = get_notations(book.get_moves(ChessEngine.GameState(CASTLING_FEN)))
+        assert castling_moves == [("e1g1", 1), ("e1c1", 1)]
+        assert book.get_moves(ChessEngine.GameState("4k3/8/8/8/8/8/8/4K3 w - - 0 1")) == []
+
+
+def test_choose_move(book_path):
+    gs = ChessEngine.GameState()
+    with ChessBook.OpeningBook(book_path) as book:
+        assert book.choose_move(gs, best=True).get_chess_notation() == "e2e4"
+        for point, expected in ((0, "e2e4"), (2, "e2e4"), (3, "d2d4")):
+            assert book.choose_move(gs, random_generator=FixedRandom(point)).get_chess_notation() == expected
+
+
+def test_bad_book_size(tmp_path):
+    path = tmp_path / "broken.bin"
+    path.write_bytes(bytes(ChessBook.ENTRY_SIZE + 1))
+    with pytest.raises(ValueError):
+        ChessBook.OpeningBook(str(path))
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"")
+    with ChessBook.OpeningBook(str(empty)) as book:
+        assert book.choose_move(ChessEngine.GameState()) is None
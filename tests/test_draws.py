@@ -0,0 +1,49 @@
+"""
+Ничьи по правилам: троекратное повторение, правило 50 ходов и недостаточный материал
+"""
+
+import pytest
+
+from Chess import ChessEngine, ChessUCI
+
+
+def play_moves(gs, moves):
+    for text in moves.split():
+        move = ChessUCI.parse_uci_move(gs, text)
+        assert move is not None, text
+        gs.make_move(move)
+    return gs
+
+
+def test_repetition_draw():
+    gs = play_moves(ChessEngine.GameState(), "g1f3 g8f6 f3g1 f6g8 g1f3 g8f6 f3g1")
+    assert gs.get_draw_reason() is None
+    play_moves(gs, "f6g8")
+    assert gs.get_draw_reason() == "repetition"
+    gs.get_valid_moves()
+    assert gs.draw
+    # Отмена хода возвращает счётчики повторений
+    gs.undo_move()
+    assert gs.get_draw_reason() is None
+    assert gs.repetition_counts[gs.zobrist_key] == 2
+
+
+def test_fifty_move_draw():
+    gs = ChessEngine.GameState("4k3/8/8/8/8/8/8/R3K3 w - - 99 80")
+    assert gs.get_draw_reason() is None
+    play_moves(gs, "a1a2")
+    assert gs.get_draw_reason() == "fifty_moves"
+
+
+@pytest.mark.parametrize("fen, insufficient", [
+    ("4k3/8/8/8/8/8/8/4K3 w - - 0 1", True),
+    ("4k3/8/8/8/8/8/8/3NK3 w - - 0 1", True),
+    ("4k3/8/8/8/8/8/8/3BK3 w - - 0 1", True),
+    ("2b1k3/8/8/8/8/8/8/3BK3 w - - 0 1", True),  # Слоны на полях одного цвета
+    ("3bk3/8/8/8/8/8/8/3BK3 w - - 0 1", False),
+    ("4k3/8/8/8/8/8/8/2NNK3 w - - 0 1", False),
+    ("4k3/8/8/8/8/8/8/3PK3 w - - 0 1", False),
+    ("4k3/8/8/8/8/8/8/3RK3 w - - 0 1", False),
+])
+def test_insufficient_material(fen, insufficient):
+    assert ChessEngine.GameState(fen).is_insufficient_material() == insufficient
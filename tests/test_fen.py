@@ -0,0 +1,19 @@
+"""
+Чтение и запись FEN
+"""
+
+import pytest
+
+from Chess import ChessEngine, ChessPerft
+
+
+@pytest.mark.parametrize("fen", [position["fen"] for position in ChessPerft.PERFT_SUITE])
+def test_fen_round_trip(fen):
+    assert ChessEngine.GameState(fen).get_fen() == fen
+
+
+@pytest.mark.parametrize("fen", ["8/8/8/8/8/8/8/8 w - - 0 1", "rnbqkbnr/pppppppp/8/8 w KQkq - 0 1",
+                                 "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1"])
+def test_invalid_fen(fen):
+    with pytest.raises(ValueError):
+        ChessEngine.GameState(fen)
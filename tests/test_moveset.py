@@ -0,0 +1,76 @@
+"""
+Индексы MoveSet: find и get_moves_from должны давать то же, что перебор всего списка ходов, в том числе для
+превращений, взятий 'на проходе' и рокировок. Проверяются позиции набора perft и позиции после каждого их хода.
+"""
+
+import pytest
+
+from Chess import ChessEngine, ChessPerft
+
+PROMOTION_PIECES = ("Q", "R", "B", "N")
+
+
+def find_linear(moves, start_square, end_square, promotion_piece="Q"):
+    for move in moves:
+        if ((move.start_row, move.start_column) == start_square and (move.end_row, move.end_column) == end_square and
+                (not move.pawn_promotion or move.promotion_piece == promotion_piece)):
+            return move
+    return None
+
+
+def get_positions(fen):
+    gs = ChessEngine.GameState(fen)
+    positions = [gs.get_fen()]
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        positions.append(gs.get_fen())
+        gs.undo_move()
+    return positions
+
+
+def check_move_set(fen):
+    gs = ChessEngine.GameState(fen)
+    move_set = gs.get_valid_moves(indexed=True)
+    assert [move.encoded for move in move_set] == [move.encoded for move in gs.get_valid_moves()]
+    moves = list(move_set)
+    squares = [(row, col) for row in range(8) for col in range(8)]
+    for start_square in squares:
+        from_square = [move for move in moves if (move.start_row, move.start_column) == start_square]
+        assert move_set.get_moves_from(*start_square) == from_square
+        targets = {(move.end_row, move.end_column) for move in from_square}
+        for end_square in targets | {(start_square[0], (start_square[1] + 1) % 8)}:
+            for promotion_piece in PROMOTION_PIECES:
+                expected = find_linear(moves, start_square, end_square, promotion_piece)
+                assert move_set.find(start_square, end_square, promotion_piece) is expected
+            assert move_set.find(start_square, end_square) is find_linear(moves, start_square, end_square)
+    # Ход, собранный из кликов игрока, находится проверкой 'in'
+    for move in moves:
+        clicked = ChessEngine.Move((move.start_row, move.start_column), (move.end_row, move.end_column), gs.board,
+                                   promotion_piece=move.promotion_piece)
+        assert clicked in move_set
+    return moves
+
+
+@pytest.mark.parametrize("position", ChessPerft.PERFT_SUITE, ids=[position["name"] for position in
+                                                                  ChessPerft.PERFT_SUITE])
+def test_move_set_matches_linear_scan(position):
+    for fen in get_positions(position["fen"]):
+        check_move_set(fen)
+
+
+def test_special_moves_covered():
+    promotions = en_passants = castlings = 0
+    for position in ChessPerft.PERFT_SUITE:
+        for fen in get_positions(position["fen"]):
+            for move in ChessEngine.GameState(fen).get_valid_moves():
+                promotions += move.pawn_promotion
+                en_passants += move.is_en_passant_move
+                castlings += move.is_castling_move
+    assert promotions and en_passants and castlings
+
+
+def test_find_missing_move():
+    move_set = ChessEngine.GameState().get_valid_moves(indexed=True)
+    assert move_set.find((6, 4), (3, 4)) is None
+    assert move_set.find((4, 4), (3, 4)) is None
+    assert move_set.get_moves_from(4, 4) == []
@@ -0,0 +1,62 @@
+"""
+Параллельный поиск: ход возможен, узлы помощников складываются, общая память освобождается, а более глубокий
+результат помощника заменяет результат основного процесса
+"""
+
+from concurrent.futures import Future
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+from Chess import ChessEngine, ChessParallel
+
+KIWIPETE_FEN = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+
+
+class FinishedExecutor:
+    """
+    Вместо пула процессов: каждый помощник сразу возвращает заданный результат
+    """
+
+    def __init__(self, helper_result):
+        self.helper_result = helper_result
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(self.helper_result)
+        return future
+
+    def shutdown(self):
+        pass
+
+
+def test_parallel_search():
+    gs = ChessEngine.GameState(KIWIPETE_FEN)
+    valid_moves = [move.get_chess_notation() for move in gs.get_valid_moves()]
+    parallel = ChessParallel.ParallelSearcher(2, tt_size_mb=1)
+    name = parallel.shared_memory.name
+    try:
+        result = parallel.search(gs, depth=2)
+        assert result.best_move.get_chess_notation() in valid_moves
+        assert result.depth >= 2
+        # Узлы основного процесса и помощника
+        assert result.nodes > parallel.searcher.nodes
+        assert gs.get_fen() == KIWIPETE_FEN
+    finally:
+        parallel.close()
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=name)
+
+
+def test_deeper_helper_result_wins():
+    gs = ChessEngine.GameState(KIWIPETE_FEN)
+    helper_move = gs.get_valid_moves()[-1]
+    with ChessParallel.ParallelSearcher(1, tt_size_mb=1) as parallel:
+        parallel.executor = FinishedExecutor((helper_move.encoded, 123, 99, 7))
+        parallel.workers = 2
+        result = parallel.search(gs, depth=1)
+        main_nodes = parallel.searcher.nodes
+    assert result.best_move.get_chess_notation() == helper_move.get_chess_notation()
+    assert (result.score, result.depth) == (123, 99)
+    assert result.pv[0].get_chess_notation() == helper_move.get_chess_notation()
+    assert result.nodes == main_nodes + 7
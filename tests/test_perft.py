@@ -0,0 +1,27 @@
+"""
+perft на позициях набора ChessPerft: генератор ходов должен давать известные количества позиций. Запуск из папки
+проекта:
+    python -m pytest -q
+Полный perft с замером скорости - python -m Chess.ChessPerft --suite.
+"""
+
+import pytest
+
+from Chess import ChessEngine, ChessPerft
+
+PERFT_TEST_DEPTH = 3  # Глубже perft слишком долгий для тестов
+
+
+@pytest.mark.parametrize("position", ChessPerft.PERFT_SUITE, ids=[position["name"] for position in
+                                                                  ChessPerft.PERFT_SUITE])
+def test_perft(position):
+    gs = ChessEngine.GameState(position["fen"])
+    for depth, expected in enumerate(position["counts"][:PERFT_TEST_DEPTH], 1):
+        assert ChessPerft.perft(gs, depth) == expected
+    # После perft позиция не должна измениться
+    assert gs.get_fen() == position["fen"]
+
+
+def test_divide_matches_perft():
+    gs = ChessEngine.GameState()
+    assert sum(nodes for _, nodes in ChessPerft.divide(gs, 3)) == ChessPerft.perft(gs, 3)
@@ -0,0 +1,62 @@
+"""
+Алгебраическая нотация (SAN) и чтение партий PGN
+"""
+
+import io
+
+import pytest
+
+from Chess import ChessEngine, ChessPGN, ChessUCI
+
+# Позиция, ход координатами и его запись в алгебраической нотации
+SAN_CASES = [
+    (ChessEngine.START_FEN, "e2e4", "e4"),
+    (ChessEngine.START_FEN, "g1f3", "Nf3"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1g1", "O-O"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1c1", "O-O-O"),
+    ("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1", "b7b8q", "b8=Q+"),
+    ("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1", "b7b8n", "b8=N"),
+    ("rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2", "e4d5", "exd5"),
+    ("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3", "e5f6", "exf6"),
+    ("4k3/8/8/8/8/8/8/R4RK1 w - - 0 1", "a1d1", "Rad1"),
+    ("4k3/8/8/8/8/R7/8/R3K3 w - - 0 1", "a1a2", "R1a2"),
+    ("4k3/8/8/8/2Q1Q3/8/2Q5/4K3 w - - 0 1", "c4d3", "Qc4d3+"),
+    ("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", "a1a8", "Ra8#"),
+]
+
+
+@pytest.mark.parametrize("fen, text, san", SAN_CASES)
+def test_san(fen, text, san):
+    gs = ChessEngine.GameState(fen)
+    move = ChessUCI.parse_uci_move(gs, text)
+    assert ChessPGN.get_san(gs, move) == san
+    assert ChessPGN.parse_san(gs, san).get_chess_notation() == text
+    assert gs.get_fen() == fen
+
+
+def test_read_write_game():
+    pgn = '[Event "Test"]\n\n1. e4 {комментарий} e5 (1... c5) 2. Nf3 Nc6 3. Bb5 a6 1-0\n'
+    game = next(ChessPGN.read_games(io.StringIO(pgn)))
+    assert game.moves == ["e4", "e5", "Nf3", "Nc6", "Bb5", "a6"]
+    assert game.result == "1-0"
+    gs = ChessEngine.GameState()
+    for _ in game.replay(gs):
+        pass
+    assert ChessPGN.game_to_pgn(gs, result="1-0").split("\n\n")[1].split() == \
+        ["1.", "e4", "e5", "2.", "Nf3", "Nc6", "3.", "Bb5", "a6", "1-0"]
+
+
+@pytest.mark.parametrize("fen, result", [
+    (ChessEngine.START_FEN, "*"),
+    ("k7/1Q6/1K6/8/8/8/8/8 b - - 0 1", "1-0"),  # Мат
+    ("k7/8/1QK5/8/8/8/8/8 b - - 0 1", "1/2-1/2"),  # Пат
+    ("k7/8/1K6/8/8/8/8/8 w - - 0 1", "1/2-1/2"),  # Недостаточный материал
+    ("k7/8/1K6/8/8/8/8/7R w - - 100 80", "1/2-1/2"),  # Правило 50 ходов
+])
+def test_get_result(fen, result):
+    gs = ChessEngine.GameState(fen)
+    assert ChessPGN.get_result(gs) == result
+    # Переданные ходы используются вместо флагов, оставшихся от другой позиции
+    legal_moves = gs.get_valid_moves()
+    gs.checkmate, gs.stalemate, gs.draw = not gs.checkmate, not gs.stalemate, not gs.draw
+    assert ChessPGN.get_result(gs, legal_moves) == result
@@ -0,0 +1,47 @@
+"""
+Поиск: после search() позиция и её флаги остаются такими же, как до поиска
+"""
+
+import pytest
+
+from Chess import ChessEngine, ChessSearch
+
+
+def get_flags(gs):
+    return gs.in_check, dict(gs.pins), list(gs.checks), gs.checkmate, gs.stalemate, gs.draw
+
+
+@pytest.mark.parametrize("fen", [
+    ChessEngine.START_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "4k3/8/8/8/8/8/4r3/R3K2R w KQ - 0 1",  # Шах
+    "4k3/4r3/8/8/8/8/4B3/4K3 w - - 0 1",  # 'Закреплённый' слон
+    "6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1",  # Мат в один ход
+])
+def test_search_keeps_root_flags(fen):
+    gs = ChessEngine.GameState(fen)
+    gs.get_valid_moves()
+    flags = get_flags(gs)
+    result = ChessSearch.Searcher().search(gs, depth=3)
+    assert result.best_move is not None
+    assert gs.get_fen() == fen
+    assert get_flags(gs) == flags
+
+
+def test_search_finds_mate():
+    gs = ChessEngine.GameState("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    result = ChessSearch.Searcher().search(gs, depth=3)
+    assert result.best_move.get_chess_notation() == "a1a8"
+    assert result.score == ChessSearch.MATE_SCORE - 1
+
+
+def test_stopped_first_iteration_is_not_reported():
+    gs = ChessEngine.GameState("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    iterations = []
+    result = ChessSearch.Searcher().search(gs, depth=8, node_limit=1500, start_depth=5,
+                                           info_callback=lambda info: iterations.append((info.depth, info.score)))
+    assert result.depth < 5
+    assert iterations == [(result.depth, result.score)]
+    assert result.score != 0
+    # Ход, выбранный после остановки, не превышает лимит узлов больше, чем на одну проверку ограничений
+    assert result.nodes <= 1500 + ChessSearch.NODES_BETWEEN_TIME_CHECKS + len(gs.get_valid_moves())
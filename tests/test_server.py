@@ -0,0 +1,58 @@
+"""
+Сервер партий: запросы обрабатываются напрямую через GameServer.handle_request, без сети
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from Chess import ChessServer
+
+
+@pytest.fixture
+def server():
+    server = ChessServer.GameServer(workers=1, engine_depth=1)
+    yield server
+    asyncio.run(server.close())
+
+
+def request(server, **fields):
+    return asyncio.run(server.handle_request(json.dumps(fields)))
+
+
+def test_engine_reply(server):
+    session = request(server, command="new")["session"]
+    response = request(server, command="move", session=session, move="e2e4", reply=True)
+    assert response["ok"] and "reply" in response
+    assert response["result"] == "*"
+    assert response["white_turn"]
+
+
+@pytest.mark.parametrize("fen", [
+    "4k3/8/8/8/8/8/8/R3K3 b - - 100 80",  # Правило 50 ходов
+    "4k3/8/8/8/8/8/8/3NK3 b - - 0 1",  # Недостаточный материал
+])
+def test_no_engine_move_after_draw(server, fen):
+    session = request(server, command="new", fen=fen)
+    assert session["result"] == "1/2-1/2"
+    response = request(server, command="go", session=session["session"])
+    assert response["ok"] and "reply" not in response
+    assert response["result"] == "1/2-1/2"
+    assert response["fen"] == fen
+
+
+def test_no_engine_move_after_repetition(server):
+    session = request(server, command="new")["session"]
+    for move in ("g1f3", "g8f6", "f3g1", "f6g8", "g1f3", "g8f6", "f3g1"):
+        assert request(server, command="move", session=session, move=move)["result"] == "*"
+    response = request(server, command="move", session=session, move="f6g8", reply=True)
+    assert "reply" not in response
+    assert response["result"] == "1/2-1/2"
+
+
+def test_errors(server):
+    assert request(server, command="new", fen="bad")["error"] == "invalid fen"
+    assert request(server, command="state", session="missing")["error"] == "unknown session"
+    session = request(server, command="new")["session"]
+    assert request(server, command="move", session=session, move="e2e5")["error"] == "illegal move"
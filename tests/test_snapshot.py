@@ -0,0 +1,18 @@
+"""
+Компактные снимки партий (GameSnapshot)
+"""
+
+from Chess import ChessEngine, ChessUCI
+
+
+def test_snapshot_round_trip():
+    gs = ChessEngine.GameState("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    for text in "e1g1 e8c8 a2a4 b4a3 f3f6 e7f6 e5f7 h3g2".split():
+        gs.make_move(ChessUCI.parse_uci_move(gs, text))
+    snapshot = gs.get_snapshot()
+    assert snapshot.get_start_fen() == "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+    restored = snapshot.restore()
+    assert restored.get_fen() == gs.get_fen()
+    assert restored.zobrist_log == gs.zobrist_log
+    assert restored.repetition_counts == gs.repetition_counts
+    assert [move.encoded for move in restored.move_log] == [move.encoded for move in gs.move_log]
@@ -0,0 +1,118 @@
+"""
+Эндшпильные таблицы: таблицы номеров позиций совпадают с оригинальным модулем чтения Syzygy, ранги ходов в корне
+правильно переводятся в оценку поиска, а значения WDL и DTZ читаются из таблиц KRvK и KQvK в tests/syzygy (их строит
+tests/syzygy/generate_tables.py). Другую папку с таблицами можно задать переменной окружения SYZYGY_PATH.
+"""
+
+import itertools
+import os
+from math import comb
+
+import pytest
+
+from Chess import ChessEngine, ChessSearch, ChessTablebase
+
+SYZYGY_PATH = os.environ.get("SYZYGY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "syzygy"))
+
+
+def kings_adjacent(first, second):
+    return max(abs((first >> 3) - (second >> 3)), abs((first & 7) - (second & 7))) <= 1
+
+
+def get_leading_group_codes(name, adjacent_kings=True):
+    table = ChessTablebase.TableFile("unused", name, True)
+    part = ChessTablebase.PairsData()
+    part.group_lengths = [3 if table.has_unique_pieces else 2]
+    codes = set()
+    for squares in itertools.permutations(range(64), part.group_lengths[0]):
+        if not adjacent_kings and kings_adjacent(squares[0], squares[1]):
+            continue
+        if squares[0] & 7 > 3:  # Отражение по вертикали делается до кодирования, как в TableFile.probe
+            squares = [square ^ 7 for square in squares]
+        codes.add(table.encode_leading_group(part, list(squares)))
+    return codes
+
+
+def test_map_kk_codes():
+    codes = {code for row in ChessTablebase.MAP_KK for code in row if code}
+    assert max(codes) == 461
+    assert get_leading_group_codes("KRRvK", adjacent_kings=False) == set(range(462))
+
+
+def test_unique_pieces_group_size():
+    assert get_leading_group_codes("KRvK") == set(range(31332))
+
+
+def test_map_pawns():
+    assert sorted(ChessTablebase.MAP_PAWNS[square] for square in range(8, 56)) == list(range(48))
+    assert ChessTablebase.LEAD_PAWNS_SIZE[1] == [6, 6, 6, 6]
+
+
+def test_binomial():
+    for k in range(7):
+        for n in range(64):
+            assert ChessTablebase.BINOMIAL[k][n] == comb(n, k)
+    assert ChessTablebase.BINOMIAL[2][62] == 1891
+
+
+def test_rank_to_score():
+    bound = ChessTablebase.WIN_RANK_BOUND
+    assert ChessSearch.tb_rank_to_score(ChessTablebase.MAX_DTZ) == ChessSearch.TB_WIN_SCORE
+    assert ChessSearch.tb_rank_to_score(-ChessTablebase.MAX_DTZ) == -ChessSearch.TB_WIN_SCORE
+    assert ChessSearch.tb_rank_to_score(0) == 0
+    # Выигрыш и проигрыш, которые не успевают случиться до ничьей по правилу 50 ходов
+    assert ChessSearch.tb_rank_to_score(bound - (30 + 99)) == 0
+    assert ChessSearch.tb_rank_to_score(-bound + (30 + 99)) == 0
+
+
+@pytest.fixture
+def tablebase():
+    with ChessTablebase.Tablebase(SYZYGY_PATH) as tablebase:
+        yield tablebase
+
+
+def test_tables_found(tablebase):
+    assert tablebase.max_pieces == 3
+    assert {"KRvK", "KvKR", "KQvK", "KvKQ"} <= set(tablebase.wdl_tables) & set(tablebase.dtz_tables)
+
+
+@pytest.mark.parametrize("fen, wdl, dtz", [
+    ("k7/8/1K6/8/8/8/8/7R w - - 0 1", ChessTablebase.WDL_WIN, 1),  # Мат в один ход
+    ("k7/8/1K6/8/8/8/7Q/8 w - - 0 1", ChessTablebase.WDL_WIN, 1),
+    ("K7/8/8/8/8/8/2Rk4/8 b - - 0 1", ChessTablebase.WDL_DRAW, 0),  # Ладья не защищена
+    ("k7/1R6/1K6/8/8/8/8/8 b - - 0 1", ChessTablebase.WDL_DRAW, 0),  # Пат
+    ("8/8/8/4k3/8/8/8/R3K3 w - - 0 1", ChessTablebase.WDL_WIN, 27),
+    ("8/8/8/4k3/8/8/8/R3K3 b - - 0 1", ChessTablebase.WDL_LOSS, -28),
+    ("4k3/8/8/8/8/8/8/4K2Q b - - 0 1", ChessTablebase.WDL_LOSS, -16),
+    # Сильнейшая сторона - чёрные: таблица читается с отражёнными доской и цветами
+    ("8/8/8/8/8/8/2rk4/1K6 w - - 0 1", ChessTablebase.WDL_LOSS, -6),
+    ("7k/8/8/8/8/8/8/K6q w - - 0 1", ChessTablebase.WDL_LOSS, -18),
+])
+def test_probe_known_positions(tablebase, fen, wdl, dtz):
+    gs = ChessEngine.GameState(fen)
+    assert tablebase.probe_wdl(gs) == wdl
+    assert tablebase.probe_dtz(gs) == dtz
+    assert gs.get_fen() == fen
+
+
+def test_probe_protected_rook_loses(tablebase):
+    gs = ChessEngine.GameState("8/8/8/8/8/8/2Rk4/1K6 b - - 0 1")
+    assert tablebase.probe_wdl(gs) == ChessTablebase.WDL_LOSS
+    assert tablebase.probe_dtz(gs) < 0
+
+
+def test_probe_root_mate(tablebase):
+    gs = ChessEngine.GameState("k7/8/1K6/8/8/8/8/7R w - - 0 1")
+    move, rank, dtz = tablebase.probe_root(gs)[0]
+    assert move.get_chess_notation() == "h1h8"
+    assert (rank, dtz) == (ChessTablebase.MAX_DTZ, 1)
+    assert ChessSearch.Searcher(tablebase=tablebase).search(gs).score == ChessSearch.TB_WIN_SCORE
+
+
+def test_probe_root_fifty_move_draw(tablebase):
+    # Выигрыш есть, но до ничьей по правилу 50 ходов остался один полуход
+    gs = ChessEngine.GameState("8/8/8/4k3/8/8/8/R3K3 w - - 99 80")
+    ranked_moves = tablebase.probe_root(gs)
+    assert 0 < ranked_moves[0][1] < ChessTablebase.WIN_RANK_BOUND
+    result = ChessSearch.Searcher(tablebase=tablebase).search(gs, depth=1)
+    assert result.score == 0
@@ -0,0 +1,132 @@
+"""
+Статистика турнира (Эло, LLR и границы SPRT), чтение дебютов и движок, который не отвечает
+"""
+
+import math
+import shlex
+import sys
+
+import pytest
+
+from Chess import ChessEngine, ChessTournament
+
+
+@pytest.mark.parametrize("elo", [-400.0, -35.5, 0.0, 10.0, 250.0])
+def test_elo_score_round_trip(elo):
+    assert ChessTournament.score_to_elo(ChessTournament.elo_to_score(elo)) == pytest.approx(elo)
+
+
+def test_elo_even_match():
+    elo, margin = ChessTournament.get_elo(30, 40, 30)
+    assert elo == 0.0
+    assert 50 < margin < 60
+
+
+def test_elo_symmetry():
+    elo, margin = ChessTournament.get_elo(60, 30, 10)
+    assert elo == pytest.approx(-ChessTournament.get_elo(10, 30, 60)[0])
+    assert margin == pytest.approx(ChessTournament.get_elo(10, 30, 60)[1])
+    # Чем больше партий с тем же средним результатом, тем уже интервал
+    assert ChessTournament.get_elo(600, 300, 100)[1] < margin
+
+
+@pytest.mark.parametrize("wins, draws, losses", [(1, 0, 0), (10, 0, 0), (0, 0, 10), (0, 2, 0), (0, 1, 0)])
+def test_elo_uniform_results(wins, draws, losses):
+    # Все партии закончились одинаково: оценка конечна, а интервал не нулевой
+    elo, margin = ChessTournament.get_elo(wins, draws, losses)
+    assert math.isfinite(elo) and math.isfinite(margin)
+    assert margin > 50
+
+
+def test_elo_no_games():
+    assert ChessTournament.get_elo(0, 0, 0) == (0.0, math.inf)
+
+
+def test_sprt_bounds():
+    lower, upper = ChessTournament.get_sprt_bounds(0.05, 0.05)
+    assert lower == pytest.approx(-math.log(19))
+    assert upper == pytest.approx(math.log(19))
+    lower, upper = ChessTournament.get_sprt_bounds(0.05, 0.1)
+    assert lower == pytest.approx(math.log(0.1 / 0.95))
+    assert upper == pytest.approx(math.log(0.9 / 0.05))
+
+
+def test_llr():
+    assert ChessTournament.get_llr(0, 0, 0, 0, 10) == 0.0
+    # Все партии закончились одинаково: дисперсия нулевая, но тест всё равно приходит к решению
+    lower, upper = ChessTournament.get_sprt_bounds(0.05, 0.05)
+    assert ChessTournament.get_llr(0, 10, 0, 0, 10) < 0
+    assert ChessTournament.get_llr(100, 0, 0, 0, 10) > upper
+    assert ChessTournament.get_llr(0, 0, 100, 0, 10) < lower
+    # Результат между гипотезами - LLR около нуля, лучше H1 - положительный, хуже H0 - отрицательный
+    middle = ChessTournament.elo_to_score(5)
+    assert ChessTournament.get_llr(1000, 0, 1000, 0, 10) < 0
+    assert ChessTournament.get_llr(600, 800, 400, 0, 10) > 0
+    assert abs(ChessTournament.get_llr(round(2000 * middle), 0, 2000 - round(2000 * middle), 0, 10)) < 0.1
+    # LLR растёт с количеством партий при том же среднем результате
+    assert ChessTournament.get_llr(1200, 1600, 800, 0, 10) > ChessTournament.get_llr(600, 800, 400, 0, 10)
+
+
+def test_parse_time_control():
+    assert ChessTournament.parse_time_control("10+0.1") == (10.0, 0.1)
+    assert ChessTournament.parse_time_control("60") == (60.0, 0.0)
+
+
+def test_read_openings_skips_bad_lines(tmp_path, capsys):
+    path = tmp_path / "openings.epd"
+    path.write_text("# комментарий\n" + ChessEngine.START_FEN + "\nbad fen\n8/8/8/8/8/8/8/8 w - - 0 1\n",
+                    encoding="utf-8")
+    assert ChessTournament.read_openings(str(path), 8) == [(ChessEngine.START_FEN, [])]
+    assert capsys.readouterr().err.count("пропущена") == 2
+
+    path = tmp_path / "openings.pgn"
+    path.write_text('[Event "a"]\n\n1. e4 e5 2. Nf3 Nc6 *\n\n[Event "b"]\n\n1. e4 e5 2. Ke3 *\n', encoding="utf-8")
+    assert ChessTournament.read_openings(str(path), 3) == [(ChessEngine.START_FEN, ["e2e4", "e7e5", "g1f3"])]
+
+
+def test_replay_moves_rejects_illegal_move():
+    assert ChessTournament.replay_moves(ChessEngine.START_FEN, ["e2e4"]).get_fen().startswith("rnbqkbnr/pppppppp/8")
+    with pytest.raises(ValueError):
+        ChessTournament.replay_moves(ChessEngine.START_FEN, ["e2e5"])
+
+
+# Движок, который отвечает на uci и isready, но никогда не присылает ход
+HANGING_ENGINE = """
+import sys
+for line in sys.stdin:
+    command = line.strip()
+    if command == "uci":
+        print("id name hanging")
+        print("uciok", flush=True)
+    elif command == "isready":
+        print("readyok", flush=True)
+    elif command == "quit":
+        break
+"""
+
+
+@pytest.fixture
+def hanging_engine(tmp_path):
+    path = tmp_path / "hanging_engine.py"
+    path.write_text(HANGING_ENGINE, encoding="utf-8")
+    return "%s %s" % (shlex.quote(sys.executable), shlex.quote(str(path)))
+
+
+def test_get_move_timeout(hanging_engine):
+    engine = ChessTournament.EngineProcess(hanging_engine)
+    assert engine.name == "hanging"
+    with pytest.raises(ChessTournament.EngineTimeout):
+        engine.get_move(ChessEngine.START_FEN, [], "depth 1", timeout=0.2)
+    assert engine.process.wait(timeout=5) is not None
+    engine.close()
+
+
+def test_play_game_forfeits_hanging_engine(hanging_engine):
+    ChessTournament.init_worker([(hanging_engine, None), (hanging_engine, None)])
+    params = {"depth": 1, "max_plies": 10, "move_timeout": 0.2, "base": 0.0, "increment": 0.0}
+    try:
+        game = ChessTournament.play_game((ChessEngine.START_FEN, []), 1, params)
+    finally:
+        ChessTournament.close_engines()
+    assert game == {"white": 1, "result": "0-1", "termination": "time forfeit", "moves": []}
+    assert ChessTournament.WORKER_STATE["engines"] == [None, None]
@@ -0,0 +1,52 @@
+"""
+Протокол UCI: запись оценок, разбор ходов и команд
+"""
+
+import io
+
+import pytest
+
+from Chess import ChessEngine, ChessSearch, ChessUCI
+
+
+@pytest.mark.parametrize("score, text", [
+    (0, "cp 0"),
+    (-35, "cp -35"),
+    (ChessSearch.MATE_SCORE - 1, "mate 1"),
+    (ChessSearch.MATE_SCORE - 4, "mate 2"),
+    (-(ChessSearch.MATE_SCORE - 2), "mate -1"),
+    (ChessSearch.TB_WIN_SCORE, "cp %d" % ChessUCI.TB_WIN_CP),
+    (ChessSearch.TB_WIN_SCORE - 3, "cp %d" % (ChessUCI.TB_WIN_CP - 3)),
+    (-(ChessSearch.TB_WIN_SCORE - 5), "cp %d" % -(ChessUCI.TB_WIN_CP - 5)),
+])
+def test_format_score(score, text):
+    assert ChessUCI.format_score(score) == text
+
+
+def test_parse_uci_move():
+    gs = ChessEngine.GameState("4k3/1P6/8/8/8/8/8/4K2R w K - 0 1")
+    assert ChessUCI.parse_uci_move(gs, "b7b8n").promotion_piece == "N"
+    assert ChessUCI.parse_uci_move(gs, "e1g1").is_castling_move
+    assert ChessUCI.parse_uci_move(gs, "b7b8") is None  # Превращение без фигуры
+    assert ChessUCI.parse_uci_move(gs, "h1h9") is None
+    assert ChessUCI.parse_uci_move(gs, "e1e3") is None
+
+
+def run_commands(commands, **options):
+    output = io.StringIO()
+    ChessUCI.UCIEngine(output=output, **options).run(io.StringIO("\n".join(commands) + "\n"))
+    return output.getvalue().splitlines()
+
+
+def test_go_depth():
+    lines = run_commands(["uci", "isready", "position startpos moves e2e4 e7e5", "go depth 2", "quit"])
+    assert "uciok" in lines and "readyok" in lines
+    assert lines[-1].startswith("bestmove ")
+    assert any(line.startswith("info depth 2 ") for line in lines)
+
+
+def test_bad_syzygy_path(tmp_path):
+    missing = str(tmp_path / "missing")
+    lines = run_commands(["setoption name SyzygyPath value " + missing, "isready", "quit"], tablebase_dir=missing)
+    assert sum(line.startswith("info string cannot open tablebases") for line in lines) == 2
+    assert lines[-1] == "readyok"
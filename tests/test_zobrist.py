@@ -0,0 +1,34 @@
+"""
+Ключи Zobrist: тестовые позиции из описания формата Polyglot
+"""
+
+import pytest
+
+from Chess import ChessEngine, ChessUCI
+
+# Ходы из начальной позиции и ключ получившейся позиции
+POLYGLOT_KEYS = [
+    ("", 0x463b96181691fc9c),
+    ("e2e4", 0x823c9b50fd114196),
+    ("e2e4 d7d5", 0x0756b94461c50fb0),
+    ("e2e4 d7d5 e4e5", 0x662fafb965db29d4),
+    ("e2e4 d7d5 e4e5 f7f5", 0x22a48b5a8e47ff78),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2", 0x652a607ca3f242c1),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2 e8f7", 0x00fdd303c946bdd9),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4", 0x3c8123ea7b067637),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4 b4c3 a1a3", 0x5c3f9b829b279560),
+]
+
+
+@pytest.mark.parametrize("moves, key", POLYGLOT_KEYS)
+def test_polyglot_keys(moves, key):
+    gs = ChessEngine.GameState()
+    for text in moves.split():
+        gs.make_move(ChessUCI.parse_uci_move(gs, text))
+    assert gs.zobrist_key == key
+    # Ключ, который обновляется по ходам, совпадает с посчитанным заново, а отмена ходов возвращает прежние ключи
+    assert gs.compute_zobrist_key() == key
+    assert ChessEngine.GameState(gs.get_fen()).zobrist_key == key
+    while gs.move_log:
+        gs.undo_move()
+    assert gs.zobrist_key == POLYGLOT_KEYS[0][1]